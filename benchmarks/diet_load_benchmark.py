@@ -0,0 +1,85 @@
+"""Offline load test for the diet path against the mock LLM backend.
+
+Exercises caching, request coalescing, the latency budget and the rate limiter
+without network access. Mock behaviour is tuned with the MOCK_LLM_* variables.
+
+Run from the project root:
+    python benchmarks/diet_load_benchmark.py [requests] [concurrency] [distinct_profiles] [budget_ms]
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault('DIET_LLM_BACKEND', 'mock')
+os.environ.setdefault('MOCK_LLM_SEED', '42')
+os.environ.setdefault('GEMINI_REQUESTS_PER_MINUTE', '100000')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src' / 'medical'))
+
+import generate_diet_step as diet
+
+RISKS = ['Pre-Diabetes Risk', 'Diabetes Risk', 'Cardiovascular Risk', 'High Cardiovascular Risk',
+         'Hypertension', 'Anemia Risk', 'Kidney Function Risk']
+
+
+def profiles(count, seed=1):
+    rng = random.Random(seed)
+    return [{
+        'patientInfo': {'age': rng.randint(20, 80), 'gender': rng.choice(['male', 'female'])},
+        'riskIndicators': rng.sample(RISKS, rng.randint(0, 3)),
+        'abnormalities': []
+    } for _ in range(count)]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(requests, concurrency, distinct, budget_ms):
+    pool = profiles(distinct)
+    rng = random.Random(2)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    outcomes = {'cached': 0, 'fresh': 0, 'provisional': 0, 'failed': 0}
+
+    async def one():
+        data = dict(rng.choice(pool), latencyBudgetMs=budget_ms)
+        async with semaphore:
+            start = time.perf_counter()
+            result = await diet.generate_diet_recommendation(data)
+            latencies.append((time.perf_counter() - start) * 1000)
+        if not result['success']:
+            outcomes['failed'] += 1
+        elif result.get('provisional'):
+            outcomes['provisional'] += 1
+        elif result.get('cached'):
+            outcomes['cached'] += 1
+        else:
+            outcomes['fresh'] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{requests} requests, concurrency {concurrency}, {distinct} distinct profiles, budget {budget_ms} ms")
+    print(f"throughput {requests / elapsed:.1f} req/s over {elapsed:.2f} s")
+    print(f"latency ms  p50 {percentile(latencies, 50):.2f}  p95 {percentile(latencies, 95):.2f}  "
+          f"p99 {percentile(latencies, 99):.2f}  max {max(latencies):.2f}  mean {statistics.mean(latencies):.2f}")
+    print('outcomes   ', outcomes)
+    print('cache      ', diet.diet_cache.stats())
+    print('coalescing ', diet.diet_flight.stats())
+    print('hedging    ', diet.hedging_stats())
+    print('limiter    ', diet.gemini_limiter.stats())
+    print('breaker    ', diet.gemini_breaker.stats())
+    print('backend    ', diet.llm_backend.stats())
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    requests, concurrency, distinct, budget_ms = (args + [2000, 200, 100, 0][len(args):])[:4]
+    asyncio.run(run(requests, concurrency, distinct, budget_ms))
@@ -0,0 +1,93 @@
+"""Micro-benchmark: DietResponseParser against the original line-scanning parser.
+
+Run from the project root:  python benchmarks/diet_parser_benchmark.py [sections] [repeats]
+"""
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src' / 'medical'))
+
+from generate_diet_step import DietResponseParser, parse_gemini_response
+
+FOODS = ['Brown rice', 'Jowar roti', 'Moong dal', 'Palak paneer', 'Grilled fish', 'Sprouts chaat',
+         'Ragi dosa', 'Methi thepla', 'Curd rice', 'Masoor dal', 'Bajra khichdi', 'Egg bhurji']
+HEADINGS = ['1. DIET OVERVIEW', '## 2. RECOMMENDED FOODS (VEGETARIAN)', '**3. RECOMMENDED FOODS (NON-VEGETARIAN)**',
+            '4. FOODS TO AVOID', '### 5. LIFESTYLE & HYDRATION TIPS']
+
+
+def legacy_parse_gemini_response(response_text):
+    """The parser as it stood before the compiled heading matcher, kept for comparison"""
+    sections = {'overview': '', 'vegetarianFoods': [], 'nonVegetarianFoods': [], 'foodsToAvoid': [], 'lifestyleTips': []}
+    current_section = None
+    for line in response_text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        line_upper = line.upper()
+        if 'DIET OVERVIEW' in line_upper or 'OVERVIEW' in line_upper and current_section is None:
+            current_section = 'overview'
+            continue
+        elif 'RECOMMENDED FOODS (VEGETARIAN)' in line_upper or 'VEGETARIAN' in line_upper and 'RECOMMENDED' in line_upper:
+            current_section = 'vegetarian'
+            continue
+        elif 'RECOMMENDED FOODS (NON-VEGETARIAN)' in line_upper or 'NON-VEGETARIAN' in line_upper and 'RECOMMENDED' in line_upper:
+            current_section = 'nonvegetarian'
+            continue
+        elif 'FOODS TO AVOID' in line_upper or 'AVOID' in line_upper:
+            current_section = 'avoid'
+            continue
+        elif 'LIFESTYLE' in line_upper or 'HYDRATION' in line_upper:
+            current_section = 'lifestyle'
+            continue
+        if current_section == 'overview':
+            if line and not line.startswith('#') and not line.startswith('*'):
+                sections['overview'] += line + ' '
+        elif current_section is not None:
+            if line.startswith('-') or line.startswith('•') or line.startswith('*'):
+                item = line.lstrip('-•* ').strip()
+                if item and len(item) > 3:
+                    key = {'vegetarian': 'vegetarianFoods', 'nonvegetarian': 'nonVegetarianFoods',
+                           'avoid': 'foodsToAvoid', 'lifestyle': 'lifestyleTips'}[current_section]
+                    sections[key].append(item)
+    sections['overview'] = sections['overview'].strip()
+    return sections
+
+
+def synthetic_response(sections, items_per_section=40, seed=7):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(sections):
+        lines.append(HEADINGS[i % len(HEADINGS)])
+        if i % len(HEADINGS) == 0:
+            lines.extend(' '.join(rng.choices(FOODS, k=12)) + '.' for _ in range(5))
+        else:
+            lines.extend(f"{rng.choice('-•*')} {rng.choice(FOODS)} with {rng.choice(FOODS).lower()}" for _ in range(items_per_section))
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def stream_parse(text, chunk_size=64):
+    parser = DietResponseParser()
+    for start in range(0, len(text), chunk_size):
+        parser.feed(text[start:start + chunk_size])
+    parser.close()
+    return parser.result()
+
+
+def main():
+    sections = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    text = synthetic_response(sections)
+    print(f"synthetic response: {sections} sections, {text.count(chr(10)) + 1} lines, {len(text) / 1024:.0f} KiB")
+
+    for label, fn in [('legacy parser', legacy_parse_gemini_response),
+                      ('parse_gemini_response', parse_gemini_response),
+                      ('DietResponseParser (64-char chunks)', stream_parse)]:
+        best = min(timeit.repeat(lambda: fn(text), number=1, repeat=repeats))
+        print(f"{label:<38} {best * 1000:8.2f} ms  ({len(text) / best / 1e6:6.1f} MB/s)")
+
+
+if __name__ == '__main__':
+    main()
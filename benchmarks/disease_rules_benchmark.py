@@ -0,0 +1,349 @@
+"""Micro-benchmark: the indexed disease rule table against the original if-chain.
+
+Checks that both predict the same diseases for every request of a synthetic
+corpus, then times them. The table is then grown with synthetic rules for
+other body parts, findings and analytes, to compare the index with
+evaluating every rule as the table gets larger.
+
+Run from the project root:  python benchmarks/disease_rules_benchmark.py [requests] [repeats]
+"""
+import random
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src' / 'medical'))
+
+from reference_ranges import classify, patient_profile
+from disease_prediction_step import apply_disease_rules, identify_lab_abnormalities, normalize_lab_values
+from disease_rules import DISEASE_RULES, Findings, Lab, Rule, RuleEngine
+
+SCAN_TYPES = ['X-Ray', 'CT Scan', 'MRI', 'Ultrasound', 'PET Scan']
+BODY_PARTS = ['Brain', 'Chest', 'Lungs', 'Heart', 'Abdomen', 'Liver', 'Kidney', 'Spine', 'Knee Joint', 'Pelvis']
+FINDING_WORDS = ['lesion', 'mass', 'tumor', 'bleeding', 'hemorrhage', 'infarct', 'ischemic changes', 'enlarged',
+                 'cardiomegaly', 'opacity', 'consolidation', 'infiltrates', 'nodule', 'effusion', 'fatty',
+                 'steatosis', 'cirrhosis', 'stone', 'calculus', 'cyst', 'fracture', 'arthritis', 'degeneration',
+                 'no acute abnormality', 'mild', 'left', 'right', 'lobe', 'small', 'diffuse', 'unremarkable']
+SEVERITIES = ['Mild', 'Moderate', 'Severe', '']
+
+
+def synthetic_request(rng):
+    patient_info = {'age': str(rng.randint(1, 90)), 'gender': rng.choice(['Male', 'Female', ''])}
+    scan_info = {
+        'scanType': rng.choice(SCAN_TYPES),
+        'bodyPart': rng.choice(BODY_PARTS),
+        'observedFindings': ', '.join(rng.sample(FINDING_WORDS, rng.randint(0, 4))),
+        'severity': rng.choice(SEVERITIES)
+    }
+    ranges = {'hemoglobin': (7, 18), 'wbc': (2, 26), 'fastingBloodSugar': (60, 200), 'hba1c': (4.5, 9),
+              'totalCholesterol': (140, 290), 'ldl': (70, 200), 'triglycerides': (80, 300), 'crp': (0.5, 20),
+              'esr': (2, 70), 'creatinine': (0.5, 2.5), 'urea': (8, 40), 'alt': (10, 90), 'ast': (10, 90)}
+    lab_values = {key: round(rng.uniform(low, high), 1) for key, (low, high) in ranges.items() if rng.random() < 0.5}
+    labs = normalize_lab_values(lab_values)
+    return patient_info, identify_lab_abnormalities(labs, patient_info), labs, scan_info
+
+
+def legacy_apply_disease_rules(
+    patient_info: Dict[str, Any],
+    scan_findings: List[str],
+    lab_abnormalities: List[str],
+    labs: Dict[str, float],
+    scan_info: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """apply_disease_rules as it stood before the indexed rule table, kept for comparison"""
+    
+    diseases = []
+    
+    # Extract key information
+    observed = scan_info.get('observedFindings', '').lower()
+    severity = scan_info.get('severity', '').lower()
+    scan_type = scan_info.get('scanType', '').lower()
+    body_part = scan_info.get('bodyPart', '').lower()
+    
+    # NEUROLOGICAL DISEASES
+    if 'brain' in body_part:
+        if 'lesion' in observed and any('crp' in abn.lower() or 'esr' in abn.lower() for abn in lab_abnormalities):
+            diseases.append({
+                "name": "Possible Encephalitis",
+                "confidence": "High" if severity == "severe" else "Medium",
+                "category": "Neurological",
+                "indicators": ["Brain lesion on imaging", "Elevated inflammatory markers"]
+            })
+        
+        if 'mass' in observed or 'tumor' in observed:
+            diseases.append({
+                "name": "Possible Brain Tumor",
+                "confidence": "High" if severity == "severe" else "Medium",
+                "category": "Neurological",
+                "indicators": ["Mass/tumor detected on imaging"]
+            })
+        
+        if 'bleed' in observed or 'hemorrhage' in observed:
+            diseases.append({
+                "name": "Possible Hemorrhagic Stroke",
+                "confidence": "High",
+                "category": "Neurological - CRITICAL",
+                "indicators": ["Brain hemorrhage detected"]
+            })
+        
+        if 'infarct' in observed or 'ischemic' in observed:
+            diseases.append({
+                "name": "Possible Ischemic Stroke",
+                "confidence": "High",
+                "category": "Neurological - CRITICAL",
+                "indicators": ["Ischemic changes detected"]
+            })
+    
+    # CARDIAC DISEASES
+    if 'heart' in body_part or 'cardiac' in body_part or ('chest' in body_part and 'x-ray' in scan_type):
+        if 'enlarged' in observed or 'cardiomegaly' in observed:
+            chol_high = any('cholesterol' in abn.lower() for abn in lab_abnormalities)
+            diseases.append({
+                "name": "Possible Heart Disease / Cardiomyopathy",
+                "confidence": "High" if chol_high else "Medium",
+                "category": "Cardiac",
+                "indicators": ["Enlarged heart on imaging"] + (["High cholesterol"] if chol_high else [])
+            })
+    
+    # Check for dyslipidemia from labs alone
+    if labs.get('ldl', 0) >= 160 or labs.get('triglycerides', 0) >= 200:
+        diseases.append({
+            "name": "Dyslipidemia",
+            "confidence": "High",
+            "category": "Metabolic",
+            "indicators": ["Significantly elevated lipid levels"]
+        })
+    
+    # RESPIRATORY DISEASES
+    if 'lung' in body_part or 'chest' in body_part:
+        if 'opacity' in observed or 'consolidation' in observed or 'infiltrate' in observed:
+            wbc_high = any('wbc' in abn.lower() and 'high' in abn.lower() for abn in lab_abnormalities)
+            diseases.append({
+                "name": "Possible Pneumonia",
+                "confidence": "High" if wbc_high else "Medium",
+                "category": "Respiratory",
+                "indicators": ["Lung opacity/consolidation"] + (["Elevated WBC"] if wbc_high else [])
+            })
+        
+        if 'nodule' in observed or 'mass' in observed:
+            diseases.append({
+                "name": "Possible Lung Tumor / Malignancy",
+                "confidence": "Medium",
+                "category": "Respiratory",
+                "indicators": ["Lung nodule/mass detected - requires biopsy"]
+            })
+        
+        if 'effusion' in observed:
+            diseases.append({
+                "name": "Pleural Effusion",
+                "confidence": "High",
+                "category": "Respiratory",
+                "indicators": ["Fluid in pleural space"]
+            })
+    
+    # METABOLIC DISEASES - DIABETES
+    fbs = labs.get('fastingBloodSugar', 0)
+    hba1c = labs.get('hba1c', 0)
+    
+    if fbs >= 126 or hba1c >= 6.5:
+        diseases.append({
+            "name": "Diabetes Mellitus",
+            "confidence": "High",
+            "category": "Metabolic",
+            "indicators": [
+                f"Fasting Blood Sugar: {fbs} mg/dL" if fbs >= 126 else "",
+                f"HbA1c: {hba1c}%" if hba1c >= 6.5 else ""
+            ]
+        })
+    elif fbs >= 100 or hba1c >= 5.7:
+        diseases.append({
+            "name": "Pre-Diabetes",
+            "confidence": "High",
+            "category": "Metabolic",
+            "indicators": ["Elevated blood sugar in pre-diabetic range"]
+        })
+    
+    # LIVER DISEASES
+    if 'liver' in body_part or 'hepatic' in body_part:
+        if 'fatty' in observed or 'steatosis' in observed:
+            alt_high = labs.get('alt', 0) > 40
+            ast_high = labs.get('ast', 0) > 40
+            diseases.append({
+                "name": "Fatty Liver Disease",
+                "confidence": "High" if (alt_high or ast_high) else "Medium",
+                "category": "Hepatic",
+                "indicators": ["Fatty liver on imaging"] + (["Elevated liver enzymes"] if (alt_high or ast_high) else [])
+            })
+        
+        if 'cirrhosis' in observed:
+            diseases.append({
+                "name": "Liver Cirrhosis",
+                "confidence": "High",
+                "category": "Hepatic",
+                "indicators": ["Cirrhotic changes on imaging"]
+            })
+    
+    # KIDNEY DISEASES
+    if 'kidney' in body_part or 'renal' in body_part:
+        if 'stone' in observed or 'calculus' in observed:
+            creat_high = labs.get('creatinine', 0) > 1.3
+            diseases.append({
+                "name": "Kidney Stone / Nephrolithiasis",
+                "confidence": "High",
+                "category": "Renal",
+                "indicators": ["Kidney stone detected"] + (["Elevated creatinine"] if creat_high else [])
+            })
+        
+        if 'cyst' in observed:
+            diseases.append({
+                "name": "Renal Cyst",
+                "confidence": "High",
+                "category": "Renal",
+                "indicators": ["Kidney cyst detected"]
+            })
+    
+    # Kidney dysfunction from labs
+    if labs.get('creatinine', 0) > 1.5 or labs.get('urea', 0) > 25:
+        diseases.append({
+            "name": "Renal Dysfunction / Chronic Kidney Disease",
+            "confidence": "Medium",
+            "category": "Renal",
+            "indicators": ["Elevated kidney function markers"]
+        })
+    
+    # HEMATOLOGICAL DISEASES
+    hb = labs.get('hemoglobin', 0)
+    if hb > 0 and hb < 10:
+        diseases.append({
+            "name": "Anemia (Moderate to Severe)",
+            "confidence": "High",
+            "category": "Hematological",
+            "indicators": [f"Low Hemoglobin: {hb} g/dL"]
+        })
+    elif hb > 0 and classify('hemoglobin', hb, *patient_profile(patient_info)).status == 'Low':
+        diseases.append({
+            "name": "Mild Anemia",
+            "confidence": "Medium",
+            "category": "Hematological",
+            "indicators": [f"Low Hemoglobin: {hb} g/dL"]
+        })
+    
+    # Blood disorder - extremely high WBC
+    if labs.get('wbc', 0) > 20:
+        diseases.append({
+            "name": "Possible Blood Disorder / Leukemia (CRITICAL)",
+            "confidence": "Medium",
+            "category": "Hematological - REQUIRES URGENT EVALUATION",
+            "indicators": [f"Very High WBC: {labs['wbc']} x10³/μL"]
+        })
+    
+    # INFLAMMATORY CONDITIONS
+    if labs.get('crp', 0) > 10 or labs.get('esr', 0) > 50:
+        if not any(d['category'] == 'Neurological' for d in diseases):
+            diseases.append({
+                "name": "Systemic Inflammatory Condition",
+                "confidence": "Medium",
+                "category": "Inflammatory",
+                "indicators": ["Significantly elevated inflammatory markers"]
+            })
+    
+    # BONE/JOINT DISEASES
+    if 'bone' in body_part or 'joint' in body_part or 'spine' in body_part:
+        if 'fracture' in observed:
+            diseases.append({
+                "name": "Bone Fracture",
+                "confidence": "High",
+                "category": "Orthopedic",
+                "indicators": ["Fracture detected on imaging"]
+            })
+        
+        if 'arthritis' in observed or 'degeneration' in observed:
+            diseases.append({
+                "name": "Arthritis / Degenerative Joint Disease",
+                "confidence": "High",
+                "category": "Orthopedic",
+                "indicators": ["Arthritic changes on imaging"]
+            })
+    
+    return diseases
+
+
+def grown_rules(extra):
+    """The disease rules plus ``extra`` rules for body parts, findings and analytes no request mentions"""
+    rules = list(DISEASE_RULES.rules)
+    for i in range(extra):
+        if i % 2:
+            rules.append(Rule(f"Synthetic Finding {i}", "Synthetic", ["Synthetic finding"],
+                              sites=[f'organ{i}'], findings=[f'sign{i}']))
+        else:
+            rules.append(Rule(f"Synthetic Marker {i}", "Synthetic", ["Synthetic marker"],
+                              when=Lab(f'marker{i}', '>', 1)))
+    return rules
+
+
+def evaluate_every_rule(rules, abnormalities, labs, scan_info):
+    """The rule table evaluated the if-chain way: every rule checked against every request"""
+    observed = scan_info.get('observedFindings', '').lower()
+    scan_type = scan_info.get('scanType', '').lower()
+    body_part = scan_info.get('bodyPart', '').lower()
+    findings = Findings(abnormalities, labs, scan_info)
+    predicted = set()
+    diseases = []
+    for rule in rules:
+        if rule.sites and not any(site in body_part and (scan is None or scan in scan_type)
+                                  for site, scan in rule.sites):
+            continue
+        if rule.findings and not any(word in observed for word in rule.findings):
+            continue
+        disease = rule.evaluate(findings, predicted)
+        if disease is not None:
+            diseases.append(disease)
+            predicted.add(disease['name'])
+            predicted.add(disease['category'])
+    return diseases
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rng = random.Random(11)
+    corpus = [synthetic_request(rng) for _ in range(count)]
+
+    # The if-chain read the abnormality sentences the response shows
+    legacy_corpus = [(patient_info, [reading.finding() for reading in abnormalities], labs, scan_info)
+                     for patient_info, abnormalities, labs, scan_info in corpus]
+
+    predicted = 0
+    for request, legacy_request in zip(corpus, legacy_corpus):
+        patient_info, abnormalities, labs, scan_info = request
+        expected = legacy_apply_disease_rules(legacy_request[0], [], *legacy_request[1:])
+        actual = apply_disease_rules(patient_info, [], abnormalities, labs, scan_info)
+        assert actual == expected, (scan_info, labs, legacy_request[1], expected, actual)
+        predicted += len(actual)
+    print(f"synthetic corpus: {count} requests, {predicted} predicted diseases, identical results")
+
+    for label, fn, requests in [('legacy if-chain', legacy_apply_disease_rules, legacy_corpus),
+                                ('indexed rule table', apply_disease_rules, corpus)]:
+        best = min(timeit.repeat(
+            lambda: [fn(patient_info, [], abnormalities, labs, scan_info)
+                     for patient_info, abnormalities, labs, scan_info in requests],
+            number=1, repeat=repeats))
+        print(f"{label:<20} {best * 1000:8.1f} ms  ({best / count * 1e6:6.2f} us/request)")
+
+    for extra in (0, 40, 200, 1000):
+        rules = grown_rules(extra)
+        engine = RuleEngine(rules)
+        for _, *request in corpus[:1000]:
+            assert engine.apply(*request) == evaluate_every_rule(rules, *request), request
+        print(f"{len(rules)} rules:")
+        for label, fn in [('every rule', lambda *request: evaluate_every_rule(rules, *request)),
+                          ('indexed', engine.apply)]:
+            best = min(timeit.repeat(
+                lambda: [fn(abnormalities, labs, scan_info) for _, abnormalities, labs, scan_info in corpus],
+                number=1, repeat=repeats))
+            print(f"  {label:<18} {best * 1000:8.1f} ms  ({best / count * 1e6:6.2f} us/request)")
+
+
+if __name__ == '__main__':
+    main()
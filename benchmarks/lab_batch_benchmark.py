@@ -0,0 +1,54 @@
+"""Micro-benchmark: /api/analyze-lab-results/batch's analyze_panels on a random cohort.
+
+Checks a sample of panels against the single-panel analysis, then times the
+batch end to end (parsing, classification and building every response dict).
+
+Run from the project root:  python benchmarks/lab_batch_benchmark.py [panels] [repeats]
+"""
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src' / 'medical'))
+
+from reference_ranges import canonical_panel, classify_panel, patient_profile
+from analyze_lab_results_step import analyze_readings
+from analyze_lab_results_batch_step import analyze_panels
+
+RANGES = {'hemoglobin': (7, 18), 'wbc': (2, 26), 'platelet': (100, 500), 'fastingBloodSugar': (60, 200),
+          'hba1c': (4.5, 9), 'totalCholesterol': (140, 290), 'ldl': (70, 200), 'hdl': (25, 80),
+          'triglycerides': (80, 300), 'bpSystolic': (100, 170), 'bpDiastolic': (60, 105), 'crp': (0.5, 20),
+          'esr': (2, 70), 'creatinine': (0.5, 2.5), 'urea': (8, 40), 'alt': (10, 90), 'ast': (10, 90)}
+
+
+def random_panel(rng, index):
+    lab_results = {key: round(rng.uniform(low, high), 1) for key, (low, high) in RANGES.items() if rng.random() < 0.6}
+    return {
+        'patientId': f'P{index:06d}',
+        'patientInfo': {'age': str(rng.randint(18, 80)), 'gender': rng.choice(['Male', 'Female'])},
+        'labResults': lab_results
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    rng = random.Random(21)
+    panels = [random_panel(rng, index) for index in range(count)]
+
+    results = analyze_panels(panels)
+    for index in rng.sample(range(count), min(count, 3000)):
+        panel = panels[index]
+        labs = canonical_panel(panel['labResults'], None)
+        expected = analyze_readings(classify_panel(labs, *patient_profile(panel['patientInfo'])))
+        assert results[index]['analysis'] == expected, (panel, results[index], expected)
+    print(f"{count} panels, sampled panels match the single-panel analysis")
+
+    # timeit pauses the garbage collector by default; a server runs with it on
+    best = min(timeit.repeat(lambda: analyze_panels(panels), setup='gc.enable()', number=1, repeat=repeats))
+    print(f"analyze_panels  {best * 1000:8.1f} ms  ({count / best:,.0f} panels/s)")
+
+
+if __name__ == '__main__':
+    main()
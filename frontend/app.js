@@ -136,7 +136,8 @@ async function analyzeImage() {
             },
             body: JSON.stringify({
                 image: uploadedImageData,
-                imageType: document.getElementById('imageType').value
+                imageType: document.getElementById('imageType').value,
+                analysis: 'full'
             })
         });
         
@@ -177,7 +178,8 @@ async function generateReport() {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({
-                labResults: labResults
+                labResults: labResults,
+                patientInfo: getPatientInfo()
             })
         });
         
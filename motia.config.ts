@@ -1,15 +1,27 @@
 import { defineConfig } from '@motiadev/core'
+import { BullMQEventAdapter } from '@motiadev/adapter-bullmq-events'
 import endpointPlugin from '@motiadev/plugin-endpoint/plugin'
 import logsPlugin from '@motiadev/plugin-logs/plugin'
 import observabilityPlugin from '@motiadev/plugin-observability/plugin'
 import statesPlugin from '@motiadev/plugin-states/plugin'
 import bullmqPlugin from '@motiadev/plugin-bullmq/plugin'
 
+const redisConnection = {
+  host: '127.0.0.1',
+  port: 6379
+}
+
 export default defineConfig({
   plugins: [observabilityPlugin, statesPlugin, endpointPlugin, logsPlugin, bullmqPlugin],
+  adapters: {
+    // Queued report jobs run on BullMQ workers; concurrency caps how many run at once per process
+    events: new BullMQEventAdapter({
+      connection: redisConnection,
+      concurrency: Number(process.env.REPORT_JOB_CONCURRENCY ?? 4)
+    })
+  },
   redis: {
-    host: '127.0.0.1',
-    port: 6379,
+    ...redisConnection,
     useMemoryServer: false
   }
 })
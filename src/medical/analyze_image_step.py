@@ -1,8 +1,30 @@
-import os
-import base64
-import io
-import json
-from PIL import Image
+import sys
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from image_upload import receive_image, UploadTooLarge
+from image_analysis import ANALYSIS_MODES, QUALITY_MAX_SIDE, probe_image, analyze_pixels, describe_quality
+from image_pool import pool_from_env, PoolBusy, ImageTaskTimeout
+from result_cache import cache_from_env
+from thumbnail_store import thumbnail_store_from_env
+from perceptual_hash import PerceptualHashIndex
+
+# Full analyses keyed by (content hash, imageType, analysis); probes are cheaper than hashing
+image_cache = cache_from_env('image', 'IMAGE', 512, 24 * 3600)
+
+# Pixel decoding and quality metrics run here, off the event loop
+image_pool = pool_from_env('analysis')
+
+# Thumbnail pyramids rendered during full analyses, served by ImageThumbnail
+thumbnail_store = thumbnail_store_from_env()
+
+# Perceptual hashes of fully analyzed images, for spotting re-exports of the same scan
+image_similarity = PerceptualHashIndex()
+
+# Used when the request names no imageType and the file (DICOM) suggests none
+DEFAULT_IMAGE_TYPE = 'MRI - Brain'
 
 config = {
     "name": "AnalyzeImage",
@@ -24,40 +46,64 @@ config = {
 }
 
 async def handler(req, context):
-    """Analyze diagnostic image and generate findings"""
+    """Analyze diagnostic image and generate findings
+    
+    The image may arrive as raw bytes (application/octet-stream or image/*),
+    as the ``image`` part of a multipart/form-data upload, or base64-encoded
+    in the JSON body. In-memory bodies are read in place, base64 is decoded
+    only as far as PIL reads, and multipart uploads are streamed into a spooled
+    buffer.
+    
+    DICOM files are accepted too; unless the request names an imageType,
+    their Modality and BodyPartExamined choose it.
+    
+    ``analysis`` selects how much of the image is decoded: ``probe`` (the
+    default) reads only the header, so its cost does not grow with image size;
+    ``full`` also decodes the pixel data and measures image quality on a
+    downsampled copy, in the image worker pool. Full analyses are cached by
+    content hash, so re-uploading the same study skips decoding altogether.
+    The same pass renders a thumbnail pyramid, linked from
+    ``metadata.thumbnails`` and served by GET /api/thumbnails/:hash/:size,
+    and a perceptual hash that counts earlier uploads of the same picture
+    (resized, re-encoded or converted) for ``metadata.similarStudies``.
+    """
     
     try:
-        # Motia passes request as dict with 'body' key containing actual data
-        if isinstance(req, dict) and 'body' in req:
-            body_content = req['body']
-            # If body is a JSON string, parse it
-            if isinstance(body_content, str):
-                import json
-                data = json.loads(body_content)
-            else:
-                data = body_content
-        elif hasattr(req, 'body'):
-            data = req.body
-        elif isinstance(req, dict):
-            data = req
-        else:
-            data = req
-        
-        # Ensure data is a dict
-        if not isinstance(data, dict):
-            context.logger.error(f"Data is not dict: {type(data)}, data: {data}")
+        try:
+            upload, fields = receive_image(req)
+        except UploadTooLarge as e:
+            return {
+                "status": 413,
+                "body": {
+                    'success': False,
+                    'error': str(e)
+                }
+            }
+        except ValueError as e:
+            context.logger.error(f"Invalid image request: {str(e)}")
             return {
                 "status": 400,
                 "body": {
                     'success': False,
-                    'error': f'Invalid data format: {type(data)}'
+                    'error': str(e)
                 }
             }
         
-        image_data = data.get('image')
-        image_type = data.get('imageType', 'MRI - Brain')
+        image_type = fields.get('imageType')
+        analysis = str(fields.get('analysis') or 'probe').lower()
+        
+        if analysis not in ANALYSIS_MODES:
+            if upload is not None:
+                upload.close()
+            return {
+                "status": 400,
+                "body": {
+                    'success': False,
+                    'error': f"analysis must be one of: {', '.join(ANALYSIS_MODES)}"
+                }
+            }
         
-        if not image_data:
+        if upload is None:
             return {
                 "status": 200,
                 "body": {
@@ -66,28 +112,30 @@ async def handler(req, context):
                 }
             }
         
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        width, height = image.size
-        format_type = image.format
-        
-        findings = generate_findings(image_type, width, height)
+        with upload:
+            try:
+                body = await analyze_upload(upload, image_type, analysis)
+            except PoolBusy as e:
+                return {
+                    "status": 503,
+                    "body": {
+                        'success': False,
+                        'error': str(e)
+                    }
+                }
+            except ImageTaskTimeout as e:
+                context.logger.error(f"Image analysis timed out: {str(e)}")
+                return {
+                    "status": 504,
+                    "body": {
+                        'success': False,
+                        'error': str(e)
+                    }
+                }
         
         return {
             "status": 200,
-            "body": {
-                'success': True,
-                'findings': findings,
-                'metadata': {
-                    'width': width,
-                    'height': height,
-                    'format': format_type
-                }
-            }
+            "body": body
         }
         
     except Exception as e:
@@ -100,15 +148,83 @@ async def handler(req, context):
             }
         }
 
-def generate_findings(image_type, width, height):
-    """Generate structured findings based on image type"""
+async def analyze_upload(upload, image_type, analysis):
+    """Analyze one received image and return the success response body.
+    
+    image_type may be None to take it from the file (DICOM) or the default.
+    Raises PoolBusy or ImageTaskTimeout when a full analysis cannot be run;
+    the caller owns (and closes) the upload.
+    """
+    cache_key = None
+    if analysis == 'full':
+        # hashlib releases the GIL, so large bodies hash without stalling the loop
+        digest = await asyncio.to_thread(upload.digest)
+        cache_key = f"{digest}:{image_type or 'auto'}:{analysis}"
+        cached = image_cache.get(cache_key)
+        has_thumbnails = thumbnail_store.has(digest)
+        # An evicted pyramid is worth a re-analysis; the links in the cached body would 404
+        if cached is not None and has_thumbnails:
+            metadata = {**cached['metadata'], 'similarStudies': similar_studies(digest, cached['metadata'])}
+            return {**cached, 'metadata': metadata, 'success': True, 'cached': True}
+    
+    quality = None
+    if analysis == 'full':
+        thumbnail_sizes = () if has_thumbnails else thumbnail_store.sizes
+        metadata, quality, thumbnails = await image_pool.run(
+            upload, analyze_pixels, QUALITY_MAX_SIDE, thumbnail_sizes
+        )
+        if thumbnails:
+            await asyncio.to_thread(thumbnail_store.put, digest, thumbnails)
+        metadata['contentHash'] = digest
+        metadata['thumbnails'] = {
+            str(size): f'/api/thumbnails/{digest}/{size}' for size in thumbnail_store.sizes
+        }
+        metadata['similarStudies'] = similar_studies(digest, metadata)
+    else:
+        image, metadata = probe_image(upload.file)
+    
+    image_type = image_type or metadata.get('imageType') or DEFAULT_IMAGE_TYPE
+    
+    metadata['imageType'] = image_type
+    metadata['bytes'] = upload.size
+    metadata['analysis'] = analysis
+    metadata['quality'] = quality
+    
+    findings = generate_findings(image_type, metadata['width'], metadata['height'], describe_quality(quality))
+    
+    if cache_key is not None:
+        image_cache.set(cache_key, {'findings': findings, 'metadata': metadata})
+    
+    return {
+        'success': True,
+        'findings': findings,
+        'metadata': metadata
+    }
+
+def similar_studies(digest, metadata):
+    """How many earlier full analyses have a perceptual hash within the match distance, and how far.
+
+    Only the count and the Hamming distances are returned: the other
+    uploads may belong to other patients, and their content hashes would
+    fetch their thumbnails. Indexes this image as a side effect, so later
+    uploads can find it.
+    """
+    if not metadata.get('perceptualHash'):
+        return {'count': 0, 'distances': []}
+    value = int(metadata['perceptualHash'], 16)
+    distances = sorted(distance for key, distance in image_similarity.search(value, limit=None) if key != digest)
+    image_similarity.add(digest, value)
+    return {'count': len(distances), 'distances': distances}
+
+def generate_findings(image_type, width, height, quality):
+    """Generate structured findings based on image type and measured quality"""
     
     image_type_lower = image_type.lower()
     
     if 'brain' in image_type_lower or 'mri' in image_type_lower:
         return {
             'modality': 'MRI Brain',
-            'quality': 'Good diagnostic quality',
+            'quality': quality,
             'findings': [
                 'Normal brain parenchymal signal intensity',
                 'No evidence of acute infarction or hemorrhage',
@@ -122,7 +238,7 @@ def generate_findings(image_type, width, height):
     elif 'chest' in image_type_lower or 'x-ray' in image_type_lower:
         return {
             'modality': 'Chest X-Ray',
-            'quality': 'Adequate penetration and positioning',
+            'quality': quality,
             'findings': [
                 'Lungs are clear bilaterally',
                 'No pleural effusion or pneumothorax',
@@ -136,7 +252,7 @@ def generate_findings(image_type, width, height):
     elif 'ct' in image_type_lower:
         return {
             'modality': 'CT Scan',
-            'quality': 'Good diagnostic quality with contrast enhancement',
+            'quality': quality,
             'findings': [
                 'No acute abnormality identified',
                 'Normal anatomical structures visualized',
@@ -150,7 +266,7 @@ def generate_findings(image_type, width, height):
     else:
         return {
             'modality': image_type,
-            'quality': 'Diagnostic quality images obtained',
+            'quality': quality,
             'findings': [
                 'Images reviewed and analyzed',
                 'No acute abnormality detected',
@@ -0,0 +1,240 @@
+import sys
+import os
+import asyncio
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from image_upload import iter_batch_images, UploadTooLarge
+from image_analysis import ANALYSIS_MODES, NOT_ASSESSED, quality_issues
+from image_pool import IMAGE_POOL_QUEUE, IMAGE_POOL_WORKERS, ImageTaskTimeout, PoolBusy
+from analyze_image_step import analyze_upload, generate_findings
+
+# Slices analyzed (and buffered) at once; kept within the image pool's queue
+IMAGE_BATCH_CONCURRENCY = int(os.environ.get(
+    'IMAGE_BATCH_CONCURRENCY', str(min(IMAGE_POOL_QUEUE, max(2, IMAGE_POOL_WORKERS)))
+))
+
+# Quality metrics summarized across slices in the study-level metadata
+STUDY_QUALITY_METRICS = ['rmsContrast', 'dynamicRange', 'snrDb', 'blurScore',
+                         'underexposedFraction', 'overexposedFraction']
+
+# Reported for a slice that fails to decode; decoder messages can carry internal object reprs
+SLICE_DECODE_ERROR = 'Unsupported or corrupt image'
+
+config = {
+    "name": "AnalyzeImages",
+    "type": "api",
+    "path": "/api/analyze-images",
+    "method": "POST",
+    "description": "Analyze every slice of a study sent as a zip/tar archive or multipart upload",
+    "emits": [],
+    "responseSchema": {
+        200: {
+            "type": "object",
+            "properties": {
+                "success": {"type": "boolean"},
+                "findings": {"type": "object"},
+                "metadata": {"type": "object"},
+                "slices": {"type": "array", "items": {"type": "object"}}
+            }
+        }
+    }
+}
+
+async def handler(req, context):
+    """Analyze a batch of images as one study
+
+    Slices are read from the archive or multipart body one at a time and
+    analyzed with bounded concurrency, so at most IMAGE_BATCH_CONCURRENCY
+    slices are held in memory. imageType and analysis come from the query
+    string, the X-Image-Type header or multipart fields sent before the files;
+    without imageType, DICOM slices supply it from their own headers.
+    """
+
+    started = time.perf_counter()
+
+    try:
+        members, fields = iter_batch_images(req)
+    except ValueError as e:
+        return {
+            "status": 400,
+            "body": {
+                'success': False,
+                'error': str(e)
+            }
+        }
+
+    semaphore = asyncio.Semaphore(IMAGE_BATCH_CONCURRENCY)
+    tasks = []
+
+    async def analyze_slice(index, name, upload, error):
+        try:
+            if error is not None:
+                return {'index': index, 'name': name, 'success': False, 'error': error}
+            with upload:
+                body = await analyze_upload(upload, image_type(), analysis())
+            return {
+                'index': index,
+                'name': name,
+                'success': True,
+                'cached': body.get('cached', False),
+                'quality': body['findings']['quality'],
+                'metadata': body['metadata']
+            }
+        except (PoolBusy, ImageTaskTimeout, UploadTooLarge) as e:
+            return {'index': index, 'name': name, 'success': False, 'error': str(e)}
+        except Exception as e:
+            context.logger.warn(f"Slice {name} could not be analyzed: {str(e)}")
+            return {'index': index, 'name': name, 'success': False, 'error': SLICE_DECODE_ERROR}
+        finally:
+            semaphore.release()
+
+    # Multipart text fields may arrive with the first parts, so read them lazily
+    def image_type():
+        return fields.get('imageType')
+
+    def analysis():
+        return str(fields.get('analysis') or 'probe').lower()
+
+    try:
+        while True:
+            await semaphore.acquire()
+            member = await asyncio.to_thread(next, members, None)
+            if member is None:
+                semaphore.release()
+                break
+            if analysis() not in ANALYSIS_MODES:
+                semaphore.release()
+                if member[1] is not None:
+                    member[1].close()
+                raise ValueError(f"analysis must be one of: {', '.join(ANALYSIS_MODES)}")
+            tasks.append(asyncio.create_task(analyze_slice(len(tasks), *member)))
+    except (ValueError, UploadTooLarge) as e:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        members.close()
+        context.logger.error(f"Invalid image batch: {str(e)}")
+        return {
+            "status": 413 if isinstance(e, UploadTooLarge) else 400,
+            "body": {
+                'success': False,
+                'error': str(e)
+            }
+        }
+    except Exception as e:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        members.close()
+        context.logger.error(f"Error analyzing image batch: {str(e)}")
+        return {
+            "status": 200,
+            "body": {
+                'success': False,
+                'error': str(e)
+            }
+        }
+
+    slices = await asyncio.gather(*tasks)
+
+    if not slices:
+        return {
+            "status": 200,
+            "body": {
+                'success': False,
+                'error': 'No images found in the batch'
+            }
+        }
+
+    study = summarize_study(image_type(), analysis(), slices)
+    study['metadata']['timeMs'] = round((time.perf_counter() - started) * 1000, 2)
+
+    context.logger.info("Image batch analyzed", {
+        "slices": len(slices),
+        "failed": study['metadata']['failed'],
+        "time_ms": study['metadata']['timeMs']
+    })
+
+    return {
+        "status": 200,
+        "body": {
+            **study,
+            'slices': slices
+        }
+    }
+
+def summarize_study(image_type, analysis, slices):
+    """Aggregate per-slice results into study-level findings and metadata"""
+
+    analyzed = [item for item in slices if item['success']]
+    dimensions = Counter((item['metadata']['width'], item['metadata']['height']) for item in analyzed)
+    formats = Counter(item['metadata']['format'] for item in analyzed)
+
+    metadata = {
+        'slices': len(slices),
+        'analyzed': len(analyzed),
+        'failed': len(slices) - len(analyzed),
+        'cached': sum(1 for item in analyzed if item['cached']),
+        'analysis': analysis,
+        'dimensions': [
+            {'width': width, 'height': height, 'slices': count}
+            for (width, height), count in dimensions.most_common()
+        ],
+        'formats': dict(formats),
+        'bytes': sum(item['metadata']['bytes'] for item in analyzed)
+    }
+
+    if not analyzed:
+        return {
+            'success': False,
+            'error': 'No image in the batch could be analyzed',
+            'metadata': metadata
+        }
+
+    measured = [item for item in analyzed if item['metadata'].get('quality')]
+    if measured:
+        summary = {}
+        for key in STUDY_QUALITY_METRICS:
+            values = [item['metadata']['quality'][key] for item in measured
+                      if item['metadata']['quality'][key] is not None]
+            if values:
+                summary[key] = {
+                    'mean': round(sum(values) / len(values), 4),
+                    'min': min(values),
+                    'max': max(values)
+                }
+
+        issues = Counter()
+        flagged = []
+        for item in measured:
+            slice_issues = quality_issues(item['metadata']['quality'])
+            if slice_issues:
+                flagged.append(item['name'])
+                issues.update(slice_issues)
+
+        metadata['quality'] = summary
+        metadata['flaggedSlices'] = flagged
+
+        if flagged:
+            quality = (f'Limited diagnostic quality in {len(flagged)} of {len(measured)} slices: '
+                       + ', '.join(issue for issue, _ in issues.most_common()))
+        else:
+            quality = f'Good diagnostic quality across all {len(measured)} slices'
+    else:
+        metadata['quality'] = None
+        quality = NOT_ASSESSED
+
+    (width, height), _ = dimensions.most_common(1)[0]
+    # Without an explicit imageType, the study takes the one most slices resolved to
+    if not image_type:
+        image_type = Counter(item['metadata']['imageType'] for item in analyzed).most_common(1)[0][0]
+
+    return {
+        'success': True,
+        'findings': generate_findings(image_type, width, height, quality),
+        'metadata': metadata
+    }
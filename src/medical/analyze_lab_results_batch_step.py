@@ -0,0 +1,258 @@
+import sys
+import os
+import json
+import math
+import time
+import asyncio
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from reference_ranges import ANALYTES, SEX_CODES, Reading, lab_field, patient_profile
+from analyze_lab_results_step import analyze_readings, blood_pressure_value, interpretation
+
+# Larger cohorts are rejected with 413; split them across requests
+LAB_BATCH_MAX_PANELS = int(os.environ.get('LAB_BATCH_MAX_PANELS', '100000'))
+
+config = {
+    "name": "AnalyzeLabResultsBatch",
+    "type": "api",
+    "path": "/api/analyze-lab-results/batch",
+    "method": "POST",
+    "description": "Analyze many patients' laboratory panels in one request",
+    "emits": [],
+    "responseSchema": {
+        200: {
+            "type": "object",
+            "properties": {
+                "success": {"type": "boolean"},
+                "summary": {"type": "object"},
+                "results": {"type": "array", "items": {"type": "object"}}
+            }
+        }
+    }
+}
+
+async def handler(req, context):
+    """Analyze a cohort of lab panels
+
+    The body is ``{"panels": [{"labResults": {...}, "patientInfo": {...}}, ...]}``;
+    a panel may carry ``labUnits`` as in /api/analyze-lab-results.
+    Each entry of ``results`` carries the same ``analysis`` object that
+    /api/analyze-lab-results returns for that panel, or the error that kept
+    it from being analyzed; one bad panel does not fail the batch.
+    """
+
+    try:
+        if isinstance(req, dict) and 'body' in req:
+            body_content = req['body']
+            data = json.loads(body_content) if isinstance(body_content, str) else body_content
+        elif hasattr(req, 'body'):
+            data = req.body
+        else:
+            data = req
+
+        panels = data.get('panels') if isinstance(data, dict) else None
+        if not isinstance(panels, list):
+            return {
+                "status": 400,
+                "body": {'success': False, 'error': 'panels must be a list of {labResults, patientInfo} objects'}
+            }
+        if len(panels) > LAB_BATCH_MAX_PANELS:
+            return {
+                "status": 413,
+                "body": {'success': False, 'error': f'At most {LAB_BATCH_MAX_PANELS} panels per request'}
+            }
+
+        started = time.perf_counter()
+        results = await asyncio.to_thread(analyze_panels, panels)
+        summary = summarize_cohort(results)
+        summary['timeMs'] = round((time.perf_counter() - started) * 1000, 2)
+
+        context.logger.info("Lab panel batch analyzed", {
+            "panels": summary['panels'],
+            "failed": summary['failed'],
+            "time_ms": summary['timeMs']
+        })
+
+        return {
+            "status": 200,
+            "body": {
+                'success': True,
+                'summary': summary,
+                'results': results
+            }
+        }
+
+    except Exception as e:
+        context.logger.error(f"Error analyzing lab panel batch: {str(e)}")
+        return {
+            "status": 200,
+            "body": {
+                'success': False,
+                'error': str(e)
+            }
+        }
+
+def analyze_panels(panels):
+    """Classify every panel column by column, then render each patient's analysis.
+
+    Values are gathered into one float column per analyte (NaN where a panel
+    lacks it), converted from other units a column at a time, and classified
+    with np.searchsorted against each distinct set of sex/age limits. Each
+    distinct (band, limits) of a column is rendered once by analyze_readings
+    and copied into every panel that has it with the panel's own value, so
+    only parsing the input and building the response dicts remain per panel.
+
+    On one core this runs at about 37k random panels/s end to end, garbage
+    collector on (benchmarks/lab_batch_benchmark.py); building the response
+    dicts takes most of it.
+    """
+    count = len(panels)
+    columns = {analyte.key: [math.nan] * count for analyte in ANALYTES}
+    # Conversion index per row, for the analytes some panel sent in another unit
+    conversions = {}
+    sex_codes = np.full(count, SEX_CODES['any'], dtype=np.intp)
+    ages = np.full(count, np.nan)
+    errors = [None] * count
+    patient_ids = [None] * count
+    # Cohorts repeat the same few gender/age strings
+    profiles_seen = {}
+
+    for index, panel in enumerate(panels):
+        if not isinstance(panel, dict):
+            errors[index] = 'Invalid panel format'
+            continue
+        patient_info = panel.get('patientInfo') or {}
+        patient_ids[index] = panel.get('patientId', patient_info.get('patientId'))
+        try:
+            profile_key = (patient_info.get('gender'), patient_info.get('age'))
+            sex, age = profiles_seen.get(profile_key) or profiles_seen.setdefault(
+                profile_key, patient_profile(patient_info))
+        except TypeError:
+            sex, age = patient_profile(patient_info)
+        sex_codes[index] = SEX_CODES[sex]
+        if age is not None:
+            ages[index] = age
+        try:
+            units = panel.get('labUnits') or {}
+            for key, value in (panel.get('labResults') or {}).items():
+                if value is None or value == '':
+                    continue
+                field = lab_field(key, value, units.get(key))
+                if field is None:
+                    continue
+                (analyte, rank, conversion, _, _), number = field
+                if number <= 0:
+                    continue
+                column = columns[analyte.key]
+                # The canonical key wins over aliases, as in canonical_panel
+                if rank == 0 or column[index] != column[index]:
+                    column[index] = number
+                    if conversion and analyte.key not in conversions:
+                        conversions[analyte.key] = [0] * count
+                    if analyte.key in conversions:
+                        conversions[analyte.key][index] = conversion
+        except (TypeError, ValueError, AttributeError) as e:
+            errors[index] = str(e)
+
+    failed = [error is not None for error in errors]
+    classified = {}
+    for analyte in ANALYTES:
+        values = np.array(columns[analyte.key], dtype=np.float64)
+        if np.isnan(values).all():
+            continue
+        if analyte.key in conversions:
+            values = analyte.convert_array(values, np.array(conversions[analyte.key], dtype=np.intp))
+        bands, profiles = analyte.classify_array(values, sex_codes, ages)
+        classified[analyte.key] = (analyte, values, bands, profiles)
+
+    # One column per results entry, in table order: a code per row (0 when the
+    # entry is absent) and the classified columns the entry is read from
+    layout = []
+    for key, (analyte, values, bands, profiles) in classified.items():
+        if key == 'bpDiastolic':
+            continue
+        # 0 when unmeasured, otherwise a distinct code per (band, limits)
+        code = np.where(bands < 0, 0, 1 + bands * len(analyte.profiles) + profiles)
+        if key == 'bpSystolic':
+            # Reported as one Blood Pressure entry, and only with both values
+            if 'bpDiastolic' not in classified:
+                continue
+            diastolic = classified['bpDiastolic']
+            radix = 1 + len(diastolic[0].bands) * len(diastolic[0].profiles)
+            diastolic_code = np.where(diastolic[2] < 0, 0, 1 + diastolic[2] * len(diastolic[0].profiles) + diastolic[3])
+            code = np.where((code > 0) & (diastolic_code > 0), code * radix + diastolic_code, 0)
+            layout.append((code, (classified[key], diastolic)))
+        else:
+            layout.append((code, (classified[key],)))
+
+    entries = [[] for _ in range(count)]
+    abnormalities = [[] for _ in range(count)]
+    risks = [[] for _ in range(count)]
+    for code, sources in layout:
+        code[failed] = 0
+        # Each code is rendered once by analyze_readings, the single-panel path,
+        # then copied into every row with that code with the row's own value
+        cells = {}
+        for value, row in zip(*(array.tolist() for array in np.unique(code, return_index=True))):
+            if value:
+                readings = [
+                    Reading(analyte, values[row], analyte.bands[bands[row]], analyte.profiles[profiles[row]][1])
+                    for analyte, values, bands, profiles in sources
+                ]
+                cells[value] = analyze_readings(readings)
+        templates = {value: analysis['results'][0] for value, analysis in cells.items()}
+        rows = np.flatnonzero(code)
+        if len(sources) == 1:
+            shown = sources[0][1][rows].tolist()
+        else:
+            shown = [blood_pressure_value(systolic, diastolic)
+                     for systolic, diastolic in zip(sources[0][1][rows].tolist(), sources[1][1][rows].tolist())]
+        for row, value, shown_value in zip(rows.tolist(), code[rows].tolist(), shown):
+            # Copying a dict is much cheaper than building one; the copy keeps 'value' in its place
+            entry = templates[value].copy()
+            entry['value'] = shown_value
+            entries[row].append(entry)
+        abnormal = [value for value, analysis in cells.items() if analysis['abnormalities']]
+        if abnormal:
+            rows = np.flatnonzero(np.isin(code, abnormal))
+            for row, value in zip(rows.tolist(), code[rows].tolist()):
+                analysis = cells[value]
+                abnormalities[row] += analysis['abnormalities']
+                risks[row] += analysis['riskIndicators']
+
+    results = []
+    for index in range(count):
+        if errors[index] is not None:
+            results.append({'index': index, 'patientId': patient_ids[index], 'success': False, 'error': errors[index]})
+            continue
+        abnormal = abnormalities[index]
+        risk = risks[index]
+        results.append({
+            'index': index,
+            'patientId': patient_ids[index],
+            'success': True,
+            'analysis': {
+                'results': entries[index],
+                'abnormalities': abnormal,
+                'riskIndicators': list(dict.fromkeys(risk)) if len(risk) > 1 else risk,
+                'interpretation': interpretation(len(abnormal))
+            }
+        })
+    return results
+
+def summarize_cohort(results):
+    """Counts across the batch: panels, failures and patients per risk indicator"""
+    analyzed = [item['analysis'] for item in results if item['success']]
+    risks = Counter(risk for analysis in analyzed for risk in analysis['riskIndicators'])
+    return {
+        'panels': len(results),
+        'analyzed': len(analyzed),
+        'failed': len(results) - len(analyzed),
+        'withAbnormalities': sum(1 for analysis in analyzed if analysis['abnormalities']),
+        'riskIndicators': dict(risks.most_common())
+    }
@@ -1,3 +1,10 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from reference_ranges import canonical_panel, classify_panel, patient_profile
+
 config = {
     "name": "AnalyzeLabResults",
     "type": "api",
@@ -17,7 +24,13 @@ config = {
 }
 
 async def handler(req, context):
-    """Analyze laboratory test results and detect abnormalities"""
+    """Analyze laboratory test results and detect abnormalities
+    
+    Values are classified by the shared reference-range table, using the
+    sex- and age-specific limits for ``patientInfo`` when it is sent. A value
+    in another unit is converted first: send it as '5.4 mmol/L', or name
+    its unit in ``labUnits``.
+    """
     
     try:
         # Motia passes request as dict with 'body' key
@@ -44,140 +57,10 @@ async def handler(req, context):
             }
             
         lab_results = data.get('labResults', {})
+        sex, age = patient_profile(data.get('patientInfo') or {})
         
-        analysis = {
-            'results': [],
-            'abnormalities': [],
-            'riskIndicators': [],
-            'interpretation': ''
-        }
-        
-        hemoglobin = float(lab_results.get('hemoglobin', 0))
-        if hemoglobin > 0:
-            status = 'Normal'
-            flag = ''
-            if hemoglobin < 12:
-                status = 'Low'
-                flag = 'Anemia indicated'
-                analysis['abnormalities'].append('Low hemoglobin - possible anemia')
-                analysis['riskIndicators'].append('Anemia Risk')
-            elif hemoglobin > 17:
-                status = 'High'
-                flag = 'Polycythemia concern'
-                analysis['abnormalities'].append('High hemoglobin - polycythemia concern')
-            
-            analysis['results'].append({
-                'test': 'Hemoglobin',
-                'value': hemoglobin,
-                'unit': 'g/dL',
-                'normalRange': '12-17 g/dL',
-                'status': status,
-                'flag': flag
-            })
-        
-        blood_sugar = float(lab_results.get('bloodSugar', 0))
-        if blood_sugar > 0:
-            status = 'Normal'
-            flag = ''
-            if blood_sugar < 70:
-                status = 'Low'
-                flag = 'Hypoglycemia'
-                analysis['abnormalities'].append('Low blood sugar - hypoglycemia risk')
-                analysis['riskIndicators'].append('Hypoglycemia Risk')
-            elif blood_sugar > 100 and blood_sugar < 126:
-                status = 'Borderline'
-                flag = 'Pre-diabetic range'
-                analysis['abnormalities'].append('Elevated blood sugar - pre-diabetic range')
-                analysis['riskIndicators'].append('Pre-Diabetes Risk')
-            elif blood_sugar >= 126:
-                status = 'High'
-                flag = 'Diabetic range'
-                analysis['abnormalities'].append('High blood sugar - diabetic range')
-                analysis['riskIndicators'].append('Diabetes Risk')
-            
-            analysis['results'].append({
-                'test': 'Fasting Blood Sugar',
-                'value': blood_sugar,
-                'unit': 'mg/dL',
-                'normalRange': '70-100 mg/dL',
-                'status': status,
-                'flag': flag
-            })
-        
-        cholesterol = float(lab_results.get('cholesterol', 0))
-        if cholesterol > 0:
-            status = 'Normal'
-            flag = ''
-            if cholesterol > 200 and cholesterol < 240:
-                status = 'Borderline'
-                flag = 'Borderline high'
-                analysis['abnormalities'].append('Borderline high cholesterol')
-                analysis['riskIndicators'].append('Cardiovascular Risk')
-            elif cholesterol >= 240:
-                status = 'High'
-                flag = 'High cholesterol'
-                analysis['abnormalities'].append('High cholesterol - cardiovascular risk')
-                analysis['riskIndicators'].append('High Cardiovascular Risk')
-            
-            analysis['results'].append({
-                'test': 'Total Cholesterol',
-                'value': cholesterol,
-                'unit': 'mg/dL',
-                'normalRange': '<200 mg/dL',
-                'status': status,
-                'flag': flag
-            })
-        
-        bp_systolic = float(lab_results.get('bpSystolic', 0))
-        bp_diastolic = float(lab_results.get('bpDiastolic', 0))
-        if bp_systolic > 0 and bp_diastolic > 0:
-            status = 'Normal'
-            flag = ''
-            if bp_systolic >= 120 and bp_systolic < 130:
-                status = 'Elevated'
-                flag = 'Elevated BP'
-                analysis['abnormalities'].append('Elevated blood pressure')
-                analysis['riskIndicators'].append('Hypertension Risk')
-            elif bp_systolic >= 130 or bp_diastolic >= 80:
-                status = 'High'
-                flag = 'Hypertension'
-                analysis['abnormalities'].append('Hypertension detected')
-                analysis['riskIndicators'].append('Hypertension')
-            
-            analysis['results'].append({
-                'test': 'Blood Pressure',
-                'value': f'{bp_systolic}/{bp_diastolic}',
-                'unit': 'mmHg',
-                'normalRange': '<120/80 mmHg',
-                'status': status,
-                'flag': flag
-            })
-        
-        creatinine = float(lab_results.get('creatinine', 0))
-        if creatinine > 0:
-            status = 'Normal'
-            flag = ''
-            if creatinine > 1.2:
-                status = 'High'
-                flag = 'Kidney function concern'
-                analysis['abnormalities'].append('Elevated creatinine - kidney function evaluation needed')
-                analysis['riskIndicators'].append('Kidney Function Risk')
-            
-            analysis['results'].append({
-                'test': 'Serum Creatinine',
-                'value': creatinine,
-                'unit': 'mg/dL',
-                'normalRange': '0.6-1.2 mg/dL',
-                'status': status,
-                'flag': flag
-            })
-        
-        if len(analysis['abnormalities']) == 0:
-            analysis['interpretation'] = 'All laboratory parameters are within normal limits. No significant abnormalities detected.'
-        else:
-            analysis['interpretation'] = f'Laboratory analysis reveals {len(analysis["abnormalities"])} abnormal finding(s) requiring clinical attention and possible intervention.'
-        
-        analysis['riskIndicators'] = list(set(analysis['riskIndicators']))
+        labs = canonical_panel(lab_results, data.get('labUnits'))
+        analysis = analyze_readings(classify_panel(labs, sex, age))
         
         return {
             "status": 200,
@@ -196,3 +79,76 @@ async def handler(req, context):
                 'error': str(e)
             }
         }
+
+def analyze_readings(readings, sources=None):
+    """Build the analysis body (results, abnormalities, riskIndicators,
+    interpretation) from one patient's classified readings, in table order.
+    
+    When a sources list is passed, the readings behind each results entry
+    are appended to it, so a caller can reuse the body for other patients
+    whose values fall in the same bands.
+    """
+    
+    analysis = {
+        'results': [],
+        'abnormalities': [],
+        'riskIndicators': [],
+        'interpretation': ''
+    }
+    
+    diastolic = next((r for r in readings if r.analyte.key == 'bpDiastolic'), None)
+    
+    for reading in readings:
+        key = reading.analyte.key
+        if key == 'bpDiastolic':
+            continue
+        if key == 'bpSystolic':
+            # Reported as one Blood Pressure entry, judged by the worse of the two
+            if diastolic is None:
+                continue
+            worst = max(reading, diastolic, key=lambda r: r.band.severity)
+            if sources is not None:
+                sources.append((reading, diastolic))
+            add_reading(analysis, worst, {
+                'test': 'Blood Pressure',
+                'value': blood_pressure_value(reading.value, diastolic.value),
+                'unit': 'mmHg',
+                'normalRange': f'{reading.normal_range} / {diastolic.normal_range}'
+            })
+            continue
+        if sources is not None:
+            sources.append((reading,))
+        add_reading(analysis, reading, {
+            'test': reading.analyte.test,
+            'value': reading.value,
+            'unit': reading.analyte.unit,
+            'normalRange': reading.normal_range
+        })
+    
+    analysis['interpretation'] = interpretation(len(analysis['abnormalities']))
+    
+    analysis['riskIndicators'] = list(dict.fromkeys(analysis['riskIndicators']))
+    
+    return analysis
+
+def interpretation(abnormal_count):
+    """The analysis' closing sentence for a panel with this many abnormal values"""
+    if abnormal_count == 0:
+        return 'All laboratory parameters are within normal limits. No significant abnormalities detected.'
+    return f'Laboratory analysis reveals {abnormal_count} abnormal finding(s) requiring clinical attention and possible intervention.'
+
+def blood_pressure_value(systolic, diastolic):
+    return f'{systolic}/{diastolic}'
+
+def add_reading(analysis, reading, result):
+    """Append a classified value to the results, and to abnormalities and risks when out of range"""
+    band = reading.band
+    if band.abnormal:
+        analysis['abnormalities'].append(reading.summary())
+        if band.risk:
+            analysis['riskIndicators'].append(band.risk)
+    analysis['results'].append({
+        **result,
+        'status': band.status,
+        'flag': reading.flag if band.abnormal else ''
+    })
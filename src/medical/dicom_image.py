@@ -0,0 +1,178 @@
+import io
+import struct
+
+import numpy as np
+
+try:
+    import pydicom
+    # pydicom.pixels is new in pydicom 3; 2.x is treated as not installed
+    from pydicom.pixels import pixel_array as decode_pixel_array
+except ImportError:
+    pydicom = None
+    decode_pixel_array = None
+
+# "DICM" follows the 128-byte preamble of every DICOM Part 10 file
+DICOM_MAGIC_OFFSET = 128
+DICOM_MAGIC = b'DICM'
+
+PIXEL_DATA_TAG = (0x7FE0, 0x0010)
+UNDEFINED_LENGTH = 0xFFFFFFFF
+# VRs whose explicit-VR element header has 2 reserved bytes and a 4-byte length
+LONG_VRS = {b'OB', b'OD', b'OF', b'OL', b'OV', b'OW', b'SQ', b'UC', b'UN', b'UR', b'UT'}
+
+# Modality codes mapped to the imageType vocabulary used by the frontend
+MODALITY_IMAGE_TYPES = {
+    'MR': 'MRI',
+    'CT': 'CT Scan',
+    'CR': 'X-Ray',
+    'DX': 'X-Ray',
+    'RG': 'X-Ray',
+    'US': 'Ultrasound',
+    'MG': 'Mammography',
+    'PT': 'PET',
+    'NM': 'Nuclear Medicine',
+    'XA': 'Angiography'
+}
+
+
+def is_dicom(file):
+    """Whether a seekable file starts like a DICOM Part 10 file"""
+    position = file.tell()
+    try:
+        file.seek(DICOM_MAGIC_OFFSET)
+        return file.read(len(DICOM_MAGIC)) == DICOM_MAGIC
+    finally:
+        file.seek(position)
+
+
+def read_header(file):
+    """Parse every element before the pixel data, leaving the pixels unread.
+
+    Returns (dataset, offset) where offset is where the pixel data element
+    starts, or None when the file has no pixel data.
+    """
+    if pydicom is None:
+        raise ValueError('DICOM support requires pydicom 3 or later; install it to analyze DICOM files')
+    file.seek(0)
+    dataset = pydicom.dcmread(file, stop_before_pixels=True)
+    offset = file.tell()
+    file.seek(offset)
+    head = file.read(8)
+    if len(head) < 8:
+        return dataset, None
+    little = dataset.file_meta.TransferSyntaxUID.is_little_endian
+    group, element = struct.unpack('<HH' if little else '>HH', head[:4])
+    if (group, element) != PIXEL_DATA_TAG:
+        return dataset, None
+    return dataset, offset
+
+
+def text_value(dataset, keyword):
+    value = dataset.get(keyword)
+    return str(value) if value not in (None, '') else None
+
+
+def dicom_image_type(dataset):
+    """imageType such as 'MRI - Brain' from Modality and BodyPartExamined"""
+    modality = (text_value(dataset, 'Modality') or '').upper()
+    if not modality:
+        return None
+    name = MODALITY_IMAGE_TYPES.get(modality, modality)
+    body_part = (text_value(dataset, 'BodyPartExamined') or '').strip()
+    return f'{name} - {body_part.title()}' if body_part else name
+
+
+def dicom_metadata(dataset):
+    """Image properties from a DICOM header, in the same shape as probe_image.
+
+    Only technical attributes are returned; patient identifiers are left out.
+    """
+    samples = int(dataset.get('SamplesPerPixel', 1) or 1)
+    bits_allocated = int(dataset.get('BitsAllocated', 8) or 8)
+    signed = int(dataset.get('PixelRepresentation', 0) or 0) == 1
+    if samples == 3:
+        mode = 'RGB'
+    elif bits_allocated <= 8:
+        mode = 'L'
+    elif bits_allocated == 16:
+        mode = 'I;16S' if signed else 'I;16'
+    else:
+        mode = 'I'
+    syntax = dataset.file_meta.TransferSyntaxUID
+
+    return {
+        'width': int(dataset.get('Columns', 0) or 0),
+        'height': int(dataset.get('Rows', 0) or 0),
+        'format': 'DICOM',
+        'mode': mode,
+        'frames': int(dataset.get('NumberOfFrames', 1) or 1),
+        'dicom': {
+            'modality': text_value(dataset, 'Modality'),
+            'bodyPart': text_value(dataset, 'BodyPartExamined'),
+            'seriesInstanceUid': text_value(dataset, 'SeriesInstanceUID'),
+            'studyDescription': text_value(dataset, 'StudyDescription'),
+            'seriesDescription': text_value(dataset, 'SeriesDescription'),
+            'photometricInterpretation': text_value(dataset, 'PhotometricInterpretation'),
+            'bitsStored': int(dataset.get('BitsStored', bits_allocated) or bits_allocated),
+            'transferSyntax': syntax.name,
+            'compressed': syntax.is_compressed
+        }
+    }
+
+
+def pixel_buffer(file, offset, length):
+    """Bytes of the pixel data, mapped rather than copied where possible.
+
+    Shared-memory readers (the image worker pool) and spooled uploads that
+    have spilled to disk are memory-mapped; anything else is read.
+    """
+    view = getattr(file, 'view', None)
+    if view is not None:
+        return view[offset:offset + length]
+    if getattr(file, '_rolled', False) or isinstance(file, (io.BufferedReader, io.FileIO)):
+        return np.memmap(file, dtype=np.uint8, mode='r', offset=offset, shape=(length,))
+    file.seek(offset)
+    return file.read(length)
+
+
+def first_frame(file, dataset, offset):
+    """First frame of the pixel data as an array of stored values"""
+    syntax = dataset.file_meta.TransferSyntaxUID
+    rows = int(dataset.Rows)
+    columns = int(dataset.Columns)
+    samples = int(dataset.get('SamplesPerPixel', 1) or 1)
+    bits_allocated = int(dataset.BitsAllocated)
+
+    file.seek(offset + 4)
+    if syntax.is_implicit_VR:
+        header_length = 8
+        (length,) = struct.unpack('<I', file.read(4))
+    else:
+        vr = file.read(2)
+        if vr in LONG_VRS:
+            header_length = 12
+            file.seek(2, io.SEEK_CUR)
+            (length,) = struct.unpack('<I' if syntax.is_little_endian else '>I', file.read(4))
+        else:
+            header_length = 8
+            (length,) = struct.unpack('<H' if syntax.is_little_endian else '>H', file.read(2))
+
+    if syntax.is_compressed or length == UNDEFINED_LENGTH:
+        # Encapsulated frames need a codec; let pydicom decode just the first one
+        file.seek(0)
+        return decode_pixel_array(file, index=0)
+
+    if bits_allocated not in (8, 16, 32):
+        raise ValueError(f'Unsupported DICOM BitsAllocated: {bits_allocated}')
+
+    signed = int(dataset.get('PixelRepresentation', 0) or 0) == 1
+    dtype = np.dtype(('i' if signed else 'u') + str(bits_allocated // 8))
+    dtype = dtype.newbyteorder('<' if syntax.is_little_endian else '>')
+    count = rows * columns * samples
+    pixels = np.frombuffer(pixel_buffer(file, offset + header_length, count * dtype.itemsize), dtype=dtype, count=count)
+
+    if samples == 1:
+        return pixels.reshape(rows, columns)
+    if int(dataset.get('PlanarConfiguration', 0) or 0) == 1:
+        return pixels.reshape(samples, rows, columns).transpose(1, 2, 0)
+    return pixels.reshape(rows, columns, samples)
@@ -0,0 +1,15 @@
+config = {
+    "name": "dietSections",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "id": {"type": "string"},
+            "section": {"type": "string"},
+            "content": {},
+            "order": {"type": "number"},
+            "updatedAt": {"type": "string"}
+        },
+        "required": ["id", "section", "order"]
+    },
+    "baseConfig": {"storageType": "default"}
+}
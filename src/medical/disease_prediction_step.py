@@ -1,5 +1,14 @@
+import sys
 import json
-from typing import Dict, List, Any, Tuple
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from singleflight import SingleFlight
+from reference_ranges import Reading, canonical_panel, classify_panel, patient_profile
+from disease_rules import DISEASE_RULES
 
 # Motia API configuration
 config = {
@@ -20,6 +29,9 @@ config = {
     }
 }
 
+# Identical prediction requests in flight at the same time share one evaluation
+prediction_flight = SingleFlight('prediction')
+
 async def handler(req, context):
     """Motia API handler for disease prediction"""
     try:
@@ -41,8 +53,11 @@ async def handler(req, context):
                 "body": {'success': False, 'error': 'Invalid request format'}
             }
         
-        # Perform disease prediction
-        result = predict_disease(data, context)
+        # Perform disease prediction, coalescing identical concurrent requests
+        result = await prediction_flight.do(
+            prediction_key(data),
+            lambda: asyncio.to_thread(predict_disease, data, context)
+        )
         
         return {"status": 200, "body": result}
         
@@ -54,6 +69,15 @@ async def handler(req, context):
         }
 
 
+def prediction_key(data: Dict[str, Any]) -> str:
+    """Canonical key for the prediction inputs"""
+    return json.dumps(
+        [data.get('patientInfo', {}), data.get('scanInfo', {}), data.get('labValues', {}), data.get('labUnits') or {}],
+        sort_keys=True,
+        default=str
+    )
+
+
 def predict_disease(data: Dict[str, Any], context) -> Dict[str, Any]:
     """Main disease prediction function"""
     
@@ -62,6 +86,7 @@ def predict_disease(data: Dict[str, Any], context) -> Dict[str, Any]:
         patient_info = data.get('patientInfo', {})
         scan_info = data.get('scanInfo', {})
         lab_values = data.get('labValues', {})
+        lab_units = data.get('labUnits')
         
         context.logger.info(f"Predicting diseases for patient age: {patient_info.get('age')}")
         
@@ -73,11 +98,11 @@ def predict_disease(data: Dict[str, Any], context) -> Dict[str, Any]:
         }
         
         # Normalize and validate lab values
-        normalized_labs = normalize_lab_values(lab_values)
+        normalized_labs = normalize_lab_values(lab_values, lab_units)
         
         # Identify lab abnormalities
         lab_abnormalities = identify_lab_abnormalities(normalized_labs, patient_info)
-        supporting_evidence["lab_abnormalities"] = lab_abnormalities
+        supporting_evidence["lab_abnormalities"] = [reading.finding() for reading in lab_abnormalities]
         
         # Extract scan findings
         scan_findings = extract_scan_findings(scan_info)
@@ -127,145 +152,25 @@ def predict_disease(data: Dict[str, Any], context) -> Dict[str, Any]:
         }
 
 
-def normalize_lab_values(lab_values: Dict[str, Any]) -> Dict[str, float]:
-    """Normalize and convert lab values to float"""
-    normalized = {}
-    
-    for key, value in lab_values.items():
-        if value is None or value == '':
-            continue
-        try:
-            normalized[key] = float(value)
-        except (ValueError, TypeError):
-            continue
-    
-    return normalized
+def normalize_lab_values(lab_values: Dict[str, Any], units: Optional[Dict[str, str]] = None) -> Dict[str, float]:
+    """Lab values as floats under their canonical keys, converted to US units
+    
+    Aliases (hb, bun, bloodSugar, cholesterol) are renamed and values sent
+    in another unit ('7.0 mmol/L', or a plain number with its unit in
+    ``units``) are converted, one LAB_FIELDS lookup per field. Values that
+    cannot be read are skipped.
+    """
+    return canonical_panel(lab_values, units, strict=False)
 
 
-def identify_lab_abnormalities(labs: Dict[str, float], patient_info: Dict[str, Any]) -> List[str]:
-    """Identify abnormal lab values based on reference ranges"""
-    abnormalities = []
-    gender = patient_info.get('gender', '').lower()
-    age = int(patient_info.get('age', 0)) if patient_info.get('age') else 0
-    
-    # Hemoglobin
-    if 'hemoglobin' in labs or 'hb' in labs:
-        hb = labs.get('hemoglobin', labs.get('hb', 0))
-        if hb > 0:
-            if gender == 'male':
-                if hb < 13.0:
-                    abnormalities.append(f"Low Hemoglobin ({hb} g/dL, normal: 13-17)")
-                elif hb > 17.0:
-                    abnormalities.append(f"High Hemoglobin ({hb} g/dL)")
-            elif gender == 'female':
-                if hb < 12.0:
-                    abnormalities.append(f"Low Hemoglobin ({hb} g/dL, normal: 12-16)")
-                elif hb > 16.0:
-                    abnormalities.append(f"High Hemoglobin ({hb} g/dL)")
-    
-    # White Blood Cell Count
-    if 'wbc' in labs:
-        wbc = labs['wbc']
-        if wbc < 4.0:
-            abnormalities.append(f"Low WBC ({wbc} x10³/μL, normal: 4-11)")
-        elif wbc > 11.0:
-            abnormalities.append(f"High WBC ({wbc} x10³/μL, possible infection)")
-        elif wbc > 20.0:
-            abnormalities.append(f"Very High WBC ({wbc} x10³/μL, CRITICAL)")
-    
-    # Platelet Count
-    if 'platelet' in labs:
-        plt = labs['platelet']
-        if plt < 150:
-            abnormalities.append(f"Low Platelet Count ({plt} x10³/μL, normal: 150-400)")
-        elif plt > 400:
-            abnormalities.append(f"High Platelet Count ({plt} x10³/μL)")
-    
-    # Fasting Blood Sugar
-    if 'fastingBloodSugar' in labs or 'bloodSugar' in labs:
-        fbs = labs.get('fastingBloodSugar', labs.get('bloodSugar', 0))
-        if fbs >= 126:
-            abnormalities.append(f"High Fasting Blood Sugar ({fbs} mg/dL, diabetes range)")
-        elif fbs >= 100:
-            abnormalities.append(f"Elevated Fasting Blood Sugar ({fbs} mg/dL, pre-diabetes)")
-    
-    # HbA1c
-    if 'hba1c' in labs:
-        hba1c = labs['hba1c']
-        if hba1c >= 6.5:
-            abnormalities.append(f"High HbA1c ({hba1c}%, diabetes range)")
-        elif hba1c >= 5.7:
-            abnormalities.append(f"Elevated HbA1c ({hba1c}%, pre-diabetes)")
-    
-    # Total Cholesterol
-    if 'totalCholesterol' in labs or 'cholesterol' in labs:
-        chol = labs.get('totalCholesterol', labs.get('cholesterol', 0))
-        if chol >= 240:
-            abnormalities.append(f"High Total Cholesterol ({chol} mg/dL, normal: <200)")
-        elif chol >= 200:
-            abnormalities.append(f"Borderline High Cholesterol ({chol} mg/dL)")
-    
-    # LDL Cholesterol
-    if 'ldl' in labs:
-        ldl = labs['ldl']
-        if ldl >= 160:
-            abnormalities.append(f"High LDL ({ldl} mg/dL, normal: <100)")
-        elif ldl >= 130:
-            abnormalities.append(f"Borderline High LDL ({ldl} mg/dL)")
-    
-    # HDL Cholesterol
-    if 'hdl' in labs:
-        hdl = labs['hdl']
-        if hdl < 40:
-            abnormalities.append(f"Low HDL ({hdl} mg/dL, normal: >40)")
-    
-    # Triglycerides
-    if 'triglycerides' in labs:
-        trig = labs['triglycerides']
-        if trig >= 200:
-            abnormalities.append(f"High Triglycerides ({trig} mg/dL, normal: <150)")
-        elif trig >= 150:
-            abnormalities.append(f"Borderline High Triglycerides ({trig} mg/dL)")
-    
-    # CRP (C-Reactive Protein)
-    if 'crp' in labs:
-        crp = labs['crp']
-        if crp > 10:
-            abnormalities.append(f"Very High CRP ({crp} mg/L, severe inflammation)")
-        elif crp > 3:
-            abnormalities.append(f"Elevated CRP ({crp} mg/L, inflammation present)")
-    
-    # ESR (Erythrocyte Sedimentation Rate)
-    if 'esr' in labs:
-        esr = labs['esr']
-        if esr > 30:
-            abnormalities.append(f"Elevated ESR ({esr} mm/hr, inflammation/infection)")
-    
-    # Creatinine
-    if 'creatinine' in labs:
-        creat = labs['creatinine']
-        if creat > 1.3:
-            abnormalities.append(f"High Creatinine ({creat} mg/dL, possible kidney dysfunction)")
-    
-    # Urea/BUN
-    if 'urea' in labs or 'bun' in labs:
-        urea = labs.get('urea', labs.get('bun', 0))
-        if urea > 20:
-            abnormalities.append(f"Elevated Urea/BUN ({urea} mg/dL, kidney function concern)")
-    
-    # ALT (Liver enzyme)
-    if 'alt' in labs:
-        alt = labs['alt']
-        if alt > 40:
-            abnormalities.append(f"Elevated ALT ({alt} U/L, possible liver issue)")
-    
-    # AST (Liver enzyme)
-    if 'ast' in labs:
-        ast = labs['ast']
-        if ast > 40:
-            abnormalities.append(f"Elevated AST ({ast} U/L, possible liver issue)")
-    
-    return abnormalities
+def identify_lab_abnormalities(labs: Dict[str, float], patient_info: Dict[str, Any]) -> List[Reading]:
+    """Identify abnormal lab values based on reference ranges
+    
+    The readings themselves are returned; rules test their analyte and
+    direction, and Reading.finding() renders the sentence for the response.
+    """
+    sex, age = patient_profile(patient_info)
+    return [reading for reading in classify_panel(labs, sex, age) if reading.band.abnormal]
 
 
 def extract_scan_findings(scan_info: Dict[str, Any]) -> List[str]:
@@ -291,231 +196,22 @@ def extract_scan_findings(scan_info: Dict[str, Any]) -> List[str]:
 def apply_disease_rules(
     patient_info: Dict[str, Any],
     scan_findings: List[str],
-    lab_abnormalities: List[str],
+    lab_abnormalities: List[Reading],
     labs: Dict[str, float],
     scan_info: Dict[str, Any]
 ) -> List[Dict[str, Any]]:
-    """Apply rule-based disease prediction logic"""
-    
-    diseases = []
-    
-    # Extract key information
-    observed = scan_info.get('observedFindings', '').lower()
-    severity = scan_info.get('severity', '').lower()
-    scan_type = scan_info.get('scanType', '').lower()
-    body_part = scan_info.get('bodyPart', '').lower()
-    
-    # NEUROLOGICAL DISEASES
-    if 'brain' in body_part:
-        if 'lesion' in observed and any('crp' in abn.lower() or 'esr' in abn.lower() for abn in lab_abnormalities):
-            diseases.append({
-                "name": "Possible Encephalitis",
-                "confidence": "High" if severity == "severe" else "Medium",
-                "category": "Neurological",
-                "indicators": ["Brain lesion on imaging", "Elevated inflammatory markers"]
-            })
-        
-        if 'mass' in observed or 'tumor' in observed:
-            diseases.append({
-                "name": "Possible Brain Tumor",
-                "confidence": "High" if severity == "severe" else "Medium",
-                "category": "Neurological",
-                "indicators": ["Mass/tumor detected on imaging"]
-            })
-        
-        if 'bleed' in observed or 'hemorrhage' in observed:
-            diseases.append({
-                "name": "Possible Hemorrhagic Stroke",
-                "confidence": "High",
-                "category": "Neurological - CRITICAL",
-                "indicators": ["Brain hemorrhage detected"]
-            })
-        
-        if 'infarct' in observed or 'ischemic' in observed:
-            diseases.append({
-                "name": "Possible Ischemic Stroke",
-                "confidence": "High",
-                "category": "Neurological - CRITICAL",
-                "indicators": ["Ischemic changes detected"]
-            })
-    
-    # CARDIAC DISEASES
-    if 'heart' in body_part or 'cardiac' in body_part or ('chest' in body_part and 'x-ray' in scan_type):
-        if 'enlarged' in observed or 'cardiomegaly' in observed:
-            chol_high = any('cholesterol' in abn.lower() for abn in lab_abnormalities)
-            diseases.append({
-                "name": "Possible Heart Disease / Cardiomyopathy",
-                "confidence": "High" if chol_high else "Medium",
-                "category": "Cardiac",
-                "indicators": ["Enlarged heart on imaging"] + (["High cholesterol"] if chol_high else [])
-            })
-    
-    # Check for dyslipidemia from labs alone
-    if labs.get('ldl', 0) >= 160 or labs.get('triglycerides', 0) >= 200:
-        diseases.append({
-            "name": "Dyslipidemia",
-            "confidence": "High",
-            "category": "Metabolic",
-            "indicators": ["Significantly elevated lipid levels"]
-        })
-    
-    # RESPIRATORY DISEASES
-    if 'lung' in body_part or 'chest' in body_part:
-        if 'opacity' in observed or 'consolidation' in observed or 'infiltrate' in observed:
-            wbc_high = any('wbc' in abn.lower() and 'high' in abn.lower() for abn in lab_abnormalities)
-            diseases.append({
-                "name": "Possible Pneumonia",
-                "confidence": "High" if wbc_high else "Medium",
-                "category": "Respiratory",
-                "indicators": ["Lung opacity/consolidation"] + (["Elevated WBC"] if wbc_high else [])
-            })
-        
-        if 'nodule' in observed or 'mass' in observed:
-            diseases.append({
-                "name": "Possible Lung Tumor / Malignancy",
-                "confidence": "Medium",
-                "category": "Respiratory",
-                "indicators": ["Lung nodule/mass detected - requires biopsy"]
-            })
-        
-        if 'effusion' in observed:
-            diseases.append({
-                "name": "Pleural Effusion",
-                "confidence": "High",
-                "category": "Respiratory",
-                "indicators": ["Fluid in pleural space"]
-            })
-    
-    # METABOLIC DISEASES - DIABETES
-    fbs = labs.get('fastingBloodSugar', labs.get('bloodSugar', 0))
-    hba1c = labs.get('hba1c', 0)
-    
-    if fbs >= 126 or hba1c >= 6.5:
-        diseases.append({
-            "name": "Diabetes Mellitus",
-            "confidence": "High",
-            "category": "Metabolic",
-            "indicators": [
-                f"Fasting Blood Sugar: {fbs} mg/dL" if fbs >= 126 else "",
-                f"HbA1c: {hba1c}%" if hba1c >= 6.5 else ""
-            ]
-        })
-    elif fbs >= 100 or hba1c >= 5.7:
-        diseases.append({
-            "name": "Pre-Diabetes",
-            "confidence": "High",
-            "category": "Metabolic",
-            "indicators": ["Elevated blood sugar in pre-diabetic range"]
-        })
-    
-    # LIVER DISEASES
-    if 'liver' in body_part or 'hepatic' in body_part:
-        if 'fatty' in observed or 'steatosis' in observed:
-            alt_high = labs.get('alt', 0) > 40
-            ast_high = labs.get('ast', 0) > 40
-            diseases.append({
-                "name": "Fatty Liver Disease",
-                "confidence": "High" if (alt_high or ast_high) else "Medium",
-                "category": "Hepatic",
-                "indicators": ["Fatty liver on imaging"] + (["Elevated liver enzymes"] if (alt_high or ast_high) else [])
-            })
-        
-        if 'cirrhosis' in observed:
-            diseases.append({
-                "name": "Liver Cirrhosis",
-                "confidence": "High",
-                "category": "Hepatic",
-                "indicators": ["Cirrhotic changes on imaging"]
-            })
-    
-    # KIDNEY DISEASES
-    if 'kidney' in body_part or 'renal' in body_part:
-        if 'stone' in observed or 'calculus' in observed:
-            creat_high = labs.get('creatinine', 0) > 1.3
-            diseases.append({
-                "name": "Kidney Stone / Nephrolithiasis",
-                "confidence": "High",
-                "category": "Renal",
-                "indicators": ["Kidney stone detected"] + (["Elevated creatinine"] if creat_high else [])
-            })
-        
-        if 'cyst' in observed:
-            diseases.append({
-                "name": "Renal Cyst",
-                "confidence": "High",
-                "category": "Renal",
-                "indicators": ["Kidney cyst detected"]
-            })
-    
-    # Kidney dysfunction from labs
-    if labs.get('creatinine', 0) > 1.5 or labs.get('urea', 0) > 25:
-        diseases.append({
-            "name": "Renal Dysfunction / Chronic Kidney Disease",
-            "confidence": "Medium",
-            "category": "Renal",
-            "indicators": ["Elevated kidney function markers"]
-        })
-    
-    # HEMATOLOGICAL DISEASES
-    hb = labs.get('hemoglobin', labs.get('hb', 0))
-    if hb > 0 and hb < 10:
-        diseases.append({
-            "name": "Anemia (Moderate to Severe)",
-            "confidence": "High",
-            "category": "Hematological",
-            "indicators": [f"Low Hemoglobin: {hb} g/dL"]
-        })
-    elif hb < 12:
-        diseases.append({
-            "name": "Mild Anemia",
-            "confidence": "Medium",
-            "category": "Hematological",
-            "indicators": [f"Low Hemoglobin: {hb} g/dL"]
-        })
-    
-    # Blood disorder - extremely high WBC
-    if labs.get('wbc', 0) > 20:
-        diseases.append({
-            "name": "Possible Blood Disorder / Leukemia (CRITICAL)",
-            "confidence": "Medium",
-            "category": "Hematological - REQUIRES URGENT EVALUATION",
-            "indicators": [f"Very High WBC: {labs['wbc']} x10³/μL"]
-        })
-    
-    # INFLAMMATORY CONDITIONS
-    if labs.get('crp', 0) > 10 or labs.get('esr', 0) > 50:
-        if not any(d['category'] == 'Neurological' for d in diseases):
-            diseases.append({
-                "name": "Systemic Inflammatory Condition",
-                "confidence": "Medium",
-                "category": "Inflammatory",
-                "indicators": ["Significantly elevated inflammatory markers"]
-            })
-    
-    # BONE/JOINT DISEASES
-    if 'bone' in body_part or 'joint' in body_part or 'spine' in body_part:
-        if 'fracture' in observed:
-            diseases.append({
-                "name": "Bone Fracture",
-                "confidence": "High",
-                "category": "Orthopedic",
-                "indicators": ["Fracture detected on imaging"]
-            })
-        
-        if 'arthritis' in observed or 'degeneration' in observed:
-            diseases.append({
-                "name": "Arthritis / Degenerative Joint Disease",
-                "confidence": "High",
-                "category": "Orthopedic",
-                "indicators": ["Arthritic changes on imaging"]
-            })
+    """Apply rule-based disease prediction logic
     
-    return diseases
+    The rules are the table in disease_rules.py; only those filed under the
+    request's body-part and finding words, or whose lab check one of its
+    values passes, are evaluated.
+    """
+    return DISEASE_RULES.apply(lab_abnormalities, labs, scan_info)
 
 
 def calculate_confidence_and_risk(
     diseases: List[Dict[str, Any]],
-    lab_abnormalities: List[str],
+    lab_abnormalities: List[Reading],
     scan_findings: List[str]
 ) -> Tuple[str, str]:
     """Calculate overall confidence level and risk category"""
@@ -551,7 +247,7 @@ def calculate_confidence_and_risk(
 def generate_recommendations(
     diseases: List[Dict[str, Any]],
     risk_category: str,
-    lab_abnormalities: List[str]
+    lab_abnormalities: List[Reading]
 ) -> List[str]:
     """Generate personalized next steps based on predictions"""
     
@@ -0,0 +1,403 @@
+import operator
+from typing import Any, Dict, List
+
+from reference_ranges import HIGH, LOW, Reading
+
+# Confidence that follows the scan: High when its severity is 'severe', else Medium
+SEVERITY = 'severity'
+
+
+class Findings:
+    """The parts of one request that rule predicates read.
+
+    Lab abnormalities (abnormal readings of ``labs``) are collected into a
+    set of codes, analyte key and (analyte key, direction), at most once and
+    only if a rule reads them.
+    """
+
+    __slots__ = ('labs', 'severity', '_lab_abnormalities', '_abnormalities')
+
+    def __init__(self, lab_abnormalities, labs, scan_info):
+        self.labs = labs
+        self.severity = scan_info.get('severity', '').lower()
+        self._lab_abnormalities = lab_abnormalities
+        self._abnormalities = None
+
+    def abnormalities(self):
+        if self._abnormalities is None:
+            codes = set()
+            for reading in self._lab_abnormalities:
+                key = reading.analyte.key
+                codes.add(key)
+                codes.add((key, reading.band.direction))
+            self._abnormalities = codes
+        return self._abnormalities
+
+
+class Lab:
+    """Compares one lab value (0 when absent) with a threshold"""
+
+    __slots__ = ('key', 'op', 'threshold')
+
+    OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+
+    def __init__(self, key, op, threshold):
+        self.key = key
+        self.op = op
+        self.threshold = threshold
+
+    def checks(self):
+        compare = self.OPERATORS[self.op]
+        # A missing value reads as 0, so a comparison that 0 passes cannot narrow the rules
+        return None if compare(0, self.threshold) else ((self.key, compare, self.threshold),)
+
+    def compile(self):
+        key, threshold, compare = self.key, self.threshold, self.OPERATORS[self.op]
+        return lambda findings: compare(findings.labs.get(key, 0), threshold)
+
+
+class Abnormal:
+    """A lab value is out of range for the patient's sex and age, optionally on the given side (LOW or HIGH)"""
+
+    __slots__ = ('key', 'direction')
+
+    def __init__(self, key, direction=None):
+        self.key = key
+        self.direction = direction
+
+    def checks(self):
+        return ((self.key, None, None),)
+
+    def compile(self):
+        code = self.key if self.direction is None else (self.key, self.direction)
+        return lambda findings: code in findings.abnormalities()
+
+
+class AnyOf:
+    __slots__ = ('predicates',)
+
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def checks(self):
+        checks = []
+        for predicate in self.predicates:
+            found = predicate.checks()
+            if found is None:
+                return None
+            checks.extend(found)
+        return tuple(checks)
+
+    def compile(self):
+        tests = tuple(predicate.compile() for predicate in self.predicates)
+
+        def test(findings):
+            for predicate in tests:
+                if predicate(findings):
+                    return True
+            return False
+        return test
+
+
+class AllOf(AnyOf):
+    __slots__ = ()
+
+    def checks(self):
+        # Every predicate has to hold, so the checks of any one of them will do
+        for predicate in self.predicates:
+            found = predicate.checks()
+            if found is not None:
+                return found
+        return None
+
+    def compile(self):
+        tests = tuple(predicate.compile() for predicate in self.predicates)
+
+        def test(findings):
+            for predicate in tests:
+                if not predicate(findings):
+                    return False
+            return True
+        return test
+
+
+class Text:
+    """An indicator showing lab values, e.g. Text('Low Hemoglobin: {} g/dL', 'hemoglobin').
+
+    A missing value reads as 0; with a condition the indicator renders as
+    '' when the condition does not hold.
+    """
+
+    __slots__ = ('template', 'keys', 'when', '_when')
+
+    def __init__(self, template, *keys, when=None):
+        self.template = template
+        self.keys = keys
+        self.when = when
+        self._when = when.compile() if when is not None else None
+
+    def render(self, findings):
+        if self._when is not None and not self._when(findings):
+            return ''
+        labs = findings.labs
+        return self.template.format(*[labs.get(key, 0) for key in self.keys])
+
+
+class Evidence:
+    """Supporting evidence that adds an indicator and, optionally, sets the confidence"""
+
+    __slots__ = ('predicate', 'indicator', 'confidence')
+
+    def __init__(self, predicate, indicator, confidence=None):
+        self.predicate = predicate
+        self.indicator = indicator
+        self.confidence = confidence
+
+
+class Rule:
+    """One predicted condition and what has to hold for it.
+
+    ``sites`` are body-part words, or (body part, scan type) pairs that need
+    both; ``findings`` are words of the observed findings, any of which will
+    do. Rules with neither are lab rules. ``when`` must also hold, and
+    ``unless`` names diseases or categories that, once predicted by an
+    earlier rule, rule this one out.
+    """
+
+    __slots__ = ('name', 'category', 'indicators', 'sites', 'findings', 'when', 'confidence', 'evidence', 'unless',
+                 '_when', '_evidence', '_rendered')
+
+    def __init__(self, name, category, indicators, sites=(), findings=(), when=None,
+                 confidence='High', evidence=None, unless=()):
+        self.name = name
+        self.category = category
+        self.indicators = tuple(indicators)
+        self.sites = tuple(site if isinstance(site, tuple) else (site, None) for site in sites)
+        self.findings = tuple(findings)
+        self.when = when
+        self.confidence = confidence
+        self.evidence = evidence
+        self.unless = frozenset(unless)
+        self._when = when.compile() if when is not None else None
+        self._evidence = evidence.predicate.compile() if evidence is not None else None
+        self._rendered = any(not isinstance(indicator, str) for indicator in self.indicators)
+
+    def at_site(self, body_words, scan_words):
+        """Whether one of a scan rule's sites is among the words found in the body part and scan type"""
+        for site, scan in self.sites:
+            if site in body_words and (scan is None or scan in scan_words):
+                return True
+        return False
+
+    def evaluate(self, findings, predicted):
+        """The predicted disease, or None"""
+        if self.unless and not self.unless.isdisjoint(predicted):
+            return None
+        if self._when is not None and not self._when(findings):
+            return None
+        confidence = self.confidence
+        if confidence == SEVERITY:
+            confidence = 'High' if findings.severity == 'severe' else 'Medium'
+        if self._rendered:
+            indicators = [
+                indicator if isinstance(indicator, str) else indicator.render(findings)
+                for indicator in self.indicators
+            ]
+        else:
+            indicators = list(self.indicators)
+        if self._evidence is not None and self._evidence(findings):
+            indicators.append(self.evidence.indicator)
+            confidence = self.evidence.confidence or confidence
+        return {
+            "name": self.name,
+            "confidence": confidence,
+            "category": self.category,
+            "indicators": indicators
+        }
+
+
+class Vocabulary:
+    """The rule words found in a text, looked up per whitespace token.
+
+    A word without whitespace occurs in a text exactly when it occurs in
+    one of its tokens, so matching stays the substring match the rules
+    were written for ('bleed' in 'bleeding,'), while each distinct token
+    is only matched against the words once.
+    """
+
+    __slots__ = ('words', '_tokens')
+
+    # Distinct tokens remembered before the memo starts over
+    MAX_TOKENS = 4096
+
+    def __init__(self, words):
+        self.words = tuple(dict.fromkeys(words))
+        self._tokens = {}
+
+    def find(self, text):
+        found = set()
+        tokens = self._tokens
+        for token in text.split():
+            words = tokens.get(token)
+            if words is None:
+                if len(tokens) >= self.MAX_TOKENS:
+                    tokens.clear()
+                words = tokens[token] = tuple(word for word in self.words if word in token)
+            found.update(words)
+        return found
+
+
+class RuleEngine:
+    """Rules indexed by body-part word, finding word and lab value.
+
+    Body part, scan type and observed findings are tokenized once per
+    request into the rule words they contain. A scan rule is a candidate
+    when a word of its sites and one of its findings were found; a lab rule
+    when one of the lab checks its ``when`` needs passes (rules that may
+    hold on an empty panel are always evaluated instead). Candidates are
+    evaluated in table order, so a rule can depend on what earlier ones
+    predicted.
+    """
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self._by_site = {}
+        self._by_finding = {}
+        self._by_lab = {}
+        self._always = []
+        for index, rule in enumerate(self.rules):
+            if rule.sites:
+                for site in dict.fromkeys(site for site, _ in rule.sites):
+                    self._by_site.setdefault(site, []).append(index)
+                for word in rule.findings or ('',):
+                    self._by_finding.setdefault(word, []).append(index)
+                continue
+            checks = rule.when.checks() if rule.when is not None else None
+            if checks is None:
+                self._always.append(index)
+                continue
+            for key, compare, threshold in checks:
+                self._by_lab.setdefault(key, []).append((compare, threshold, index))
+        self._sites = Vocabulary(self._by_site)
+        self._findings = Vocabulary(word for word in self._by_finding if word)
+        self._scans = Vocabulary(scan for rule in self.rules for _, scan in rule.sites if scan is not None)
+
+    def candidates(self, labs, body_words, finding_words):
+        """Indexes, in table order, of the rules that can apply to a request"""
+        found = set(self._always)
+        if body_words:
+            at_site = set()
+            for site in body_words:
+                at_site.update(self._by_site[site])
+            with_finding = set(self._by_finding.get('', ()))
+            for word in finding_words:
+                with_finding.update(self._by_finding[word])
+            found.update(at_site & with_finding)
+        by_lab = self._by_lab
+        for key, value in labs.items():
+            checks = by_lab.get(key)
+            if checks is not None:
+                for compare, threshold, index in checks:
+                    if compare is None or compare(value, threshold):
+                        found.add(index)
+        return sorted(found)
+
+    def apply(self, lab_abnormalities: List[Reading], labs: Dict[str, float],
+              scan_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        body_words = self._sites.find(scan_info.get('bodyPart', '').lower())
+        finding_words = self._findings.find(scan_info.get('observedFindings', '').lower()) if body_words else ()
+        scan_words = None
+        findings = Findings(lab_abnormalities, labs, scan_info)
+        predicted = set()
+        diseases = []
+        for index in self.candidates(labs, body_words, finding_words):
+            rule = self.rules[index]
+            if rule.sites:
+                if scan_words is None:
+                    scan_words = self._scans.find(scan_info.get('scanType', '').lower())
+                if not rule.at_site(body_words, scan_words):
+                    continue
+            disease = rule.evaluate(findings, predicted)
+            if disease is not None:
+                diseases.append(disease)
+                predicted.add(disease['name'])
+                predicted.add(disease['category'])
+        return diseases
+
+
+INFLAMMATORY_MARKERS = AnyOf(Abnormal('crp'), Abnormal('esr'))
+
+# In the order predictions are reported
+DISEASE_RULES = RuleEngine([
+    # NEUROLOGICAL
+    Rule("Possible Encephalitis", "Neurological", ["Brain lesion on imaging", "Elevated inflammatory markers"],
+         sites=['brain'], findings=['lesion'], when=INFLAMMATORY_MARKERS, confidence=SEVERITY),
+    Rule("Possible Brain Tumor", "Neurological", ["Mass/tumor detected on imaging"],
+         sites=['brain'], findings=['mass', 'tumor'], confidence=SEVERITY),
+    Rule("Possible Hemorrhagic Stroke", "Neurological - CRITICAL", ["Brain hemorrhage detected"],
+         sites=['brain'], findings=['bleed', 'hemorrhage']),
+    Rule("Possible Ischemic Stroke", "Neurological - CRITICAL", ["Ischemic changes detected"],
+         sites=['brain'], findings=['infarct', 'ischemic']),
+
+    # CARDIAC
+    Rule("Possible Heart Disease / Cardiomyopathy", "Cardiac", ["Enlarged heart on imaging"],
+         sites=['heart', 'cardiac', ('chest', 'x-ray')], findings=['enlarged', 'cardiomegaly'],
+         confidence='Medium', evidence=Evidence(Abnormal('totalCholesterol'), "High cholesterol", 'High')),
+    Rule("Dyslipidemia", "Metabolic", ["Significantly elevated lipid levels"],
+         when=AnyOf(Lab('ldl', '>=', 160), Lab('triglycerides', '>=', 200))),
+
+    # RESPIRATORY
+    Rule("Possible Pneumonia", "Respiratory", ["Lung opacity/consolidation"],
+         sites=['lung', 'chest'], findings=['opacity', 'consolidation', 'infiltrate'],
+         confidence='Medium', evidence=Evidence(Abnormal('wbc', HIGH), "Elevated WBC", 'High')),
+    Rule("Possible Lung Tumor / Malignancy", "Respiratory", ["Lung nodule/mass detected - requires biopsy"],
+         sites=['lung', 'chest'], findings=['nodule', 'mass'], confidence='Medium'),
+    Rule("Pleural Effusion", "Respiratory", ["Fluid in pleural space"],
+         sites=['lung', 'chest'], findings=['effusion']),
+
+    # METABOLIC - DIABETES
+    Rule("Diabetes Mellitus", "Metabolic",
+         [Text("Fasting Blood Sugar: {} mg/dL", 'fastingBloodSugar', when=Lab('fastingBloodSugar', '>=', 126)),
+          Text("HbA1c: {}%", 'hba1c', when=Lab('hba1c', '>=', 6.5))],
+         when=AnyOf(Lab('fastingBloodSugar', '>=', 126), Lab('hba1c', '>=', 6.5))),
+    Rule("Pre-Diabetes", "Metabolic", ["Elevated blood sugar in pre-diabetic range"],
+         when=AnyOf(Lab('fastingBloodSugar', '>=', 100), Lab('hba1c', '>=', 5.7)),
+         unless=["Diabetes Mellitus"]),
+
+    # HEPATIC
+    Rule("Fatty Liver Disease", "Hepatic", ["Fatty liver on imaging"],
+         sites=['liver', 'hepatic'], findings=['fatty', 'steatosis'], confidence='Medium',
+         evidence=Evidence(AnyOf(Lab('alt', '>', 40), Lab('ast', '>', 40)), "Elevated liver enzymes", 'High')),
+    Rule("Liver Cirrhosis", "Hepatic", ["Cirrhotic changes on imaging"],
+         sites=['liver', 'hepatic'], findings=['cirrhosis']),
+
+    # RENAL
+    Rule("Kidney Stone / Nephrolithiasis", "Renal", ["Kidney stone detected"],
+         sites=['kidney', 'renal'], findings=['stone', 'calculus'],
+         evidence=Evidence(Lab('creatinine', '>', 1.3), "Elevated creatinine")),
+    Rule("Renal Cyst", "Renal", ["Kidney cyst detected"],
+         sites=['kidney', 'renal'], findings=['cyst']),
+    Rule("Renal Dysfunction / Chronic Kidney Disease", "Renal", ["Elevated kidney function markers"],
+         when=AnyOf(Lab('creatinine', '>', 1.5), Lab('urea', '>', 25)), confidence='Medium'),
+
+    # HEMATOLOGICAL
+    Rule("Anemia (Moderate to Severe)", "Hematological", [Text("Low Hemoglobin: {} g/dL", 'hemoglobin')],
+         when=AllOf(Lab('hemoglobin', '<', 10), Lab('hemoglobin', '>', 0))),
+    Rule("Mild Anemia", "Hematological", [Text("Low Hemoglobin: {} g/dL", 'hemoglobin')],
+         when=Abnormal('hemoglobin', LOW), confidence='Medium',
+         unless=["Anemia (Moderate to Severe)"]),
+    Rule("Possible Blood Disorder / Leukemia (CRITICAL)", "Hematological - REQUIRES URGENT EVALUATION",
+         [Text("Very High WBC: {} x10³/μL", 'wbc')],
+         when=Lab('wbc', '>', 20), confidence='Medium'),
+
+    # INFLAMMATORY
+    Rule("Systemic Inflammatory Condition", "Inflammatory", ["Significantly elevated inflammatory markers"],
+         when=AnyOf(Lab('crp', '>', 10), Lab('esr', '>', 50)), confidence='Medium',
+         unless=["Neurological"]),
+
+    # ORTHOPEDIC
+    Rule("Bone Fracture", "Orthopedic", ["Fracture detected on imaging"],
+         sites=['bone', 'joint', 'spine'], findings=['fracture']),
+    Rule("Arthritis / Degenerative Joint Disease", "Orthopedic", ["Arthritic changes on imaging"],
+         sites=['bone', 'joint', 'spine'], findings=['arthritis', 'degeneration'])
+])
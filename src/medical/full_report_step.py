@@ -0,0 +1,176 @@
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+# Sibling step modules are imported directly so the stages can share data in memory
+sys.path.insert(0, str(Path(__file__).parent))
+
+import analyze_image_step
+import analyze_lab_results_step
+from generate_report_step import generate_report
+from generate_diet_step import generate_diet_recommendation, generate_fallback_diet
+from generate_pdf_step import generate_pdf
+
+# Motia API configuration
+config = {
+    "name": "FullReport",
+    "type": "api",
+    "path": "/api/full-report",
+    "method": "POST",
+    "description": "Run image analysis, lab analysis, report, diet and PDF generation in a single request",
+    "emits": [],
+    "responseSchema": {
+        200: {
+            "type": "object",
+            "properties": {
+                "success": {"type": "boolean"},
+                "findings": {"type": "object"},
+                "analysis": {"type": "object"},
+                "report": {"type": "object"},
+                "dietRecommendation": {"type": "object"},
+                "pdf": {"type": "string"},
+                "filename": {"type": "string"},
+                "timings": {"type": "object"}
+            }
+        }
+    }
+}
+
+async def handler(req, context):
+    """Motia API handler for the one-shot report pipeline"""
+    try:
+        # Motia passes request as dict with 'body' key containing actual data
+        if isinstance(req, dict) and 'body' in req:
+            body_content = req['body']
+            # If body is a JSON string, parse it
+            if isinstance(body_content, str):
+                import json
+                data = json.loads(body_content)
+            else:
+                data = body_content
+        elif hasattr(req, 'body'):
+            data = req.body
+        elif isinstance(req, dict):
+            data = req
+        else:
+            data = req
+
+        if not isinstance(data, dict):
+            return {
+                "status": 400,
+                "body": {'success': False, 'error': 'Invalid request format'}
+            }
+
+        result = await run_full_report(data, context)
+        return {"status": 200, "body": result}
+    except Exception as e:
+        context.logger.error(f"Full report error: {str(e)}")
+        return {
+            "status": 500,
+            "body": {"success": False, "error": str(e)}
+        }
+
+async def timed(timings, stage, coro, on_stage=None):
+    """Await a stage and record its wall-clock duration in milliseconds"""
+    start = time.perf_counter()
+    try:
+        result = await coro
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+    if on_stage:
+        await on_stage(stage, result)
+    return result
+
+async def run_full_report(data, context, on_stage=None):
+    """Run every report stage, overlapping the independent ones.
+
+    on_stage, if given, is awaited with (stage, result) as each stage finishes.
+    """
+
+    patient_info = data.get('patientInfo', {})
+    timings = {}
+    pipeline_start = time.perf_counter()
+
+    image_task = None
+    if data.get('image'):
+        image_task = asyncio.create_task(timed(timings, 'analyzeImage', analyze_image_step.handler({
+            'body': {
+                'image': data.get('image'),
+                'imageType': data.get('imageType') or patient_info.get('imageType'),
+                'analysis': data.get('imageAnalysis', 'full')
+            }
+        }, context), on_stage))
+
+    lab_response = await timed(timings, 'analyzeLabResults', analyze_lab_results_step.handler({
+        'body': {'labResults': data.get('labResults', {}), 'labUnits': data.get('labUnits'), 'patientInfo': patient_info}
+    }, context), on_stage)
+    lab_body = lab_response['body']
+    if not lab_body.get('success'):
+        if image_task:
+            image_task.cancel()
+        return {'success': False, 'error': lab_body.get('error', 'Lab analysis failed'), 'timings': timings}
+    lab_analysis = lab_body['analysis']
+
+    # Diet generation only needs the lab output, so it runs while the image is still being analyzed
+    diet_request = {
+        'patientInfo': patient_info,
+        'riskIndicators': lab_analysis.get('riskIndicators', []),
+        'abnormalities': lab_analysis.get('abnormalities', [])
+    }
+    diet_task = asyncio.create_task(timed(timings, 'generateDiet', generate_diet_recommendation(diet_request), on_stage))
+
+    imaging_findings = {}
+    metadata = {}
+    if image_task:
+        image_body = (await image_task)['body']
+        if not image_body.get('success'):
+            diet_task.cancel()
+            return {'success': False, 'error': image_body.get('error', 'Image analysis failed'), 'timings': timings}
+        imaging_findings = image_body['findings']
+        metadata = image_body['metadata']
+
+    start = time.perf_counter()
+    report_result = generate_report({
+        'patientInfo': patient_info,
+        'imagingFindings': imaging_findings,
+        'labAnalysis': lab_analysis
+    })
+    timings['generateReport'] = round((time.perf_counter() - start) * 1000, 2)
+    if on_stage:
+        await on_stage('generateReport', report_result)
+    if not report_result.get('success'):
+        diet_task.cancel()
+        return {'success': False, 'error': report_result.get('error', 'Report generation failed'), 'timings': timings}
+
+    diet_result = await diet_task
+    if diet_result.get('success'):
+        diet_recommendation = diet_result['dietRecommendation']
+    else:
+        context.logger.warn(f"Diet generation failed, using fallback: {diet_result.get('error')}")
+        diet_recommendation = diet_result.get('fallback') or generate_fallback_diet(diet_request)
+
+    result = {
+        'success': True,
+        'findings': imaging_findings,
+        'metadata': metadata,
+        'analysis': lab_analysis,
+        'report': report_result['report'],
+        'dietRecommendation': diet_recommendation
+    }
+
+    if data.get('includePdf', False):
+        pdf_result = await timed(timings, 'generatePdf', asyncio.to_thread(generate_pdf, {
+            'report': report_result['report'],
+            'dietRecommendation': diet_recommendation
+        }), on_stage)
+        if pdf_result.get('success'):
+            result['pdf'] = pdf_result['pdf']
+            result['filename'] = pdf_result['filename']
+        else:
+            result['pdfError'] = pdf_result.get('error')
+
+    timings['total'] = round((time.perf_counter() - pipeline_start) * 1000, 2)
+    result['timings'] = timings
+
+    return result
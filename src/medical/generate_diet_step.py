@@ -1,6 +1,47 @@
 import os
+import re
+import sys
 import json
-import google.generativeai as genai
+import asyncio
+from bisect import bisect_right
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from result_cache import cache_from_env
+from singleflight import SingleFlight
+from upstream_guard import RateLimiter, CircuitBreaker, CircuitOpenError
+from llm_backends import backend_from_env
+
+# Upper bound on Gemini calls in flight per worker process
+GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', '8'))
+GEMINI_REQUESTS_PER_MINUTE = float(os.environ.get('GEMINI_REQUESTS_PER_MINUTE', '60'))
+
+gemini_limiter = RateLimiter('gemini', GEMINI_REQUESTS_PER_MINUTE, GEMINI_MAX_CONCURRENCY)
+gemini_breaker = CircuitBreaker(
+    'gemini',
+    failure_threshold=int(os.environ.get('GEMINI_BREAKER_THRESHOLD', '5')),
+    cooldown=float(os.environ.get('GEMINI_BREAKER_COOLDOWN', '30'))
+)
+
+# Gemini in production; DIET_LLM_BACKEND=mock swaps in the offline stand-in
+llm_backend = backend_from_env()
+
+# Parsed recommendations keyed on the canonical patient risk profile
+diet_cache = cache_from_env('diet', 'DIET', default_size=2048, default_ttl=24 * 3600)
+
+# Identical profiles submitted together share one Gemini call
+diet_flight = SingleFlight('diet')
+
+# Default time to wait for Gemini before answering with the rule-based fallback (0 disables)
+DIET_LATENCY_BUDGET_MS = float(os.environ.get('DIET_LATENCY_BUDGET_MS', '0'))
+
+# Gemini calls that outlived their budget keep running here until they fill the cache
+_background_refreshes = set()
+hedge_stats = {'provisional': 0, 'backgroundCompleted': 0, 'backgroundFailed': 0}
+
+AGE_BUCKET_BOUNDS = [18, 40, 60, 75]
+AGE_BUCKET_LABELS = ['0-17', '18-39', '40-59', '60-74', '75+']
 
 # Motia API configuration
 config = {
@@ -46,7 +87,7 @@ async def handler(req, context):
                 "body": {'success': False, 'error': 'Invalid request format'}
             }
         
-        result = generate_diet_recommendation(data)
+        result = await generate_diet_recommendation(data)
         return {"status": 200, "body": result}
     except Exception as e:
         context.logger.error(f"Diet recommendation error: {str(e)}")
@@ -55,7 +96,7 @@ async def handler(req, context):
             "body": {"success": False, "error": str(e)}
         }
 
-def generate_diet_recommendation(data):
+async def generate_diet_recommendation(data):
     """Generate personalized diet recommendations using Google Gemini API"""
     
     try:
@@ -63,26 +104,47 @@ def generate_diet_recommendation(data):
         risk_indicators = data.get('riskIndicators', [])
         abnormalities = data.get('abnormalities', [])
         
-        api_key = os.environ.get('GEMINI_API_KEY')
-        if not api_key or api_key == 'your_google_gemini_api_key_here':
+        configuration_error = llm_backend.configuration_error()
+        if configuration_error:
             return {
                 'success': False,
-                'error': 'Gemini API key not configured. Please set GEMINI_API_KEY in .env file'
+                'error': configuration_error
             }
         
-        genai.configure(api_key=api_key)
-        
-        model = genai.GenerativeModel('gemini-pro')
+        cache_key = diet_profile_key(patient_info, risk_indicators, abnormalities)
+        cached = diet_cache.get(cache_key)
+        if cached is not None:
+            return {
+                'success': True,
+                'dietRecommendation': cached,
+                'cached': True
+            }
         
-        prompt = build_diet_prompt(patient_info, risk_indicators, abnormalities)
+        flight = asyncio.ensure_future(diet_flight.do(cache_key, lambda: fetch_diet_recommendation(
+            cache_key, patient_info, risk_indicators, abnormalities
+        )))
         
-        response = model.generate_content(prompt)
+        budget_ms = float(data.get('latencyBudgetMs', DIET_LATENCY_BUDGET_MS) or 0)
+        if budget_ms > 0:
+            done, _ = await asyncio.wait({flight}, timeout=budget_ms / 1000)
+            if not done:
+                # Answer now with the fallback; the real answer lands in the cache for the next request
+                _background_refreshes.add(flight)
+                flight.add_done_callback(finish_background_refresh)
+                hedge_stats['provisional'] += 1
+                return {
+                    'success': True,
+                    'dietRecommendation': generate_fallback_diet(data),
+                    'cached': False,
+                    'provisional': True
+                }
         
-        diet_recommendation = parse_gemini_response(response.text)
+        diet_recommendation = await flight
         
         return {
             'success': True,
-            'dietRecommendation': diet_recommendation
+            'dietRecommendation': diet_recommendation,
+            'cached': False
         }
         
     except Exception as e:
@@ -92,6 +154,127 @@ def generate_diet_recommendation(data):
             'fallback': generate_fallback_diet(data)
         }
 
+def hedging_stats():
+    """Counters for budget-exceeded requests and their background Gemini calls"""
+    return dict(hedge_stats, inBackground=len(_background_refreshes))
+
+def finish_background_refresh(task):
+    """Release a background Gemini call once it settles"""
+    _background_refreshes.discard(task)
+    if task.cancelled() or task.exception() is not None:
+        hedge_stats['backgroundFailed'] += 1
+    else:
+        hedge_stats['backgroundCompleted'] += 1
+
+async def fetch_diet_recommendation(cache_key, patient_info, risk_indicators, abnormalities):
+    """Call Gemini for a profile that missed the cache and store the parsed result"""
+    
+    if not gemini_breaker.allow():
+        raise CircuitOpenError('Gemini temporarily unavailable after repeated failures; using fallback diet')
+    
+    try:
+        prompt = build_diet_prompt(patient_info, risk_indicators, abnormalities)
+        
+        async with gemini_limiter:
+            response_text = await llm_backend.generate(prompt)
+        
+        diet_recommendation = parse_gemini_response(response_text)
+    except asyncio.CancelledError:
+        gemini_breaker.record_abandoned()
+        raise
+    except Exception:
+        gemini_breaker.record_failure()
+        raise
+    
+    gemini_breaker.record_success()
+    diet_cache.set(cache_key, diet_recommendation)
+    
+    return diet_recommendation
+
+async def stream_diet_recommendation(data, on_section):
+    """Generate a diet recommendation, awaiting on_section(field, value) as each section completes.
+    
+    Returns 'complete', 'cached' or 'fallback' depending on where the sections came from.
+    """
+    
+    patient_info = data.get('patientInfo', {})
+    risk_indicators = data.get('riskIndicators', [])
+    abnormalities = data.get('abnormalities', [])
+    
+    cache_key = diet_profile_key(patient_info, risk_indicators, abnormalities)
+    cached = diet_cache.get(cache_key)
+    if cached is not None:
+        for field, value in cached.items():
+            await on_section(field, value)
+        return 'cached'
+    
+    parser = DietResponseParser()
+    sent = set()
+    
+    try:
+        configuration_error = llm_backend.configuration_error()
+        if configuration_error:
+            raise RuntimeError(configuration_error)
+        
+        if not gemini_breaker.allow():
+            raise CircuitOpenError('Gemini temporarily unavailable after repeated failures; using fallback diet')
+        
+        try:
+            prompt = build_diet_prompt(patient_info, risk_indicators, abnormalities)
+            
+            async with gemini_limiter:
+                async for chunk in llm_backend.stream(prompt):
+                    for field in parser.feed(chunk):
+                        sent.add(field)
+                        await on_section(field, parser.value(field))
+        except asyncio.CancelledError:
+            gemini_breaker.record_abandoned()
+            raise
+        except Exception:
+            gemini_breaker.record_failure()
+            raise
+        
+        gemini_breaker.record_success()
+    except Exception:
+        # Sections already on the client cannot be swapped for the fallback mid-stream
+        if sent:
+            raise
+        for field, value in generate_fallback_diet(data).items():
+            await on_section(field, value)
+        return 'fallback'
+    
+    for field in parser.close():
+        sent.add(field)
+        await on_section(field, parser.value(field))
+    
+    diet_recommendation = parser.result()
+    for field in diet_recommendation.keys() - sent:
+        await on_section(field, diet_recommendation[field])
+    diet_cache.set(cache_key, diet_recommendation)
+    
+    return 'complete'
+
+def age_bucket(age):
+    """Map an age to the coarse bracket used for cache keys"""
+    try:
+        return AGE_BUCKET_LABELS[bisect_right(AGE_BUCKET_BOUNDS, int(float(age)))]
+    except (TypeError, ValueError):
+        return 'unknown'
+
+def canonical_terms(values):
+    """Casefold, collapse whitespace, deduplicate and sort a list of labels"""
+    return sorted({' '.join(str(value).split()).casefold() for value in values if value})
+
+def diet_profile_key(patient_info, risk_indicators, abnormalities):
+    """Canonical cache key for the inputs that shape the diet prompt"""
+    gender = str(patient_info.get('gender') or 'unknown').strip().casefold()
+    return json.dumps([
+        age_bucket(patient_info.get('age')),
+        gender,
+        canonical_terms(risk_indicators),
+        canonical_terms(abnormalities)
+    ], separators=(',', ':'))
+
 def build_diet_prompt(patient_info, risk_indicators, abnormalities):
     """Build comprehensive prompt for Gemini API"""
     
@@ -146,78 +329,142 @@ Please format your response clearly with these exact section headings. Be specif
     
     return prompt
 
-def parse_gemini_response(response_text):
-    """Parse Gemini response into structured format"""
+DIET_SECTION_FIELDS = {
+    'overview': 'overview',
+    'vegetarian': 'vegetarianFoods',
+    'nonvegetarian': 'nonVegetarianFoods',
+    'avoid': 'foodsToAvoid',
+    'lifestyle': 'lifestyleTips'
+}
+
+DEFAULT_DIET_OVERVIEW = 'A balanced diet plan tailored to your health needs, focusing on whole foods, adequate hydration, and mindful eating practices.'
+
+# One anchored pattern recognizes every section heading: optional markdown
+# marker (#, **, __), optional numbering (1. / 2) / IV:), the title, then an
+# optional colon and inline content. Bullet lines never match because the
+# prefix does not allow a single '-', '•' or '*'.
+DIET_HEADING_RE = re.compile(r"""
+    ^\s*(?:\#{1,6}\s*)?(?:\*\*|__)?\s*
+    (?:(?:\d{1,2}|[IVX]{1,4})[.):]\s*)?
+    (?:\*\*|__)?\s*
+    (?:
+        (?P<overview>(?:DIET\s+)?OVERVIEW)
+      | (?P<nonvegetarian>(?:RECOMMENDED\s+)?(?:FOODS\s*)?\(?\s*NON[-\s]?VEG(?:ETARIAN)?\s*\)?(?:\s+(?:FOODS|OPTIONS))?)
+      | (?P<vegetarian>(?:RECOMMENDED\s+)?(?:FOODS\s*)?\(?\s*VEG(?:ETARIAN)?\s*\)?(?:\s+(?:FOODS|OPTIONS))?)
+      | (?P<avoid>FOODS\s+TO\s+(?:AVOID|LIMIT)(?:\s+OR\s+(?:AVOID|LIMIT))?)
+      | (?P<lifestyle>LIFESTYLE(?:\s*(?:&|AND)\s*HYDRATION)?(?:\s+TIPS)?|HYDRATION(?:\s+TIPS)?)
+    )
+    \s*(?:\*\*|__)?\s*(?::\s*(?:\*\*|__)?\s*(?P<rest>.*?))?\s*$
+""", re.IGNORECASE | re.VERBOSE)
+
+BULLET_CHARS = '-•*'
+
+class DietResponseParser:
+    """Single-pass incremental parser for Gemini diet text.
     
-    sections = {
-        'overview': '',
-        'vegetarianFoods': [],
-        'nonVegetarianFoods': [],
-        'foodsToAvoid': [],
-        'lifestyleTips': []
-    }
+    feed() accepts chunks as they arrive and returns the response fields whose
+    section was just closed by the next heading; close() flushes the rest.
+    Bullet lines are recognized from their first character; every other line
+    costs one DIET_HEADING_RE match, so a full response and a live token
+    stream go through exactly the same state machine.
+    """
     
-    current_section = None
-    lines = response_text.split('\n')
+    def __init__(self):
+        self.sections = {
+            'overview': [],
+            'vegetarianFoods': [],
+            'nonVegetarianFoods': [],
+            'foodsToAvoid': [],
+            'lifestyleTips': []
+        }
+        # Fields in the order their headings appeared
+        self.order = []
+        self.current_field = None
+        self._pending = ''
     
-    for line in lines:
-        line = line.strip()
-        
-        if not line:
-            continue
-        
-        line_upper = line.upper()
-        
-        if 'DIET OVERVIEW' in line_upper or 'OVERVIEW' in line_upper and current_section is None:
-            current_section = 'overview'
-            continue
-        elif 'RECOMMENDED FOODS (VEGETARIAN)' in line_upper or 'VEGETARIAN' in line_upper and 'RECOMMENDED' in line_upper:
-            current_section = 'vegetarian'
-            continue
-        elif 'RECOMMENDED FOODS (NON-VEGETARIAN)' in line_upper or 'NON-VEGETARIAN' in line_upper and 'RECOMMENDED' in line_upper:
-            current_section = 'nonvegetarian'
-            continue
-        elif 'FOODS TO AVOID' in line_upper or 'AVOID' in line_upper:
-            current_section = 'avoid'
-            continue
-        elif 'LIFESTYLE' in line_upper or 'HYDRATION' in line_upper:
-            current_section = 'lifestyle'
-            continue
-        
-        if current_section == 'overview':
-            if line and not line.startswith('#') and not line.startswith('*'):
-                sections['overview'] += line + ' '
-        
-        elif current_section == 'vegetarian':
-            if line.startswith('-') or line.startswith('•') or line.startswith('*'):
-                item = line.lstrip('-•* ').strip()
-                if item and len(item) > 3:
-                    sections['vegetarianFoods'].append(item)
-        
-        elif current_section == 'nonvegetarian':
-            if line.startswith('-') or line.startswith('•') or line.startswith('*'):
-                item = line.lstrip('-•* ').strip()
-                if item and len(item) > 3:
-                    sections['nonVegetarianFoods'].append(item)
+    def feed(self, chunk):
+        """Consume a chunk of text and return the fields completed by it"""
+        if '\n' not in chunk:
+            self._pending += chunk
+            return []
+        lines = (self._pending + chunk).split('\n')
+        self._pending = lines.pop()
+        return self._consume(lines)
+    
+    def close(self):
+        """Flush the trailing line and return the fields still open"""
+        completed = self._consume([self._pending])
+        self._pending = ''
+        if self.current_field is not None:
+            completed.append(self.current_field)
+            self.current_field = None
+        if not self.sections['overview']:
+            self.sections['overview'].append(DEFAULT_DIET_OVERVIEW)
+        return completed
+    
+    def value(self, field):
+        """Current value of a response field"""
+        if field == 'overview':
+            return ' '.join(self.sections['overview'])
+        return self.sections[field]
+    
+    def result(self):
+        return {field: self.value(field) for field in self.sections}
+    
+    def _consume(self, lines):
+        """Run complete lines through the state machine; return the fields closed by headings"""
+        completed = []
+        match_heading = DIET_HEADING_RE.match
+        field = self.current_field
+        target = self.sections[field] if field is not None else None
         
-        elif current_section == 'avoid':
-            if line.startswith('-') or line.startswith('•') or line.startswith('*'):
-                item = line.lstrip('-•* ').strip()
-                if item and len(item) > 3:
-                    sections['foodsToAvoid'].append(item)
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            
+            first = line[0]
+            heading = None
+            # '-', '•' and '* ' can only start a bullet; anything else may be a heading
+            if not (first == '-' or first == '•' or (first == '*' and line[1:2] != '*')):
+                heading = match_heading(line)
+            
+            if heading is None:
+                if field == 'overview':
+                    if first != '#' and first != '*':
+                        target.append(line)
+                elif field is not None and first in BULLET_CHARS:
+                    item = line.lstrip('-•* ').strip()
+                    if len(item) > 3:
+                        target.append(item)
+                continue
+            
+            section = heading.lastgroup
+            if section == 'rest':
+                section = next(name for name in DIET_SECTION_FIELDS if heading.group(name))
+            
+            if field is not None and DIET_SECTION_FIELDS[section] != field:
+                completed.append(field)
+            field = DIET_SECTION_FIELDS[section]
+            target = self.sections[field]
+            if field not in self.order:
+                self.order.append(field)
+            
+            rest = heading.group('rest')
+            if rest and field == 'overview' and rest[0] != '#' and rest[0] != '*':
+                target.append(rest)
         
-        elif current_section == 'lifestyle':
-            if line.startswith('-') or line.startswith('•') or line.startswith('*'):
-                item = line.lstrip('-•* ').strip()
-                if item and len(item) > 3:
-                    sections['lifestyleTips'].append(item)
-    
-    sections['overview'] = sections['overview'].strip()
+        self.current_field = field
+        return completed
+
+def parse_gemini_response(response_text):
+    """Parse Gemini response into structured format"""
     
-    if not sections['overview']:
-        sections['overview'] = 'A balanced diet plan tailored to your health needs, focusing on whole foods, adequate hydration, and mindful eating practices.'
+    parser = DietResponseParser()
+    parser.feed(response_text)
+    parser.close()
     
-    return sections
+    return parser.result()
 
 def generate_fallback_diet(data):
     """Generate fallback diet recommendation if Gemini fails"""
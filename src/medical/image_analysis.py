@@ -0,0 +1,310 @@
+import io
+import math
+import os
+import time
+
+import numpy as np
+from PIL import Image, features
+
+from dicom_image import is_dicom, read_header, dicom_metadata, dicom_image_type, first_frame
+from perceptual_hash import difference_hash
+
+ANALYSIS_MODES = ('probe', 'full')
+
+# Formats whose frame count PIL can only learn by walking every frame
+SCANNED_FRAME_FORMATS = {'GIF'}
+
+# Quality metrics are computed on a copy whose longest side is at most this
+QUALITY_MAX_SIDE = int(os.environ.get('IMAGE_QUALITY_MAX_SIDE', '512'))
+
+# Thresholds behind the quality summary; intensities are on a 0-1 scale
+MIN_RMS_CONTRAST = 0.05
+MIN_BLUR_SCORE = 50.0
+MIN_SNR_DB = 10.0
+MAX_CLIPPED_FRACTION = 0.05
+# At or below this a pixel counts as black (clipped, or the empty field around the body)
+BLACK_LEVEL = 0.01
+
+NOT_ASSESSED = 'Not assessed (header-only probe)'
+
+# Longest side of each thumbnail pyramid level, and the encoding used for all of them
+THUMBNAIL_SIZES = tuple(sorted(
+    int(size) for size in os.environ.get('IMAGE_THUMBNAIL_SIZES', '128,256,512').split(',') if size.strip()
+))
+THUMBNAIL_FORMAT = os.environ.get('IMAGE_THUMBNAIL_FORMAT', 'webp' if features.check('webp') else 'jpeg').lower()
+THUMBNAIL_QUALITY = int(os.environ.get('IMAGE_THUMBNAIL_QUALITY', '80'))
+
+# Immerkaer's noise estimator: a Laplacian difference that cancels image structure
+NOISE_SCALE = math.sqrt(math.pi / 2) / 6
+
+
+def probe_image(file):
+    """Read image properties from the header without decoding pixel data.
+
+    Image.open only parses the header, so for a lazily decoded upload this
+    touches a few kilobytes regardless of image size. Frame counts that would
+    need a scan of the whole file are left as None. DICOM files are parsed up
+    to, but not including, their pixel data, and suggest an imageType from
+    Modality and BodyPartExamined. Returns the opened image (or DICOM dataset)
+    alongside its properties so a caller can go on to decode it.
+    """
+    if is_dicom(file):
+        dataset, _ = read_header(file)
+        metadata = dicom_metadata(dataset)
+        metadata['imageType'] = dicom_image_type(dataset)
+        return dataset, metadata
+
+    image = Image.open(file)
+    width, height = image.size
+    return image, {
+        'width': width,
+        'height': height,
+        'format': image.format,
+        'mode': image.mode,
+        'frames': None if image.format in SCANNED_FRAME_FORMATS else getattr(image, 'n_frames', 1)
+    }
+
+
+def decode_pixels(image, metadata, max_side=None, mode='L'):
+    """Decode the first frame's pixel data, raising if it is truncated or corrupt.
+
+    With max_side, decoders that can scale while decoding (JPEG) produce a
+    smaller image directly, which is all the quality metrics need; mode None
+    keeps colour for callers that also render the image.
+    """
+    metadata['frames'] = getattr(image, 'n_frames', 1)
+    if metadata['frames'] > 1:
+        image.seek(0)
+    if max_side:
+        image.draft(mode, (max_side, max_side))
+    image.load()
+    return image
+
+
+def grayscale_sample(image, max_side=QUALITY_MAX_SIDE):
+    """Downsampled single-channel copy as float32 in 0-1, its white level and
+    the reduction factor applied (after any draft-mode scaling).
+
+    High-bit-depth images keep their precision; their white level is taken
+    from the bits actually in use, so 12-bit data stored in 16 bits is not
+    judged against 65535.
+    """
+    if image.mode.startswith('I;16'):
+        gray = image.convert('I')
+    elif image.mode in ('I', 'F', 'L'):
+        gray = image
+    else:
+        gray = image.convert('L')
+
+    factor = math.ceil(max(gray.size) / max_side)
+    if factor > 1:
+        gray = gray.reduce(factor)
+
+    pixels = np.asarray(gray, dtype=np.float32)
+    if gray.mode == 'L':
+        white = 255.0
+    elif gray.mode == 'I':
+        white = float(2 ** max(8, math.ceil(math.log2(max(float(pixels.max()), 1.0) + 1))) - 1)
+    else:
+        white = max(float(pixels.max()), 1e-6)
+    return pixels / white, white, factor
+
+
+def block_mean(values, max_side=QUALITY_MAX_SIDE):
+    """Downsample a 2-D array by averaging factor x factor blocks; returns (sample, factor)"""
+    factor = math.ceil(max(values.shape) / max_side)
+    if factor <= 1:
+        return values.astype(np.float32), 1
+    height = values.shape[0] // factor * factor
+    width = values.shape[1] // factor * factor
+    blocks = values[:height, :width].reshape(height // factor, factor, width // factor, factor)
+    return blocks.mean(axis=(1, 3), dtype=np.float32), factor
+
+
+def dicom_sample(frame, dataset, max_side=QUALITY_MAX_SIDE):
+    """Downsampled 0-1 grayscale copy of a DICOM frame, with its white level and factor.
+
+    Stored values are scaled by the BitsStored range, offset for signed data
+    so that, for example, CT values below zero are not treated as clipped.
+    """
+    if frame.ndim == 3:
+        frame = frame[..., :3] @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    bits = int(dataset.get('BitsStored', dataset.get('BitsAllocated', 8)) or 8)
+    signed = int(dataset.get('PixelRepresentation', 0) or 0) == 1
+    white = float(2 ** bits - 1)
+    floor = -float(2 ** (bits - 1)) if signed else 0.0
+    sample, factor = block_mean(frame, max_side)
+    return (sample - floor) / white, white, factor
+
+
+def border_background(black):
+    """Mask of the black pixels that reach the image border in a straight run.
+
+    MRI and CT slices sit on a black field; this marks that field so the
+    underexposure check only looks at the body. Black areas enclosed by
+    the body are left out of the mask.
+    """
+    background = np.logical_and.accumulate(black, axis=1)
+    background |= np.logical_and.accumulate(black[:, ::-1], axis=1)[:, ::-1]
+    background |= np.logical_and.accumulate(black, axis=0)
+    background |= np.logical_and.accumulate(black[::-1], axis=0)[::-1]
+    return background
+
+
+def quality_metrics(pixels, white, factor, started):
+    """Contrast, noise, sharpness and exposure metrics for a 0-1 grayscale sample.
+
+    Noise figures describe the downsampled sample: averaging during reduction
+    lowers uncorrelated noise roughly in proportion to the reduction factor.
+    underexposedFraction counts black pixels among those outside the black
+    border field (backgroundFraction), so a cross-sectional slice's empty
+    surroundings are not read as clipping. timeMs counts from started.
+    """
+    height, width = pixels.shape
+    black = pixels <= BLACK_LEVEL
+    background = border_background(black)
+    background_count = int(np.count_nonzero(background))
+    foreground_count = pixels.size - background_count
+
+    low, high = np.percentile(pixels, [1, 99])
+    mean = float(pixels.mean())
+
+    metrics = {
+        'sampleWidth': width,
+        'sampleHeight': height,
+        'reductionFactor': factor,
+        'whiteLevel': white,
+        'meanIntensity': round(mean, 4),
+        'rmsContrast': round(float(pixels.std()), 4),
+        'dynamicRange': round(float(high - low), 4),
+        'backgroundFraction': round(background_count / pixels.size, 4),
+        # An image that is black all over is underexposed throughout
+        'underexposedFraction': round(
+            float(np.count_nonzero(black) - background_count) / foreground_count, 4) if foreground_count else 1.0,
+        'overexposedFraction': round(float(np.count_nonzero(pixels >= 0.99)) / pixels.size, 4)
+    }
+
+    if width >= 3 and height >= 3:
+        center = pixels[1:-1, 1:-1]
+        # Variance of the 4-neighbour Laplacian, on the familiar 0-255 scale
+        laplacian = (pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:]
+                     - 4 * center) * 255
+        # [[1,-2,1],[-2,4,-2],[1,-2,1]] applied through shifted views
+        residual = (pixels[:-2, :-2] + pixels[:-2, 2:] + pixels[2:, :-2] + pixels[2:, 2:]
+                    - 2 * (pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:])
+                    + 4 * center)
+        sigma = NOISE_SCALE * float(np.abs(residual).mean())
+        metrics['blurScore'] = round(float(laplacian.var()), 2)
+        metrics['noiseSigma'] = round(sigma, 5)
+        metrics['snrDb'] = round(20 * math.log10(mean / sigma), 2) if sigma > 0 and mean > 0 else None
+    else:
+        metrics['blurScore'] = None
+        metrics['noiseSigma'] = None
+        metrics['snrDb'] = None
+
+    metrics['timeMs'] = round((time.perf_counter() - started) * 1000, 2)
+    return metrics
+
+
+def analyze_pixels(file, max_side=QUALITY_MAX_SIDE, thumbnail_sizes=()):
+    """Probe, decode and measure an image; the CPU-bound half of a full analysis.
+
+    Runs inside an image worker, so it takes a file and returns plain values:
+    (metadata, quality, thumbnails) where thumbnails maps each requested size
+    to encoded bytes. metadata['perceptualHash'] is the dHash of the quality
+    sample, as 16 hex digits. DICOM pixel data is read in place from the
+    worker's memory-mapped block.
+    """
+    decode_side = max(max_side, max(thumbnail_sizes, default=0))
+
+    if is_dicom(file):
+        started = time.perf_counter()
+        dataset, offset = read_header(file)
+        metadata = dicom_metadata(dataset)
+        metadata['imageType'] = dicom_image_type(dataset)
+        if offset is None:
+            raise ValueError('DICOM file has no pixel data')
+        frame = first_frame(file, dataset, offset)
+        pixels, white, factor = dicom_sample(frame, dataset, max_side)
+        quality = quality_metrics(pixels, white, factor, started)
+        metadata['perceptualHash'] = f'{difference_hash(pixels):016x}'
+        thumbnails = {}
+        if thumbnail_sizes:
+            if frame.ndim == 3 and frame.dtype == np.uint8:
+                display = Image.fromarray(np.ascontiguousarray(frame[..., :3]), 'RGB')
+            else:
+                display = stretch_to_8bit(dicom_sample(frame, dataset, decode_side)[0])
+            thumbnails = thumbnail_pyramid(display, thumbnail_sizes)
+        return metadata, quality, thumbnails
+
+    image, metadata = probe_image(file)
+    with image:
+        decode_pixels(image, metadata, decode_side, None if thumbnail_sizes else 'L')
+        started = time.perf_counter()
+        pixels, white, factor = grayscale_sample(image, max_side)
+        quality = quality_metrics(pixels, white, factor, started)
+        metadata['perceptualHash'] = f'{difference_hash(pixels):016x}'
+        thumbnails = thumbnail_pyramid(display_image(image, decode_side), thumbnail_sizes) if thumbnail_sizes else {}
+        return metadata, quality, thumbnails
+
+
+def stretch_to_8bit(values):
+    """8-bit grayscale image from a 2-D array, windowed to its 1st-99th percentiles"""
+    low, high = np.percentile(values, [1, 99])
+    scale = 255.0 / (high - low) if high > low else 0.0
+    return Image.fromarray(((values - low) * scale).clip(0, 255).astype(np.uint8), 'L')
+
+
+def display_image(image, max_side):
+    """8-bit L or RGB rendition of a decoded image, no larger than needed for max_side"""
+    if image.mode in ('L', 'RGB'):
+        return image
+    if image.mode in ('1', 'LA'):
+        return image.convert('L')
+    if image.mode.startswith('I') or image.mode == 'F':
+        gray = image.convert('I') if image.mode.startswith('I;16') else image
+        factor = max(1, max(gray.size) // max_side)
+        if factor > 1:
+            gray = gray.reduce(factor)
+        return stretch_to_8bit(np.asarray(gray, dtype=np.float32))
+    return image.convert('RGB')
+
+
+def thumbnail_pyramid(display, sizes=THUMBNAIL_SIZES, fmt=THUMBNAIL_FORMAT):
+    """Encode one thumbnail per size, each level resampled from the one above it"""
+    levels = {}
+    current = display
+    for size in sorted(sizes, reverse=True):
+        current = current.copy()
+        current.thumbnail((size, size), Image.LANCZOS, reducing_gap=3.0)
+        buffer = io.BytesIO()
+        current.save(buffer, format=fmt.upper(), quality=THUMBNAIL_QUALITY)
+        levels[size] = buffer.getvalue()
+    return levels
+
+
+def quality_issues(metrics):
+    """Names of the quality thresholds the measured metrics fall short of"""
+    issues = []
+    if metrics['rmsContrast'] < MIN_RMS_CONTRAST:
+        issues.append('low contrast')
+    if metrics['blurScore'] is not None and metrics['blurScore'] < MIN_BLUR_SCORE:
+        issues.append('blurred')
+    if metrics['snrDb'] is not None and metrics['snrDb'] < MIN_SNR_DB:
+        issues.append('noisy')
+    if metrics['underexposedFraction'] > MAX_CLIPPED_FRACTION:
+        issues.append('underexposed')
+    if metrics['overexposedFraction'] > MAX_CLIPPED_FRACTION:
+        issues.append('overexposed')
+    return issues
+
+
+def describe_quality(metrics):
+    """One-line quality assessment for the findings, from measured metrics"""
+    if metrics is None:
+        return NOT_ASSESSED
+
+    issues = quality_issues(metrics)
+    if not issues:
+        return 'Good diagnostic quality'
+    return 'Limited diagnostic quality: ' + ', '.join(issues)
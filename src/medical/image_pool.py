@@ -0,0 +1,222 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+# 0 runs pixel work on a thread in this process instead of a worker pool
+IMAGE_POOL_WORKERS = int(os.environ.get('IMAGE_POOL_WORKERS', str(os.cpu_count() or 1)))
+# Tasks running or waiting beyond this are turned away rather than queued
+IMAGE_POOL_QUEUE = int(os.environ.get('IMAGE_POOL_QUEUE', str(4 * max(1, IMAGE_POOL_WORKERS))))
+IMAGE_TASK_TIMEOUT = float(os.environ.get('IMAGE_TASK_TIMEOUT', '30'))
+# spawn is the only start method that is safe from a threaded asyncio process
+IMAGE_POOL_START_METHOD = os.environ.get('IMAGE_POOL_START_METHOD', 'spawn')
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+class PoolBusy(Exception):
+    """Raised when the image work queue is full"""
+
+
+class ImageTaskTimeout(Exception):
+    """Raised when image work does not finish within the task timeout"""
+
+
+class SharedBytesReader(io.RawIOBase):
+    """Seekable file over a memoryview, so PIL reads shared memory without a copy"""
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.position = max(0, offset)
+        return self.position
+
+    def readinto(self, buffer):
+        piece = self.view[self.position:self.position + len(buffer)]
+        count = len(piece)
+        memoryview(buffer).cast('B')[:count] = piece
+        self.position += count
+        return count
+
+    def close(self):
+        self.view = None
+        super().close()
+
+
+def run_on_shared(block_name, length, fn, args):
+    """Worker entry point: attach to the shared block and run fn on it as a file"""
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        view = block.buf[:length]
+        reader = SharedBytesReader(view)
+        try:
+            return fn(reader, *args)
+        except Exception as e:
+            # The traceback's frames may hold arrays over the block, which would
+            # keep it from closing; the parent only sees the pickled error anyway
+            raise e.with_traceback(None)
+        finally:
+            reader.close()
+            view.release()
+    finally:
+        block.close()
+
+
+class ImageWorkerPool:
+    """Runs CPU-bound image functions in worker processes.
+
+    The image bytes are copied once into a shared memory block that the worker
+    maps by name, so only the block name and small results cross the process
+    boundary. At most ``queue_size`` tasks may be running or waiting; further
+    requests raise PoolBusy. A task that exceeds ``timeout`` raises
+    ImageTaskTimeout to its caller; if it was already running, its worker
+    stays busy until the task ends, and both its queue slot and its block are
+    released only then.
+    """
+
+    def __init__(self, name, workers, queue_size, timeout, start_method='spawn'):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.start_method = start_method
+        self._executor = None
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.failed = 0
+        self.restarts = 0
+        self.total_ms = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method)
+            )
+        return self._executor
+
+    def _share(self, upload):
+        block = shared_memory.SharedMemory(create=True, size=max(1, upload.size))
+        length = 0
+        try:
+            upload.file.seek(0)
+            while length < upload.size:
+                count = upload.file.readinto(block.buf[length:min(upload.size, length + COPY_CHUNK_BYTES)])
+                if not count:
+                    break
+                length += count
+        except BaseException:
+            release_block(block)
+            raise
+        return block, length
+
+    async def run(self, upload, fn, *args):
+        """Run fn(file, *args) on the upload's bytes and return its result"""
+        if self.pending >= self.queue_size:
+            self.rejected += 1
+            raise PoolBusy(f'Image {self.name} queue is full ({self.queue_size} tasks)')
+
+        self.pending += 1
+        self.submitted += 1
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                work = asyncio.ensure_future(asyncio.to_thread(fn, upload.file, *args))
+            else:
+                # Chunked copy on a thread so the loop keeps getting the GIL between chunks
+                block, length = await asyncio.to_thread(self._share, upload)
+                future = self._get_executor().submit(run_on_shared, block.name, length, fn, args)
+                # Unlinked only once the worker is done with it, even after a timeout
+                future.add_done_callback(lambda _: release_block(block))
+                work = asyncio.wrap_future(future)
+        except BaseException:
+            self.pending -= 1
+            raise
+        # A task stays pending until its worker is done with it, not just until
+        # its caller gives up, so the queue limit also bounds timed-out work
+        work.add_done_callback(self._task_done)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(work), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise ImageTaskTimeout(f'Image {self.name} task exceeded {self.timeout:g}s')
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            self.failed += 1
+            self.restarts += 1
+            self._executor = None
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.total_ms += (time.perf_counter() - started) * 1000
+        self.completed += 1
+        return result
+
+    def _task_done(self, work):
+        self.pending -= 1
+        if not work.cancelled():
+            # Retrieve the exception of a task nobody awaits any more, so it is not logged as unhandled
+            work.exception()
+
+    def stats(self):
+        finished = self.completed + self.failed + self.timed_out
+        return {
+            'name': self.name,
+            'workers': self.workers,
+            'startMethod': self.start_method if self.workers > 0 else 'thread',
+            'queueSize': self.queue_size,
+            'pending': self.pending,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timedOut': self.timed_out,
+            'rejected': self.rejected,
+            'restarts': self.restarts,
+            'timeoutSeconds': self.timeout,
+            'avgMs': round(self.total_ms / finished, 2) if finished else 0.0
+        }
+
+
+def release_block(block):
+    block.close()
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def pool_from_env(name):
+    """Build the ImageWorkerPool configured by IMAGE_POOL_* / IMAGE_TASK_TIMEOUT"""
+    return ImageWorkerPool(
+        name,
+        workers=IMAGE_POOL_WORKERS,
+        queue_size=IMAGE_POOL_QUEUE,
+        timeout=IMAGE_TASK_TIMEOUT,
+        start_method=IMAGE_POOL_START_METHOD
+    )
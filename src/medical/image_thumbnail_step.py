@@ -0,0 +1,90 @@
+import sys
+import asyncio
+import base64
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from image_upload import header
+from analyze_image_step import thumbnail_store
+
+# Pyramids are addressed by content hash, so a URL's bytes never change
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Motia API configuration
+config = {
+    "name": "ImageThumbnail",
+    "type": "api",
+    "path": "/api/thumbnails/:hash/:size",
+    "method": "GET",
+    "description": "Serve one level of the thumbnail pyramid rendered during a full image analysis",
+    "emits": [],
+    "responseSchema": {
+        200: {
+            "type": "object",
+            "properties": {
+                "success": {"type": "boolean"},
+                "contentType": {"type": "string"},
+                "size": {"type": "integer"},
+                "image": {"type": "string"}
+            }
+        }
+    }
+}
+
+async def handler(req, context):
+    """Return a thumbnail as a base64 data URL, with an ETag for revalidation
+
+    The ETag is derived from the content hash and level, so a client that
+    sends it back in If-None-Match gets a bodyless 304 without the file being
+    read. Unknown hashes, evicted pyramids and sizes outside the configured
+    levels are 404s; a fresh full analysis of the image renders them again.
+    """
+    try:
+        path_params = req.get('pathParams', {}) if isinstance(req, dict) else getattr(req, 'pathParams', {})
+        digest = str(path_params.get('hash', '')).lower()
+        try:
+            size = int(path_params.get('size', ''))
+        except ValueError:
+            size = None
+
+        if size not in thumbnail_store.sizes:
+            return {
+                "status": 404,
+                "body": {
+                    'success': False,
+                    'error': f"Thumbnail size must be one of: {', '.join(map(str, thumbnail_store.sizes))}"
+                }
+            }
+
+        etag = thumbnail_store.etag(digest, size)
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+        if_none_match = header(req, 'If-None-Match') or ''
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        if (etag in tags or '*' in tags) and thumbnail_store.has(digest):
+            return {"status": 304, "headers": headers, "body": None}
+
+        data = await asyncio.to_thread(thumbnail_store.get, digest, size)
+        if data is None:
+            return {
+                "status": 404,
+                "body": {'success': False, 'error': f'No thumbnail stored for {digest}'}
+            }
+
+        return {
+            "status": 200,
+            "headers": headers,
+            "body": {
+                'success': True,
+                'contentType': thumbnail_store.content_type,
+                'size': size,
+                'image': f"data:{thumbnail_store.content_type};base64,{base64.b64encode(data).decode('ascii')}"
+            }
+        }
+    except Exception as e:
+        context.logger.error(f"Thumbnail error: {str(e)}")
+        return {
+            "status": 500,
+            "body": {"success": False, "error": str(e)}
+        }
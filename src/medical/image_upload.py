@@ -0,0 +1,466 @@
+import binascii
+import hashlib
+import io
+import json
+import os
+import posixpath
+import tarfile
+import tempfile
+import zipfile
+from abc import ABC, abstractmethod
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Uploads larger than this are rejected; below SPOOL_BYTES they never touch disk
+IMAGE_UPLOAD_MAX_BYTES = int(os.environ.get('IMAGE_UPLOAD_MAX_BYTES', str(100 * 1024 * 1024)))
+IMAGE_UPLOAD_SPOOL_BYTES = int(os.environ.get('IMAGE_UPLOAD_SPOOL_BYTES', str(8 * 1024 * 1024)))
+
+# Base64 text is decoded one block of this many characters (a multiple of 4) at a time
+BASE64_BLOCK_CHARS = 4 * 16 * 1024
+READ_CHUNK_BYTES = 256 * 1024
+
+# Upper bound on the images accepted in one batch request
+IMAGE_BATCH_MAX_SLICES = int(os.environ.get('IMAGE_BATCH_MAX_SLICES', '2000'))
+
+# Content hash used to address cached analysis results
+DIGEST_ALGORITHM = 'sha256'
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class ReceivedImage(ABC):
+    """Image bytes readable through ``self.file``; ``self.size`` is their length"""
+
+    file = None
+    size = 0
+
+    @abstractmethod
+    def digest(self):
+        """Hex content hash of the image bytes"""
+
+    def finish(self):
+        """Rewind the buffer so it can be handed to a reader"""
+        self.file.seek(0)
+        return self
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class ImageUpload(ReceivedImage):
+    """Image bytes received into a spooled buffer, readable as a file object"""
+
+    def __init__(self, max_bytes=None, spool_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else IMAGE_UPLOAD_MAX_BYTES
+        self.file = tempfile.SpooledTemporaryFile(
+            max_size=spool_bytes if spool_bytes is not None else IMAGE_UPLOAD_SPOOL_BYTES
+        )
+        self.size = 0
+        # Hashed as the bytes arrive, so the digest costs no second pass
+        self._hash = hashlib.new(DIGEST_ALGORITHM)
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f'Image exceeds the {self.max_bytes} byte upload limit')
+        self._hash.update(data)
+        self.file.write(data)
+
+    def digest(self):
+        return self._hash.hexdigest()
+
+
+class BytesUpload(ReceivedImage):
+    """A binary request body that is already in memory, read in place"""
+
+    def __init__(self, body, max_bytes=None):
+        max_bytes = max_bytes if max_bytes is not None else IMAGE_UPLOAD_MAX_BYTES
+        self.size = len(body)
+        if self.size > max_bytes:
+            raise UploadTooLarge(f'Image exceeds the {max_bytes} byte upload limit')
+        # BytesIO shares an immutable bytes buffer instead of copying it
+        self.body = body if isinstance(body, bytes) else bytes(body)
+        self.file = io.BytesIO(self.body)
+
+    def digest(self):
+        return hashlib.new(DIGEST_ALGORITHM, self.body).hexdigest()
+
+
+class Base64Reader(io.RawIOBase):
+    """Seekable binary view of base64 text that decodes only the blocks read.
+
+    Reading a header touches a few kilobytes of the payload however large the
+    image is; a full pixel decode walks it block by block. Whitespace inside
+    the text breaks the fixed 4-characters-to-3-bytes mapping, so the first
+    block that decodes short or misaligned triggers a one-off compaction of
+    the text.
+    """
+
+    def __init__(self, text, start=0):
+        super().__init__()
+        self.text = text
+        self.start = start
+        self.size = self._decoded_size()
+        self.position = 0
+        self._block_index = -1
+        self._block = b''
+        self._compacted = False
+
+    def _decoded_size(self):
+        # Only the tail is inspected; stripping the whole text would copy it
+        tail = self.text[-8:]
+        trimmed = tail.rstrip()
+        chars = len(self.text) - self.start - (len(tail) - len(trimmed))
+        padding = len(trimmed) - len(trimmed.rstrip('='))
+        return max(0, chars // 4 * 3 - min(padding, 2))
+
+    def _load_block(self, index):
+        block_bytes = BASE64_BLOCK_CHARS // 4 * 3
+        offset = self.start + index * BASE64_BLOCK_CHARS
+        final = offset + BASE64_BLOCK_CHARS >= len(self.text)
+        try:
+            chunk = binascii.a2b_base64(self.text[offset:offset + BASE64_BLOCK_CHARS])
+        except binascii.Error:
+            if self._compacted:
+                raise
+            chunk = None
+        if chunk is None or (len(chunk) != block_bytes and not final):
+            if self._compacted:
+                raise ValueError('Invalid base64 image data')
+            self.text = ''.join(self.text[self.start:].split())
+            self.start = 0
+            self.size = self._decoded_size()
+            self._compacted = True
+            return self._load_block(index)
+        self._block_index = index
+        self._block = chunk
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        block_bytes = BASE64_BLOCK_CHARS // 4 * 3
+        written = 0
+        while written < len(view) and self.position < self.size:
+            index, within = divmod(self.position, block_bytes)
+            if index != self._block_index:
+                self._load_block(index)
+            piece = self._block[within:within + len(view) - written]
+            if not piece:
+                break
+            view[written:written + len(piece)] = piece
+            written += len(piece)
+            self.position += len(piece)
+        return written
+
+
+class Base64Upload(ReceivedImage):
+    """A base64 (or data URL) image decoded on demand rather than up front"""
+
+    def __init__(self, text, max_bytes=None):
+        max_bytes = max_bytes if max_bytes is not None else IMAGE_UPLOAD_MAX_BYTES
+        # Skip a "data:image/png;base64," prefix; base64 itself never contains a comma
+        self.text = text
+        self.start = text.find(',', 0, 512) + 1
+        self.file = Base64Reader(text, self.start)
+        if self.size > max_bytes:
+            raise UploadTooLarge(f'Image exceeds the {max_bytes} byte upload limit')
+
+    @property
+    def size(self):
+        # Exact once the reader has compacted any whitespace out of the text
+        return self.file.size
+
+    def digest(self):
+        # A separate reader decodes block by block without moving self.file
+        return hashlib.file_digest(Base64Reader(self.text, self.start), DIGEST_ALGORITHM).hexdigest()
+
+
+def header(req, name):
+    """Case-insensitive request header lookup"""
+    headers = req.get('headers', {}) if isinstance(req, dict) else getattr(req, 'headers', {}) or {}
+    name = name.lower()
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value[0] if isinstance(value, list) else value
+    return None
+
+
+def write_stream(upload, source):
+    """Copy a file-like body into the upload without loading it whole"""
+    while True:
+        chunk = source.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        upload.write(chunk)
+
+
+def iter_multipart(body, content_type, open_part):
+    """Parse a multipart/form-data body incrementally.
+
+    open_part(name, filename) is called when a part's headers are complete and
+    returns an object whose write() receives the part's bytes, or None to
+    collect the part as text. Yields (name, filename, value) as each part
+    finishes, where value is that object or the decoded text, so callers can
+    act on early parts before the rest of the body is parsed.
+    """
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b'boundary')
+    if not boundary:
+        raise ValueError('multipart body without a boundary')
+
+    finished = []
+    part = {'name': None, 'filename': None, 'target': None, 'header': b'', 'value': b'', 'headers': {}, 'text': []}
+
+    def on_part_begin():
+        part.update(name=None, filename=None, target=None, header=b'', value=b'', headers={}, text=[])
+
+    def on_header_field(data, start, end):
+        part['header'] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part['value'] += data[start:end]
+
+    def on_header_end():
+        part['headers'][part['header'].lower()] = part['value']
+        part['header'] = b''
+        part['value'] = b''
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part['headers'].get(b'content-disposition', b''))
+        part['name'] = disposition.get(b'name', b'').decode('utf-8', 'replace')
+        filename = disposition.get(b'filename')
+        part['filename'] = filename.decode('utf-8', 'replace') if filename is not None else None
+        part['target'] = open_part(part['name'], part['filename'])
+
+    def on_part_data(data, start, end):
+        if part['target'] is not None:
+            part['target'].write(data[start:end])
+        else:
+            part['text'].append(bytes(data[start:end]))
+
+    def on_part_end():
+        if part['target'] is not None:
+            finished.append((part['name'], part['filename'], part['target']))
+        elif part['name']:
+            finished.append((part['name'], None, b''.join(part['text']).decode('utf-8', 'replace')))
+
+    parser = MultipartParser(boundary, {
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end
+    })
+
+    if hasattr(body, 'read'):
+        chunks = iter(lambda: body.read(READ_CHUNK_BYTES), b'')
+    else:
+        # The parser needs bytes, so only one chunk at a time is copied out of the body
+        view = memoryview(body)
+        chunks = (view[offset:offset + READ_CHUNK_BYTES].tobytes() for offset in range(0, len(view), READ_CHUNK_BYTES))
+
+    for chunk in chunks:
+        parser.write(chunk)
+        if finished:
+            yield from finished
+            finished.clear()
+    parser.finalize()
+    yield from finished
+
+
+def write_multipart(upload, body, content_type, field='image'):
+    """Stream the image part of a multipart/form-data body into the upload.
+
+    Returns the other (small, text) form fields as a dict.
+    """
+    fields = {}
+    for name, _, value in iter_multipart(body, content_type, lambda name, filename: upload if name == field else None):
+        if value is not upload:
+            fields[name] = value
+    return fields
+
+
+def receive_image(req):
+    """Read the image from a request into an ImageUpload.
+
+    Accepts a raw binary body (application/octet-stream or image/*), a
+    multipart/form-data body with an ``image`` part, or the JSON form with a
+    base64 ``image`` string. Returns (upload, fields) where fields holds the
+    remaining request parameters such as imageType; upload is None when the
+    request carries no image. In-memory bodies are read in place and base64 is
+    decoded lazily, so nothing is copied until a reader asks for it.
+    """
+    body = req.get('body') if isinstance(req, dict) and 'body' in req else getattr(req, 'body', req)
+    content_type = header(req, 'content-type') or ''
+    query = (req.get('queryParams') if isinstance(req, dict) else None) or {}
+    fields = {key: value[0] if isinstance(value, list) else value for key, value in query.items()}
+
+    upload = None
+    try:
+        if content_type.startswith('multipart/form-data') and not isinstance(body, (str, dict)):
+            upload = ImageUpload()
+            fields.update(write_multipart(upload, body, content_type))
+        elif isinstance(body, (bytes, bytearray, memoryview)):
+            upload = BytesUpload(body)
+        elif hasattr(body, 'read'):
+            upload = ImageUpload()
+            write_stream(upload, body)
+        else:
+            data = json.loads(body) if isinstance(body, str) else body
+            if not isinstance(data, dict):
+                raise ValueError(f'Invalid data format: {type(data)}')
+            fields.update({key: value for key, value in data.items() if key != 'image'})
+            image_data = data.get('image')
+            if image_data:
+                upload = Base64Upload(image_data)
+
+        image_type = header(req, 'x-image-type')
+        if image_type and 'imageType' not in fields:
+            fields['imageType'] = image_type
+    except Exception:
+        if upload is not None:
+            upload.close()
+        raise
+
+    if upload is None or upload.size == 0:
+        if upload is not None:
+            upload.close()
+        return None, fields
+
+    return upload.finish(), fields
+
+
+def batch_member_upload():
+    """Buffer for one batch member; like a single upload, spilled to disk above IMAGE_UPLOAD_SPOOL_BYTES"""
+    return ImageUpload()
+
+
+def skip_member(name):
+    """Directories, hidden files and archive metadata such as __MACOSX/"""
+    base = posixpath.basename(name.rstrip('/'))
+    return not base or base.startswith('.') or name.startswith('__MACOSX/')
+
+
+def read_member(name, source, size_hint=None):
+    """Copy one archive member into a buffer; returns (name, upload, error)"""
+    if size_hint is not None and size_hint > IMAGE_UPLOAD_MAX_BYTES:
+        return name, None, f'Image exceeds the {IMAGE_UPLOAD_MAX_BYTES} byte upload limit'
+    upload = batch_member_upload()
+    try:
+        write_stream(upload, source)
+    except UploadTooLarge as e:
+        upload.close()
+        return name, None, str(e)
+    return name, upload.finish(), None
+
+
+def iter_zip(fileobj):
+    # The central directory is at the end, so zip needs a seekable body; members
+    # are still decompressed one at a time as they are reached
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or skip_member(info.filename):
+                continue
+            with archive.open(info) as member:
+                yield read_member(info.filename, member, info.file_size)
+
+
+def iter_tar(fileobj):
+    # Stream mode ('r|*') reads members strictly in order and never seeks
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode='r|*')
+    except tarfile.TarError as e:
+        raise ValueError('Batch body is not a zip or tar archive') from e
+    with archive:
+        for info in archive:
+            if not info.isfile() or skip_member(info.name):
+                continue
+            yield read_member(info.name, archive.extractfile(info), info.size)
+
+
+def iter_batch_images(req):
+    """Read the images of a batch request one at a time.
+
+    The body is a zip or (optionally compressed) tar archive, or a
+    multipart/form-data upload with one file part per image. Returns
+    (members, fields): members is a generator of (name, upload, error) that
+    reads each image only when advanced, so nothing is extracted to disk and
+    at most the images being analyzed are buffered. fields holds imageType
+    and other parameters from the query string, headers and any multipart
+    text parts that precede the images.
+    """
+    body = req.get('body') if isinstance(req, dict) and 'body' in req else getattr(req, 'body', req)
+    content_type = header(req, 'content-type') or ''
+    query = (req.get('queryParams') if isinstance(req, dict) else None) or {}
+    fields = {key: value[0] if isinstance(value, list) else value for key, value in query.items()}
+    image_type = header(req, 'x-image-type')
+    if image_type and 'imageType' not in fields:
+        fields['imageType'] = image_type
+
+    if isinstance(body, str) or body is None or isinstance(body, dict):
+        raise ValueError('Batch images must be sent as a zip or tar archive or multipart/form-data')
+
+    if content_type.startswith('multipart/form-data'):
+        def members():
+            count = 0
+            parts = iter_multipart(body, content_type,
+                                   lambda name, filename: batch_member_upload() if filename is not None else None)
+            for name, filename, value in parts:
+                if filename is None:
+                    fields.setdefault(name, value)
+                    continue
+                count += 1
+                if count > IMAGE_BATCH_MAX_SLICES:
+                    value.close()
+                    raise ValueError(f'Batch exceeds {IMAGE_BATCH_MAX_SLICES} images')
+                yield filename or name, value.finish(), None
+        return members(), fields
+
+    fileobj = body if hasattr(body, 'read') else io.BytesIO(body if isinstance(body, bytes) else bytes(body))
+
+    if fileobj.seekable() and zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        archive = iter_zip(fileobj)
+    else:
+        if fileobj.seekable():
+            fileobj.seek(0)
+        archive = iter_tar(fileobj)
+
+    def members():
+        for count, member in enumerate(archive, 1):
+            if count > IMAGE_BATCH_MAX_SLICES:
+                if member[1] is not None:
+                    member[1].close()
+                raise ValueError(f'Batch exceeds {IMAGE_BATCH_MAX_SLICES} images')
+            yield member
+    return members(), fields
@@ -0,0 +1,227 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+from collections import Counter
+
+from image_upload import UploadTooLarge
+from reference_ranges import canonical_panel, classify_panel, patient_profile
+from analyze_lab_results_step import analyze_readings
+
+# Uploaded files are spooled under LAB_INGEST_DIR/uploads and results written to
+# LAB_INGEST_DIR/results; local files are only read from LAB_INGEST_SOURCE_DIR
+LAB_INGEST_DIR = os.environ.get('LAB_INGEST_DIR', os.path.join('.cache', 'lab-ingest'))
+LAB_INGEST_SOURCE_DIR = os.environ.get('LAB_INGEST_SOURCE_DIR', os.path.join(LAB_INGEST_DIR, 'inbox'))
+LAB_INGEST_UPLOAD_MAX_BYTES = int(os.environ.get('LAB_INGEST_UPLOAD_MAX_BYTES', str(512 * 1024 * 1024)))
+
+# Result files untouched for this many seconds are deleted
+LAB_INGEST_RESULTS_TTL = int(os.environ.get('LAB_INGEST_RESULTS_TTL', str(7 * 24 * 3600)))
+
+# Progress is recorded (and results flushed to disk) every this many rows
+LAB_INGEST_CHUNK_ROWS = int(os.environ.get('LAB_INGEST_CHUNK_ROWS', '10000'))
+
+# Upper bound on the rows returned by one page of results
+LAB_INGEST_PAGE_ROWS = 10000
+
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+# Columns of a flat row that describe the patient rather than a lab value
+PATIENT_FIELDS = ('patientId', 'name', 'age', 'gender')
+
+JOB_ID_PATTERN = re.compile(r'^INGEST-[0-9a-f]{12}$')
+
+
+def ingest_format(name=None, content_type=None, requested=None):
+    """'csv' or 'ndjson' from an explicit format, a file name or a Content-Type"""
+    if requested:
+        if requested not in CONTENT_TYPES:
+            raise ValueError(f"format must be one of: {', '.join(CONTENT_TYPES)}")
+        return requested
+    if name:
+        fmt = EXTENSIONS.get(os.path.splitext(name)[1].lower())
+        if fmt:
+            return fmt
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if media_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        return 'ndjson'
+    raise ValueError('Cannot tell whether the file is CSV or NDJSON; pass format')
+
+
+def source_path(path):
+    """Resolve a local file name inside LAB_INGEST_SOURCE_DIR, refusing anything outside it"""
+    root = os.path.realpath(LAB_INGEST_SOURCE_DIR)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root or not os.path.isfile(resolved):
+        raise FileNotFoundError(f'No such file in the ingest directory: {path}')
+    return resolved
+
+
+def upload_path(job_id, fmt):
+    return os.path.join(LAB_INGEST_DIR, 'uploads', f'{job_id}.{fmt}')
+
+
+def results_path(job_id):
+    return os.path.join(LAB_INGEST_DIR, 'results', f'{job_id}.ndjson')
+
+
+def spool_upload(body, path, max_bytes=LAB_INGEST_UPLOAD_MAX_BYTES):
+    """Write an uploaded body (text, bytes or a file-like stream) to path; returns its size"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        body = io.BytesIO(body)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            chunk = body.read(1024 * 1024)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                f.close()
+                os.remove(path)
+                raise UploadTooLarge(f'Upload exceeds the {max_bytes} byte limit')
+            f.write(chunk)
+    return size
+
+
+def expire_results(max_age=LAB_INGEST_RESULTS_TTL):
+    """Delete result files not written to for max_age seconds; returns how many went"""
+    directory = os.path.dirname(results_path('x'))
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            # A running ingest flushes its file every chunk, so only finished ones get this old
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def read_rows(binary, fmt):
+    """Yield (line, row) for each record of an open binary file.
+
+    Rows are dicts; an NDJSON line that does not parse yields the error
+    instead, so one bad line does not stop the file.
+    """
+    text = io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line, record in enumerate(text, 1):
+            if not record.strip():
+                continue
+            try:
+                yield line, json.loads(record)
+            except ValueError as e:
+                yield line, e
+    finally:
+        # Hand the file back open; the caller owns it and reads its position
+        text.detach()
+
+
+def panel_from_row(row):
+    """(patientId, patientInfo, labResults, labUnits) of a nested or flat row.
+
+    Nested rows look like the /api/analyze-lab-results body plus a
+    patientId; flat rows (every CSV row) hold patient columns next to one
+    column per lab value, with any unit written in the value ('7.1 mmol/L').
+    """
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError('Invalid row format')
+    if 'labResults' in row:
+        patient_info = row.get('patientInfo') or {}
+        return (row.get('patientId', patient_info.get('patientId')), patient_info,
+                row['labResults'] or {}, row.get('labUnits'))
+    patient_info = {field: row[field] for field in PATIENT_FIELDS if row.get(field) not in (None, '')}
+    labs = {key: value for key, value in row.items() if key not in PATIENT_FIELDS and key is not None}
+    return patient_info.get('patientId'), patient_info, labs, None
+
+
+def analyze_row(line, row):
+    """Output record for one input row: its analysis, or the error that stopped it
+
+    Values are read strictly, as /api/analyze-lab-results reads them: a value
+    that is not a number or names an unknown unit fails the row.
+    """
+    patient_id = None
+    try:
+        patient_id, patient_info, lab_results, lab_units = panel_from_row(row)
+        readings = classify_panel(canonical_panel(lab_results, lab_units), *patient_profile(patient_info))
+        return {'line': line, 'patientId': patient_id, 'success': True, 'analysis': analyze_readings(readings)}
+    except Exception as e:
+        return {'line': line, 'patientId': patient_id, 'success': False, 'error': str(e)}
+
+
+def ingest(source, fmt, output, chunk_rows=LAB_INGEST_CHUNK_ROWS):
+    """Analyze a CSV or NDJSON file row by row, writing one NDJSON result per row.
+
+    A generator pipeline (read_rows -> analyze_row -> output file): only the
+    row in hand is held in memory, whatever the file's size. Yields a
+    progress snapshot after every ``chunk_rows`` rows, once the results so far
+    have been flushed to ``output``, and a final one at the end of the file.
+    """
+    total_bytes = os.path.getsize(source)
+    counts = Counter()
+    risks = Counter()
+
+    def progress():
+        return {
+            'rows': counts['rows'],
+            'analyzed': counts['analyzed'],
+            'failed': counts['rows'] - counts['analyzed'],
+            'withAbnormalities': counts['abnormal'],
+            'bytesRead': min(binary.tell(), total_bytes),
+            'totalBytes': total_bytes,
+            'riskIndicators': dict(risks.most_common())
+        }
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(source, 'rb') as binary, open(output, 'w', encoding='utf-8') as out:
+        for line, row in read_rows(binary, fmt):
+            result = analyze_row(line, row)
+            out.write(json.dumps(result, separators=(',', ':')) + '\n')
+            counts['rows'] += 1
+            if result['success']:
+                analysis = result['analysis']
+                counts['analyzed'] += 1
+                counts['abnormal'] += bool(analysis['abnormalities'])
+                risks.update(analysis['riskIndicators'])
+            if counts['rows'] % chunk_rows == 0:
+                out.flush()
+                yield progress()
+        out.flush()
+        yield progress()
+
+
+def read_results(path, offset=0, limit=LAB_INGEST_PAGE_ROWS):
+    """Up to limit complete NDJSON lines starting at byte offset; returns (text, next_offset)"""
+    lines = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while len(lines) < limit:
+            line = f.readline()
+            # A line without its newline is still being written
+            if not line.endswith(b'\n'):
+                break
+            lines.append(line)
+            offset += len(line)
+    return b''.join(lines).decode('utf-8'), offset
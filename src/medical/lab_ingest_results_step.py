@@ -0,0 +1,75 @@
+import sys
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from lab_ingest import CONTENT_TYPES, JOB_ID_PATTERN, LAB_INGEST_PAGE_ROWS, read_results, results_path
+
+# Motia API configuration
+config = {
+    "name": "LabIngestResults",
+    "type": "api",
+    "path": "/api/lab-ingest/:jobId/results",
+    "method": "GET",
+    "description": "Page through a lab-result ingest's per-row analyses as NDJSON",
+    "emits": [],
+    "flows": ["lab-ingest-flow"]
+}
+
+async def handler(req, context):
+    """Return up to ``limit`` result lines from byte ``offset`` as NDJSON
+
+    Each line is ``{line, patientId, success, analysis|error}`` for one input
+    row. Results can be read while the ingest is still running; the
+    X-Next-Offset header is the offset of the following page, and
+    X-Job-Status says whether more lines are still to come.
+    """
+    try:
+        path_params = req.get('pathParams', {}) if isinstance(req, dict) else getattr(req, 'pathParams', {})
+        query = (req.get('queryParams') if isinstance(req, dict) else None) or {}
+        fields = {key: value[0] if isinstance(value, list) else value for key, value in query.items()}
+        job_id = path_params.get('jobId') or ''
+
+        job = await context.state.get("lab-ingest-jobs", job_id) if JOB_ID_PATTERN.match(job_id) else None
+        if job is None:
+            return {
+                "status": 404,
+                "body": {'success': False, 'error': f'Unknown job: {job_id}'}
+            }
+
+        try:
+            offset = max(0, int(fields.get('offset', 0)))
+            limit = min(max(1, int(fields.get('limit', LAB_INGEST_PAGE_ROWS))), LAB_INGEST_PAGE_ROWS)
+        except ValueError:
+            return {
+                "status": 400,
+                "body": {'success': False, 'error': 'offset and limit must be integers'}
+            }
+
+        try:
+            text, next_offset = await asyncio.to_thread(read_results, results_path(job_id), offset, limit)
+        except FileNotFoundError:
+            if job["status"] not in ("queued", "running"):
+                return {
+                    "status": 410,
+                    "body": {'success': False, 'error': f'Results of {job_id} have expired'}
+                }
+            # Queued and not yet started
+            text, next_offset = '', offset
+
+        return {
+            "status": 200,
+            "headers": {
+                "Content-Type": CONTENT_TYPES['ndjson'],
+                "X-Next-Offset": str(next_offset),
+                "X-Job-Status": job["status"]
+            },
+            "body": text
+        }
+    except Exception as e:
+        context.logger.error(f"Lab ingest results error: {str(e)}")
+        return {
+            "status": 500,
+            "body": {"success": False, "error": str(e)}
+        }
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import math
+import os
+import random
+import re
+
+
+class GeminiBackend:
+    """Google Gemini via google-generativeai, configured once per process"""
+
+    name = 'gemini'
+
+    def __init__(self, model_name='gemini-pro'):
+        self.model_name = model_name
+        self._model = None
+        self._api_key = None
+
+    def configuration_error(self):
+        """Message describing missing configuration, or None when ready"""
+        api_key = os.environ.get('GEMINI_API_KEY')
+        if not api_key or api_key == 'your_google_gemini_api_key_here':
+            return 'Gemini API key not configured. Please set GEMINI_API_KEY in .env file'
+        return None
+
+    def _get_model(self):
+        import google.generativeai as genai
+
+        api_key = os.environ.get('GEMINI_API_KEY')
+        if self._model is None or api_key != self._api_key:
+            genai.configure(api_key=api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+            self._api_key = api_key
+        return self._model
+
+    async def generate(self, prompt):
+        response = await self._get_model().generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt):
+        response = await self._get_model().generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+    def stats(self):
+        return {'name': self.name, 'model': self.model_name}
+
+
+MOCK_FOODS = {
+    'vegetarian': [
+        'Brown rice and hand-pounded red rice in measured portions',
+        'Whole wheat or multigrain chapati',
+        'Millets such as jowar, bajra and ragi',
+        'Moong dal, masoor dal and chana dal',
+        'Rajma and chickpeas soaked overnight',
+        'Green leafy vegetables: palak, methi, amaranth',
+        'Bottle gourd, ridge gourd and bitter gourd sabzi',
+        'Low-fat curd and buttermilk',
+        'Paneer made from toned milk',
+        'Almonds, walnuts and flaxseeds',
+        'Guava, papaya and apple',
+        'Cold-pressed mustard or groundnut oil in small amounts'
+    ],
+    'nonvegetarian': [
+        'Grilled or tandoori chicken breast without skin',
+        'Rohu, pomfret or mackerel curry with minimal oil',
+        'Steamed or baked fish with lemon and herbs',
+        'Boiled egg whites',
+        'Chicken clear soup with vegetables',
+        'Prawns sautéed with little oil',
+        'Egg bhurji cooked with vegetables'
+    ],
+    'avoid': [
+        'Maida-based bread, naan and bakery items',
+        'Deep-fried snacks such as samosa, pakora and puri',
+        'Sweets, mithai and sugary beverages',
+        'Pickles, papad and high-sodium namkeen',
+        'Processed meats and packaged ready meals',
+        'Excess ghee, butter and vanaspati',
+        'White rice in large portions',
+        'Packaged fruit juices',
+        'Late-night heavy meals',
+        'Alcohol and sugary colas'
+    ],
+    'lifestyle': [
+        'Drink 2.5 to 3 litres of water through the day',
+        'Eat at fixed times with a light dinner before 8 pm',
+        'Use a smaller plate and fill half with vegetables',
+        'Walk briskly for 30-40 minutes at least five days a week',
+        'Sleep 7-8 hours on a regular schedule',
+        'Practise pranayama or meditation for 10 minutes daily',
+        'Limit tea and coffee to two cups a day'
+    ]
+}
+
+
+class MockLLMBackend:
+    """Offline stand-in for Gemini with configurable latency, errors and chunking.
+
+    Output is section-formatted like a real diet response and seeded from the
+    prompt, so identical prompts always produce identical text. Latency is drawn
+    from the configured distribution, with its own seeded generator so load runs
+    are repeatable.
+    """
+
+    name = 'mock'
+
+    def __init__(self, latency_ms=800.0, latency_jitter_ms=200.0, distribution='normal',
+                 error_rate=0.0, chunk_size=48, chunk_delay_ms=20.0, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.chunk_size = chunk_size
+        self.chunk_delay_ms = chunk_delay_ms
+        self._rng = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls):
+        seed = os.environ.get('MOCK_LLM_SEED')
+        return cls(
+            latency_ms=float(os.environ.get('MOCK_LLM_LATENCY_MS', '800')),
+            latency_jitter_ms=float(os.environ.get('MOCK_LLM_LATENCY_JITTER_MS', '200')),
+            distribution=os.environ.get('MOCK_LLM_LATENCY_DISTRIBUTION', 'normal').lower(),
+            error_rate=float(os.environ.get('MOCK_LLM_ERROR_RATE', '0')),
+            chunk_size=int(os.environ.get('MOCK_LLM_CHUNK_SIZE', '48')),
+            chunk_delay_ms=float(os.environ.get('MOCK_LLM_CHUNK_DELAY_MS', '20')),
+            seed=int(seed) if seed is not None else None
+        )
+
+    def configuration_error(self):
+        return None
+
+    def sample_latency(self):
+        """Seconds of simulated upstream latency for one call"""
+        mean = self.latency_ms
+        spread = self.latency_jitter_ms
+        if self.distribution == 'fixed':
+            value = mean
+        elif self.distribution == 'uniform':
+            value = self._rng.uniform(mean - spread, mean + spread)
+        elif self.distribution == 'exponential':
+            value = self._rng.expovariate(1 / mean) if mean > 0 else 0.0
+        elif self.distribution == 'lognormal':
+            # Heavy right tail; spread is the standard deviation of the latency itself
+            if mean > 0:
+                sigma2 = math.log(1 + (spread / mean) ** 2)
+                value = self._rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+            else:
+                value = 0.0
+        else:
+            value = self._rng.gauss(mean, spread)
+        return max(0.0, value) / 1000
+
+    def _maybe_fail(self):
+        self.calls += 1
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            raise RuntimeError('Mock LLM injected failure (429 Resource has been exhausted)')
+
+    def render(self, prompt):
+        """Deterministic, section-formatted diet text for a prompt"""
+        rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).digest())
+        block = re.search(r'Identified Health Concerns:\n((?:- .+\n?)+)', prompt)
+        concerns = re.findall(r'^- (.+)$', block.group(1), re.MULTILINE) if block else []
+        focus = ', '.join(concerns[:3]).lower() if concerns else 'general wellbeing'
+
+        lines = [
+            '**1. DIET OVERVIEW**',
+            f'This plan is built around {focus}, favouring whole grains, pulses and vegetables '
+            'while keeping refined carbohydrates, salt and saturated fat low. Meals are spread '
+            'evenly through the day to keep energy and blood sugar steady.',
+            '',
+            '**2. RECOMMENDED FOODS (VEGETARIAN)**'
+        ]
+        for section, heading, count in [('vegetarian', '**3. RECOMMENDED FOODS (NON-VEGETARIAN)**', 9),
+                                         ('nonvegetarian', '**4. FOODS TO AVOID**', 6),
+                                         ('avoid', '**5. LIFESTYLE & HYDRATION TIPS**', 9),
+                                         ('lifestyle', None, 6)]:
+            lines.extend(f'* {item}' for item in rng.sample(MOCK_FOODS[section], count))
+            if heading:
+                lines.extend(['', heading])
+        return '\n'.join(lines) + '\n'
+
+    async def generate(self, prompt):
+        await asyncio.sleep(self.sample_latency())
+        self._maybe_fail()
+        return self.render(prompt)
+
+    async def stream(self, prompt):
+        # Time to first token, then evenly paced chunks
+        await asyncio.sleep(self.sample_latency())
+        self._maybe_fail()
+        text = self.render(prompt)
+        for start in range(0, len(text), self.chunk_size):
+            if start:
+                await asyncio.sleep(self.chunk_delay_ms / 1000)
+            yield text[start:start + self.chunk_size]
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'distribution': self.distribution,
+            'latencyMs': self.latency_ms,
+            'errorRate': self.error_rate,
+            'calls': self.calls,
+            'errors': self.errors
+        }
+
+
+def backend_from_env():
+    """Pick the diet LLM backend named by DIET_LLM_BACKEND (gemini or mock)"""
+    backend = os.environ.get('DIET_LLM_BACKEND', 'gemini').lower()
+    if backend == 'mock':
+        return MockLLMBackend.from_env()
+    if backend == 'gemini':
+        return GeminiBackend(os.environ.get('GEMINI_MODEL', 'gemini-pro'))
+    raise ValueError(f'Unknown DIET_LLM_BACKEND: {backend}')
@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from generate_diet_step import diet_cache, diet_flight, hedging_stats, gemini_limiter, gemini_breaker, llm_backend
+from disease_prediction_step import prediction_flight
+from analyze_image_step import image_cache, image_pool, thumbnail_store, image_similarity
+
+# Motia API configuration
+config = {
+    "name": "Metrics",
+    "type": "api",
+    "path": "/api/metrics",
+    "method": "GET",
+    "description": "Report cache and upstream-protection counters for this worker process",
+    "emits": [],
+    "responseSchema": {
+        200: {
+            "type": "object",
+            "properties": {
+                "success": {"type": "boolean"},
+                "caches": {"type": "object"},
+                "coalescing": {"type": "object"},
+                "dietHedging": {"type": "object"},
+                "imageWorkers": {"type": "object"},
+                "upstreams": {"type": "object"}
+            }
+        }
+    }
+}
+
+async def handler(req, context):
+    """Collect in-process counters from the medical steps"""
+    try:
+        return {
+            "status": 200,
+            "body": {
+                'success': True,
+                'caches': {
+                    'diet': diet_cache.stats(),
+                    'image': image_cache.stats(),
+                    'thumbnails': thumbnail_store.stats(),
+                    'perceptualHashes': image_similarity.stats()
+                },
+                'coalescing': {
+                    'diet': diet_flight.stats(),
+                    'prediction': prediction_flight.stats()
+                },
+                'dietHedging': hedging_stats(),
+                'imageWorkers': image_pool.stats(),
+                'upstreams': {
+                    'geminiRateLimiter': gemini_limiter.stats(),
+                    'geminiCircuitBreaker': gemini_breaker.stats(),
+                    'dietLlmBackend': llm_backend.stats()
+                }
+            }
+        }
+    except Exception as e:
+        context.logger.error(f"Metrics error: {str(e)}")
+        return {
+            "status": 500,
+            "body": {"success": False, "error": str(e)}
+        }
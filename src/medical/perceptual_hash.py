@@ -0,0 +1,122 @@
+import itertools
+import os
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+# The hash is split into this many 16-bit chunks, each indexed in its own table
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# Hashes this many bits apart or fewer count as the same picture
+IMAGE_PHASH_MAX_DISTANCE = int(os.environ.get('IMAGE_PHASH_MAX_DISTANCE', '6'))
+IMAGE_PHASH_INDEX_SIZE = int(os.environ.get('IMAGE_PHASH_INDEX_SIZE', '500000'))
+
+
+def difference_hash(pixels):
+    """64-bit dHash of a 2-D grayscale array.
+
+    The image is box-filtered to 9x8 and each bit records whether a cell is
+    brighter than its left neighbour, so the hash survives resizing,
+    re-encoding and monotonic changes of brightness or bit depth.
+    """
+    small = Image.fromarray(np.asarray(pixels, dtype=np.float32), 'F').resize((9, 8), Image.BOX)
+    cells = np.asarray(small)
+    bits = np.packbits(cells[:, 1:] > cells[:, :-1])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+@lru_cache(maxsize=None)
+def flip_masks(radius):
+    """XOR masks turning a chunk into every value within radius bit flips of it"""
+    return tuple(
+        sum(1 << position for position in positions)
+        for flips in range(radius + 1)
+        for positions in itertools.combinations(range(CHUNK_BITS), flips)
+    )
+
+
+class PerceptualHashIndex:
+    """Multi-index hash table for Hamming-distance lookups over 64-bit hashes.
+
+    Each hash is filed under its four 16-bit chunks. Two hashes within
+    distance d must agree to within d // 4 bits on at least one chunk, so a
+    lookup probes only the chunk values that close to the query's, then
+    checks the few candidates it finds with a popcount. With hundreds of
+    thousands of hashes the buckets hold a handful of entries each, so a
+    lookup within distance 4-7 costs 68 dict probes (well under a
+    millisecond) rather than a scan; 8-11 needs 548.
+
+    Keys (content digests) are evicted oldest first beyond ``max_size``.
+    """
+
+    def __init__(self, max_size=IMAGE_PHASH_INDEX_SIZE, max_distance=IMAGE_PHASH_MAX_DISTANCE):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self._hashes = OrderedDict()
+        self._tables = [{} for _ in range(CHUNKS)]
+        self.lookups = 0
+        self.matches = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def _chunks(self, value):
+        return [(value >> (CHUNK_BITS * i)) & CHUNK_MASK for i in range(CHUNKS)]
+
+    def add(self, key, value):
+        if key in self._hashes:
+            self.remove(key)
+        self._hashes[key] = value
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            table.setdefault(chunk, set()).add(key)
+        while len(self._hashes) > self.max_size:
+            self.remove(next(iter(self._hashes)))
+            self.evictions += 1
+
+    def remove(self, key):
+        value = self._hashes.pop(key, None)
+        if value is None:
+            return
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            bucket = table[chunk]
+            bucket.discard(key)
+            if not bucket:
+                del table[chunk]
+
+    def search(self, value, max_distance=None, limit=10):
+        """(key, distance) pairs within max_distance of value, closest first; at most limit unless it is None"""
+        if max_distance is None:
+            max_distance = self.max_distance
+        masks = flip_masks(max_distance // CHUNKS)
+        self.lookups += 1
+        seen = set()
+        found = []
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            for mask in masks:
+                for key in table.get(chunk ^ mask, ()):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    distance = (self._hashes[key] ^ value).bit_count()
+                    if distance <= max_distance:
+                        found.append((key, distance))
+        found.sort(key=lambda match: match[1])
+        if found:
+            self.matches += 1
+        return found[:limit]
+
+    def stats(self):
+        return {
+            'hashes': len(self._hashes),
+            'maxSize': self.max_size,
+            'maxDistance': self.max_distance,
+            'lookups': self.lookups,
+            'matches': self.matches,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,68 @@
+import os
+import sys
+import asyncio
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from lab_ingest import ingest
+
+config = {
+    "name": "ProcessLabIngest",
+    "type": "event",
+    "description": "Streams a queued lab-result file through analysis and records progress per chunk",
+    "subscribes": ["lab-ingest-submitted"],
+    "emits": [],
+    "flows": ["lab-ingest-flow"],
+    "input": {
+        "type": "object",
+        "properties": {
+            "jobId": {"type": "string"}
+        },
+        "required": ["jobId"]
+    }
+}
+
+async def handler(input_data, context):
+    job_id = input_data.get("jobId")
+
+    job = await context.state.get("lab-ingest-jobs", job_id)
+    data = await context.state.get("lab-ingest-inputs", job_id)
+    if job is None or data is None:
+        context.logger.error("Lab ingest job not found in state", {"job_id": job_id})
+        return
+
+    async def save(**changes):
+        job.update(changes)
+        job["updatedAt"] = datetime.now(timezone.utc).isoformat()
+        await context.state.set("lab-ingest-jobs", job_id, job)
+
+    context.logger.info("Processing lab ingest", {"job_id": job_id})
+    await save(status="running")
+
+    # Each next() analyzes one chunk of rows off the event loop
+    chunks = ingest(data["source"], data["format"], data["output"])
+    try:
+        while (progress := await asyncio.to_thread(next, chunks, None)) is not None:
+            await save(progress=progress)
+    except Exception as e:
+        context.logger.error(f"Lab ingest failed: {str(e)}", {"job_id": job_id})
+        await save(status="failed", error=str(e))
+        return
+    finally:
+        chunks.close()
+        if data["upload"]:
+            try:
+                os.remove(data["source"])
+            except FileNotFoundError:
+                pass
+        await context.state.delete("lab-ingest-inputs", job_id)
+
+    await save(status="complete")
+
+    context.logger.info("Lab ingest finished", {
+        "job_id": job_id,
+        "rows": job["progress"].get("rows"),
+        "failed": job["progress"].get("failed")
+    })
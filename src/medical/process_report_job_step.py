@@ -0,0 +1,66 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from full_report_step import run_full_report
+
+config = {
+    "name": "ProcessReportJob",
+    "type": "event",
+    "description": "Runs a queued report job and records stage progress in state",
+    "subscribes": ["report-job-submitted"],
+    "emits": [],
+    "flows": ["report-job-flow"],
+    "input": {
+        "type": "object",
+        "properties": {
+            "jobId": {"type": "string"}
+        },
+        "required": ["jobId"]
+    }
+}
+
+async def handler(input_data, context):
+    job_id = input_data.get("jobId")
+
+    job = await context.state.get("report-jobs", job_id)
+    data = await context.state.get("report-job-inputs", job_id)
+    if job is None or data is None:
+        context.logger.error("Report job not found in state", {"job_id": job_id})
+        return
+
+    async def save(**changes):
+        job.update(changes)
+        job["updatedAt"] = datetime.now(timezone.utc).isoformat()
+        await context.state.set("report-jobs", job_id, job)
+
+    async def on_stage(stage, result):
+        # API handler stages return {status, body}; in-process stages return the body directly
+        body = result.get("body", result) if isinstance(result, dict) else {}
+        job["stages"][stage] = "complete" if body.get("success") else "failed"
+        await save()
+
+    context.logger.info("Processing report job", {"job_id": job_id})
+    await save(status="running")
+
+    try:
+        result = await run_full_report(data, context, on_stage)
+    except Exception as e:
+        context.logger.error(f"Report job failed: {str(e)}", {"job_id": job_id})
+        await save(status="failed", error=str(e))
+        return
+    finally:
+        # The patient input is not kept once the job has run, whatever the outcome
+        await context.state.delete("report-job-inputs", job_id)
+
+    if result.get("success"):
+        await save(status="complete", timings=result.pop("timings"), result=result)
+    else:
+        await save(status="failed", timings=result.get("timings", {}), error=result.get("error"))
+
+    context.logger.info("Report job finished", {
+        "job_id": job_id,
+        "status": job["status"]
+    })
@@ -0,0 +1,452 @@
+import math
+import re
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+ANY = 'any'
+MALE = 'male'
+FEMALE = 'female'
+
+# Which side of the normal range an abnormal band lies on
+LOW = 'low'
+HIGH = 'high'
+
+SEX_ALIASES = {'male': MALE, 'm': MALE, 'female': FEMALE, 'f': FEMALE}
+# Row of each sex in an analyte's limits table, for array lookups
+SEX_CODES = {MALE: 0, FEMALE: 1, ANY: 2}
+
+# Units are matched ignoring case, spaces, micro-sign variants and exponent
+# markers, so 'µmol/L', 'umol/l' and 'x10^9/L' / '10*9/L' are one spelling each
+UNIT_SPELLING = str.maketrans({'µ': 'u', 'μ': 'u', '³': '3', '×': 'x', ' ': None, '^': None, '*': None})
+
+# A value sent with its unit, e.g. '5.4 mmol/L'
+VALUE_WITH_UNIT = re.compile(r'([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*(\S.*)')
+
+
+def unit_key(unit: str) -> str:
+    return unit.translate(UNIT_SPELLING).casefold().removeprefix('x')
+
+
+class Band:
+    """One interval of an analyte's scale and what a value inside it means.
+
+    severity orders bands for reporting: 0 normal, 1 borderline, 2 abnormal,
+    3 critical. direction is LOW or HIGH for abnormal bands, None for normal.
+    """
+
+    __slots__ = ('status', 'severity', 'label', 'note', 'risk', 'direction')
+
+    def __init__(self, status, severity=0, label=None, note=None, risk=None):
+        self.status = status
+        self.severity = severity
+        self.label = label
+        self.note = note
+        self.risk = risk
+        self.direction = None if not severity else LOW if status == 'Low' else HIGH
+
+    @property
+    def abnormal(self):
+        return self.severity > 0
+
+
+NORMAL = Band('Normal')
+
+
+class Analyte:
+    """Reporting details, bands and sex/age-specific band edges of one analyte.
+
+    ``limits`` maps (sex, min_age, max_age) to the edges between consecutive
+    bands, written as the comparison that sends a value past the edge:
+    '<13' puts values below 13 in the band before it, '>17' puts values above
+    17 in the band after it ('<=' and '>=' likewise). max_age is exclusive
+    and None means open-ended; sex ANY applies where no sex-specific entry
+    covers the age. Edges compile to sorted float keys, so a value's band is
+    one bisect; classify_array does the same for whole columns with
+    np.searchsorted.
+
+    ``units`` maps other units the value may arrive in to the factor that
+    converts them to ``unit``, or to (factor, offset) for an affine change
+    of scale. Conversion 0 is always ``unit`` itself.
+    """
+
+    def __init__(self, key, test, unit, bands, limits, aliases=(), units=None):
+        self.key = key
+        self.test = test
+        self.unit = unit
+        self.bands = tuple(bands)
+        self.aliases = tuple(aliases)
+        self.units = {unit: (1.0, 0.0)}
+        for name, factor in (units or {}).items():
+            self.units[name] = (float(factor), 0.0) if isinstance(factor, (int, float)) else tuple(factor)
+        self.conversions = list(dict.fromkeys(self.units.values()))
+        self._scales_array = np.array([scale for scale, _ in self.conversions])
+        self._offsets_array = np.array([offset for _, offset in self.conversions])
+        self.normal = next(i for i, band in enumerate(self.bands) if not band.abnormal)
+        compiled = {profile: self._compile(edges) for profile, edges in limits.items()}
+        # Every distinct set of limits, and for each sex and age segment the index of the one in force
+        self.profiles = list(dict.fromkeys(compiled.values()))
+        self.starts, table = self._segments(compiled)
+        self.table = [[-1 if limits is None else self.profiles.index(limits) for limits in table[sex]]
+                      for sex in SEX_CODES]
+        self._starts_array = np.array(self.starts, dtype=np.float64)
+        self._table_array = np.array(self.table, dtype=np.intp)
+        self._keys_arrays = [np.array(keys, dtype=np.float64) for keys, _ in self.profiles]
+
+    def _compile(self, edges):
+        if len(edges) != len(self.bands) - 1:
+            raise ValueError(f'{self.key}: {len(self.bands)} bands need {len(self.bands) - 1} edges')
+        keys = []
+        bounds = []
+        for edge in edges:
+            op = edge.rstrip('0123456789.')
+            value = float(edge[len(op):])
+            if op in ('<', '>='):
+                keys.append(value)
+            elif op in ('>', '<='):
+                keys.append(math.nextafter(value, math.inf))
+            else:
+                raise ValueError(f'{self.key}: bad edge {edge!r}')
+            # Whether the value itself belongs to the band above the edge
+            bounds.append((value, op in ('<', '>=')))
+        if keys != sorted(keys):
+            raise ValueError(f'{self.key}: edges must increase')
+        low = bounds[self.normal - 1] if self.normal > 0 else None
+        high = bounds[self.normal] if self.normal < len(bounds) else None
+        if low is not None and high is not None:
+            normal_range = f'{low[0]:g}-{high[0]:g} {self.unit}'
+        elif high is not None:
+            normal_range = f"{'<' if high[1] else '≤'}{high[0]:g} {self.unit}"
+        else:
+            normal_range = f"{'≥' if low[1] else '>'}{low[0]:g} {self.unit}"
+        return tuple(keys), normal_range
+
+    @staticmethod
+    def _segments(compiled):
+        """Age starts and, per sex, the limits in force from each (sex-specific over ANY)"""
+        starts = sorted({age for (_, low, high) in compiled for age in (low, high) if age is not None})
+        table = {}
+        for sex in SEX_CODES:
+            chosen = []
+            for start in starts:
+                match = None
+                for wanted in (sex, ANY):
+                    for (profile_sex, low, high), limits in compiled.items():
+                        if profile_sex == wanted and low <= start and (high is None or start < high):
+                            match = limits
+                            break
+                    if match is not None:
+                        break
+                chosen.append(match)
+            table[sex] = chosen
+        return starts, table
+
+    def limits(self, sex=ANY, age=None):
+        """(keys, normalRange) for a patient; unknown ages get adult limits"""
+        index = len(self.starts) - 1 if age is None else max(0, bisect_right(self.starts, age) - 1)
+        profile = self.table[SEX_CODES[sex]][index]
+        return None if profile < 0 else self.profiles[profile]
+
+    def classify(self, value, sex=ANY, age=None):
+        limits = self.limits(sex, age)
+        if limits is None:
+            return None
+        return self.bands[bisect_right(limits[0], value)]
+
+    def classify_array(self, values, sex_codes, ages):
+        """Band indices for a column of values, -1 where unmeasured (NaN or <= 0).
+
+        sex_codes holds SEX_CODES values and ages may be NaN for unknown. Also
+        returns the index into self.profiles used for each row, -1 if none.
+        """
+        segments = np.searchsorted(self._starts_array, ages, side='right') - 1
+        segments = np.where(np.isnan(ages), len(self.starts) - 1, np.maximum(segments, 0))
+        profiles = self._table_array[sex_codes, segments]
+        bands = np.full(len(values), -1, dtype=np.intp)
+        measured = (values > 0) & (profiles >= 0)
+        for profile in np.unique(profiles[measured]):
+            rows = measured & (profiles == profile)
+            bands[rows] = np.searchsorted(self._keys_arrays[profile], values[rows], side='right')
+        return bands, profiles
+
+    def convert_array(self, values, conversions):
+        """A column of values in this analyte's unit, given each row's conversion index"""
+        converted = values * self._scales_array[conversions] + self._offsets_array[conversions]
+        # Rounded like canonical_panel's, so both paths classify identical values
+        return np.where(conversions == 0, values, np.round(converted, 4))
+
+
+class Reading:
+    """A classified lab value.
+
+    Abnormal readings double as the structured abnormality records of
+    disease prediction: analyte, value and band (status, direction,
+    severity), with sentences rendered by summary() and finding() only
+    when a response is built.
+    """
+
+    __slots__ = ('analyte', 'value', 'band', 'normal_range')
+
+    def __init__(self, analyte, value, band, normal_range):
+        self.analyte = analyte
+        self.value = value
+        self.band = band
+        self.normal_range = normal_range
+
+    @property
+    def flag(self):
+        note = self.band.note or ''
+        return note[:1].upper() + note[1:]
+
+    def summary(self):
+        """Short sentence for the lab analysis, e.g. 'Low Hemoglobin - possible anemia'"""
+        return f'{self.band.label} - {self.band.note}'
+
+    def finding(self):
+        """Sentence with the value, e.g. 'Low Hemoglobin (11.2 g/dL, possible anemia)'"""
+        return f'{self.band.label} ({self.value:g} {self.analyte.unit}, {self.band.note})'
+
+
+LOW_HEMOGLOBIN = Band('Low', 2, 'Low Hemoglobin', 'possible anemia', 'Anemia Risk')
+HIGH_HEMOGLOBIN = Band('High', 2, 'High Hemoglobin', 'polycythemia concern')
+
+# SI and other common units of the shared analytes, as factors to the table's unit
+CELL_COUNT_UNITS = {'10^3/µL': 1, 'K/µL': 1, '10^9/L': 1, '/µL': 0.001, 'cells/µL': 0.001}
+CHOLESTEROL_UNITS = {'mmol/L': 38.67}
+PRESSURE_UNITS = {'kPa': 7.50062}
+ENZYME_UNITS = {'IU/L': 1, 'µkat/L': 60}
+
+# Declared once; both the lab analysis and disease prediction classify with these
+ANALYTES = [
+    Analyte('hemoglobin', 'Hemoglobin', 'g/dL',
+            [LOW_HEMOGLOBIN, NORMAL, HIGH_HEMOGLOBIN],
+            {
+                # WHO anemia thresholds for children; adult limits differ by sex
+                (ANY, 0, 5): ('<11', '>15.5'),
+                (ANY, 5, 12): ('<11.5', '>15.5'),
+                (ANY, 12, 15): ('<12', '>16'),
+                (MALE, 15, None): ('<13', '>17'),
+                (FEMALE, 15, None): ('<12', '>16'),
+                (ANY, 15, None): ('<12', '>17')
+            },
+            aliases=('hb',),
+            units={'g/L': 0.1, 'mmol/L': 1.6114}),
+    Analyte('wbc', 'White Blood Cell Count', 'x10³/μL',
+            [Band('Low', 2, 'Low WBC', 'possible immune suppression'),
+             NORMAL,
+             Band('High', 2, 'High WBC', 'possible infection'),
+             Band('Very High', 3, 'Very High WBC', 'CRITICAL')],
+            {(ANY, 0, None): ('<4', '>11', '>20')},
+            units=CELL_COUNT_UNITS),
+    Analyte('platelet', 'Platelet Count', 'x10³/μL',
+            [Band('Low', 2, 'Low Platelet Count', 'bleeding risk'),
+             NORMAL,
+             Band('High', 2, 'High Platelet Count', 'thrombocytosis')],
+            {(ANY, 0, None): ('<150', '>400')},
+            units=CELL_COUNT_UNITS),
+    Analyte('fastingBloodSugar', 'Fasting Blood Sugar', 'mg/dL',
+            [Band('Low', 2, 'Low Blood Sugar', 'hypoglycemia risk', 'Hypoglycemia Risk'),
+             NORMAL,
+             Band('Borderline', 1, 'Elevated Fasting Blood Sugar', 'pre-diabetic range', 'Pre-Diabetes Risk'),
+             Band('High', 2, 'High Fasting Blood Sugar', 'diabetic range', 'Diabetes Risk')],
+            {(ANY, 0, None): ('<70', '>=100', '>=126')},
+            aliases=('bloodSugar',),
+            units={'mmol/L': 18.016}),
+    Analyte('hba1c', 'HbA1c', '%',
+            [NORMAL,
+             Band('Borderline', 1, 'Elevated HbA1c', 'pre-diabetic range', 'Pre-Diabetes Risk'),
+             Band('High', 2, 'High HbA1c', 'diabetic range', 'Diabetes Risk')],
+            {(ANY, 0, None): ('>=5.7', '>=6.5')},
+            # IFCC mmol/mol to NGSP %
+            units={'mmol/mol': (0.09148, 2.152)}),
+    Analyte('totalCholesterol', 'Total Cholesterol', 'mg/dL',
+            [NORMAL,
+             Band('Borderline', 1, 'Borderline High Cholesterol', 'borderline high', 'Cardiovascular Risk'),
+             Band('High', 2, 'High Total Cholesterol', 'cardiovascular risk', 'High Cardiovascular Risk')],
+            {(ANY, 0, None): ('>=200', '>=240')},
+            aliases=('cholesterol',),
+            units=CHOLESTEROL_UNITS),
+    Analyte('ldl', 'LDL Cholesterol', 'mg/dL',
+            [NORMAL,
+             Band('Borderline', 1, 'Borderline High LDL', 'borderline high'),
+             Band('High', 2, 'High LDL', 'cardiovascular risk', 'Cardiovascular Risk')],
+            {(ANY, 0, None): ('>=130', '>=160')},
+            units=CHOLESTEROL_UNITS),
+    Analyte('hdl', 'HDL Cholesterol', 'mg/dL',
+            [Band('Low', 2, 'Low HDL', 'cardiovascular risk', 'Cardiovascular Risk'), NORMAL],
+            {(MALE, 0, None): ('<40',), (FEMALE, 0, None): ('<50',), (ANY, 0, None): ('<40',)},
+            units=CHOLESTEROL_UNITS),
+    Analyte('triglycerides', 'Triglycerides', 'mg/dL',
+            [NORMAL,
+             Band('Borderline', 1, 'Borderline High Triglycerides', 'borderline high'),
+             Band('High', 2, 'High Triglycerides', 'cardiovascular risk', 'Cardiovascular Risk')],
+            {(ANY, 0, None): ('>=150', '>=200')},
+            units={'mmol/L': 88.57}),
+    Analyte('bpSystolic', 'Systolic Blood Pressure', 'mmHg',
+            [NORMAL,
+             Band('Elevated', 1, 'Elevated Systolic BP', 'hypertension risk', 'Hypertension Risk'),
+             Band('High', 2, 'High Systolic BP', 'hypertension', 'Hypertension')],
+            {(ANY, 0, None): ('>=120', '>=130')},
+            units=PRESSURE_UNITS),
+    Analyte('bpDiastolic', 'Diastolic Blood Pressure', 'mmHg',
+            [NORMAL, Band('High', 2, 'High Diastolic BP', 'hypertension', 'Hypertension')],
+            {(ANY, 0, None): ('>=80',)},
+            units=PRESSURE_UNITS),
+    Analyte('crp', 'C-Reactive Protein', 'mg/L',
+            [NORMAL,
+             Band('High', 2, 'Elevated CRP', 'inflammation present'),
+             Band('Very High', 3, 'Very High CRP', 'severe inflammation')],
+            {(ANY, 0, None): ('>3', '>10')},
+            units={'mg/dL': 10}),
+    Analyte('esr', 'Erythrocyte Sedimentation Rate', 'mm/hr',
+            [NORMAL, Band('High', 2, 'Elevated ESR', 'inflammation/infection')],
+            {
+                # Westergren upper limits rise with age and are higher for women
+                (MALE, 0, 50): ('>15',),
+                (MALE, 50, None): ('>20',),
+                (FEMALE, 0, 50): ('>20',),
+                (FEMALE, 50, None): ('>30',),
+                (ANY, 0, None): ('>30',)
+            },
+            units={'mm/h': 1}),
+    Analyte('creatinine', 'Serum Creatinine', 'mg/dL',
+            [NORMAL, Band('High', 2, 'High Creatinine', 'possible kidney dysfunction', 'Kidney Function Risk')],
+            {(MALE, 0, None): ('>1.3',), (FEMALE, 0, None): ('>1.1',), (ANY, 0, None): ('>1.2',)},
+            units={'µmol/L': 1 / 88.42, 'mmol/L': 1000 / 88.42}),
+    Analyte('urea', 'Urea/BUN', 'mg/dL',
+            [NORMAL, Band('High', 2, 'Elevated Urea/BUN', 'kidney function concern', 'Kidney Function Risk')],
+            {(ANY, 0, None): ('>20',)},
+            aliases=('bun',),
+            # Urea in mmol/L to blood urea nitrogen in mg/dL
+            units={'mmol/L': 2.801}),
+    Analyte('alt', 'ALT', 'U/L',
+            [NORMAL, Band('High', 2, 'Elevated ALT', 'possible liver issue')],
+            {(ANY, 0, None): ('>40',)},
+            units=ENZYME_UNITS),
+    Analyte('ast', 'AST', 'U/L',
+            [NORMAL, Band('High', 2, 'Elevated AST', 'possible liver issue')],
+            {(ANY, 0, None): ('>40',)},
+            units=ENZYME_UNITS)
+]
+
+# Every accepted key -> (analyte, preference); a canonical key beats its aliases
+ANALYTE_KEYS = {}
+for _analyte in ANALYTES:
+    for _rank, _key in enumerate((_analyte.key,) + _analyte.aliases):
+        ANALYTE_KEYS[_key] = (_analyte, _rank)
+
+ANALYTE_ORDER = {analyte.key: index for index, analyte in enumerate(ANALYTES)}
+
+# (accepted key, unit spelling) -> (analyte, preference, conversion index, factor, offset);
+# '' stands for a value sent without a unit, which is taken to be in the table's unit
+LAB_FIELDS = {}
+for _key, (_analyte, _rank) in ANALYTE_KEYS.items():
+    for _unit, _conversion in [('', (1.0, 0.0))] + list(_analyte.units.items()):
+        LAB_FIELDS[(_key, unit_key(_unit))] = (
+            _analyte, _rank, _analyte.conversions.index(_conversion)) + _conversion
+
+
+def patient_profile(patient_info: Dict[str, Any]) -> Tuple[str, Optional[float]]:
+    """(sex, age) used to pick limits; unknown values fall back to ANY / adult"""
+    sex = SEX_ALIASES.get(str(patient_info.get('gender') or '').strip().casefold(), ANY)
+    try:
+        age = float(patient_info.get('age'))
+    except (TypeError, ValueError):
+        age = None
+    return sex, age
+
+
+def lab_field(key: str, value: Any, unit: Optional[str] = None) -> Optional[Tuple[Any, ...]]:
+    """LAB_FIELDS entry and raw number of one lab field: (entry, number).
+
+    The value may be a number, a numeric string, or a string with its unit
+    ('5.4 mmol/L'), which takes precedence over ``unit``. Returns None for a
+    key that is not in the table; raises ValueError for a value that is not
+    a number or a unit the analyte does not list. Conversion is left to the
+    caller (number * factor + offset), so batch callers can apply it per
+    column.
+    """
+    entry = LAB_FIELDS.get((key, ''))
+    if entry is None:
+        return None
+    if isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            match = VALUE_WITH_UNIT.fullmatch(value.strip())
+            if match is None:
+                raise ValueError(f'{key}: {value!r} is not a number') from None
+            number, unit = float(match[1]), match[2]
+    else:
+        number = float(value)
+    if unit:
+        entry = LAB_FIELDS.get((key, unit_key(unit)))
+        if entry is None:
+            analyte = LAB_FIELDS[(key, '')][0]
+            raise ValueError(f"{key}: unknown unit {unit!r} (expected one of: {', '.join(analyte.units)})")
+    return entry, number
+
+
+def canonical_panel(lab_values: Dict[str, Any], units: Optional[Dict[str, str]] = None,
+                    strict: bool = True) -> Dict[str, float]:
+    """A panel keyed by canonical analyte key, with values in the table's units.
+
+    ``units`` optionally maps a field to the unit its (plain number) value is
+    in. Unknown keys and unmeasured (empty or non-positive) values are
+    dropped, and a canonical key beats its aliases. Values that do not parse
+    raise ValueError, or are skipped when ``strict`` is false.
+    """
+    units = units or {}
+    panel = {}
+    ranks = {}
+    for key, value in lab_values.items():
+        if value is None or value == '':
+            continue
+        try:
+            field = lab_field(key, value, units.get(key))
+        except (TypeError, ValueError):
+            if strict:
+                raise
+            continue
+        if field is None:
+            continue
+        (analyte, rank, conversion, factor, offset), number = field
+        if number <= 0 or ranks.get(analyte.key, rank + 1) <= rank:
+            continue
+        panel[analyte.key] = round(number * factor + offset, 4) if conversion else number
+        ranks[analyte.key] = rank
+    return panel
+
+
+def classify(key: str, value: float, sex: str = ANY, age: Optional[float] = None) -> Optional[Band]:
+    """Band of one value, looked up by canonical key or alias"""
+    analyte, _ = ANALYTE_KEYS[key]
+    return analyte.classify(value, sex, age)
+
+
+def classify_panel(labs: Dict[str, float], sex: str = ANY, age: Optional[float] = None) -> List[Reading]:
+    """Classify every known analyte in a panel of float values, in table order.
+
+    Unknown keys and non-positive values (unmeasured fields) are skipped;
+    when an analyte arrives under several keys the canonical one wins.
+    """
+    chosen = {}
+    for key, value in labs.items():
+        entry = ANALYTE_KEYS.get(key)
+        if entry is None or value <= 0:
+            continue
+        analyte, rank = entry
+        current = chosen.get(analyte.key)
+        if current is None or rank < current[1]:
+            chosen[analyte.key] = (value, rank, analyte)
+
+    readings = []
+    for key in sorted(chosen, key=ANALYTE_ORDER.__getitem__):
+        value, _, analyte = chosen[key]
+        limits = analyte.limits(sex, age)
+        if limits is None:
+            continue
+        keys, normal_range = limits
+        readings.append(Reading(analyte, value, analyte.bands[bisect_right(keys, value)], normal_range))
+    return readings
@@ -0,0 +1,40 @@
+# Motia API configuration
+config = {
+    "name": "ReportJobStatus",
+    "type": "api",
+    "path": "/api/report-jobs/:jobId",
+    "method": "GET",
+    "description": "Poll the status, stage progress and result of a queued report job",
+    "emits": [],
+    "flows": ["report-job-flow"],
+    "responseSchema": {
+        200: {
+            "type": "object",
+            "properties": {
+                "success": {"type": "boolean"},
+                "job": {"type": "object"}
+            }
+        }
+    }
+}
+
+async def handler(req, context):
+    """Return the job record kept in state by ProcessReportJob"""
+    try:
+        path_params = req.get('pathParams', {}) if isinstance(req, dict) else getattr(req, 'pathParams', {})
+        job_id = path_params.get('jobId')
+
+        job = await context.state.get("report-jobs", job_id) if job_id else None
+        if job is None:
+            return {
+                "status": 404,
+                "body": {'success': False, 'error': f'Unknown job: {job_id}'}
+            }
+
+        return {"status": 200, "body": {'success': True, 'job': job}}
+    except Exception as e:
+        context.logger.error(f"Report job status error: {str(e)}")
+        return {
+            "status": 500,
+            "body": {"success": False, "error": str(e)}
+        }
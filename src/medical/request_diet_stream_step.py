@@ -0,0 +1,75 @@
+import uuid
+
+# Motia API configuration
+config = {
+    "name": "RequestDietStream",
+    "type": "api",
+    "path": "/api/generate-diet/stream",
+    "method": "POST",
+    "description": "Start streamed diet generation; sections are pushed to the dietSections stream as they complete",
+    "emits": ["diet-stream-requested"],
+    "flows": ["diet-stream-flow"],
+    "responseSchema": {
+        202: {
+            "type": "object",
+            "properties": {
+                "success": {"type": "boolean"},
+                "streamId": {"type": "string"},
+                "stream": {"type": "string"}
+            }
+        }
+    }
+}
+
+async def handler(req, context):
+    """Queue streamed diet generation and tell the client which stream group to subscribe to"""
+    try:
+        # Motia passes request as dict with 'body' key containing actual data
+        if isinstance(req, dict) and 'body' in req:
+            body_content = req['body']
+            # If body is a JSON string, parse it
+            if isinstance(body_content, str):
+                import json
+                data = json.loads(body_content)
+            else:
+                data = body_content
+        elif hasattr(req, 'body'):
+            data = req.body
+        elif isinstance(req, dict):
+            data = req
+        else:
+            data = req
+
+        if not isinstance(data, dict):
+            return {
+                "status": 400,
+                "body": {'success': False, 'error': 'Invalid request format'}
+            }
+
+        # Clients may pick the ID so they can subscribe before the first section lands
+        stream_id = str(data.get('streamId') or uuid.uuid4())
+
+        await context.emit({
+            "topic": "diet-stream-requested",
+            "data": {
+                "streamId": stream_id,
+                "patientInfo": data.get('patientInfo', {}),
+                "riskIndicators": data.get('riskIndicators', []),
+                "abnormalities": data.get('abnormalities', [])
+            }
+        })
+
+        return {
+            "status": 202,
+            "body": {
+                'success': True,
+                'streamId': stream_id,
+                'stream': 'dietSections'
+            }
+        }
+    except Exception as e:
+        context.logger.error(f"Diet stream request error: {str(e)}")
+        return {
+            "status": 500,
+            "body": {"success": False, "error": str(e)}
+        }
@@ -0,0 +1,155 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class SqliteBacking:
+    """Persistent second-level store kept in a local SQLite file"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)'
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                (key, json.dumps(value), time.time() + ttl)
+            )
+            self._conn.commit()
+
+
+class RedisBacking:
+    """Shared second-level store so every worker sees the same entries"""
+
+    def __init__(self, url, prefix):
+        if redis is None:
+            raise RuntimeError('redis package is not installed; install it to use the redis cache backend')
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.setex(self._prefix + key, int(ttl), json.dumps(value))
+
+
+class ResultCache:
+    """Size-bounded in-memory LRU with TTL eviction and an optional persistent backing.
+
+    Values must be JSON-serializable when a backing store is used.
+    """
+
+    def __init__(self, name, max_size=1024, ttl=3600, backing=None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backing = backing
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.backing_hits = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.evictions += 1
+
+        if self.backing is not None:
+            value = self.backing.get(key)
+            if value is not None:
+                with self._lock:
+                    self.backing_hits += 1
+                    self.hits += 1
+                self._store(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self._store(key, value)
+        if self.backing is not None:
+            self.backing.set(key, value, self.ttl)
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._entries),
+                'maxSize': self.max_size,
+                'ttlSeconds': self.ttl,
+                'backing': type(self.backing).__name__ if self.backing is not None else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'backingHits': self.backing_hits,
+                'evictions': self.evictions,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def cache_from_env(name, prefix, default_size=1024, default_ttl=3600):
+    """Build a ResultCache configured by <PREFIX>_CACHE_* environment variables.
+
+    <PREFIX>_CACHE_BACKEND is one of memory (default), disk or redis.
+    """
+    max_size = int(os.environ.get(f'{prefix}_CACHE_SIZE', default_size))
+    ttl = float(os.environ.get(f'{prefix}_CACHE_TTL', default_ttl))
+    backend = os.environ.get(f'{prefix}_CACHE_BACKEND', 'memory').lower()
+
+    backing = None
+    if backend == 'disk':
+        path = os.environ.get(f'{prefix}_CACHE_PATH', os.path.join('.cache', f'{name}.sqlite3'))
+        backing = SqliteBacking(path)
+    elif backend == 'redis':
+        url = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+        backing = RedisBacking(url, f'medidraft:{name}:')
+
+    return ResultCache(name, max_size=max_size, ttl=ttl, backing=backing)
@@ -0,0 +1,51 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution.
+
+    While a call for a key is in flight, later callers await the same task
+    instead of starting duplicate work. Exceptions are shared the same way.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+
+    async def do(self, key, factory):
+        """Return the result of factory() for key, sharing any in-flight call.
+
+        The work runs in its own task and every caller, including the one
+        that started it, awaits it through a shield: a cancelled caller
+        stops waiting, but the flight carries on for the others.
+        """
+        self.calls += 1
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.collapsed += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda done: self._land(key, done))
+        return await asyncio.shield(task)
+
+    def _land(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved so a flight nobody awaits any more does not log a warning
+            task.exception()
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'inFlight': len(self._inflight),
+            'calls': self.calls,
+            'executions': self.executions,
+            'collapsed': self.collapsed
+        }
@@ -0,0 +1,57 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from generate_diet_step import stream_diet_recommendation
+
+config = {
+    "name": "StreamDietRecommendation",
+    "type": "event",
+    "description": "Streams Gemini diet output section by section into the dietSections stream",
+    "subscribes": ["diet-stream-requested"],
+    "emits": [],
+    "flows": ["diet-stream-flow"],
+    "input": {
+        "type": "object",
+        "properties": {
+            "streamId": {"type": "string"},
+            "patientInfo": {"type": "object"},
+            "riskIndicators": {"type": "array", "items": {"type": "string"}},
+            "abnormalities": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["streamId"]
+    }
+}
+
+async def handler(input_data, context):
+    stream_id = input_data.get("streamId")
+    order = 0
+
+    async def push(section, content):
+        nonlocal order
+        order += 1
+        await context.streams.dietSections.set(stream_id, section, {
+            "id": section,
+            "section": section,
+            "content": content,
+            "order": order,
+            "updatedAt": datetime.now(timezone.utc).isoformat()
+        })
+
+    await push("status", "streaming")
+
+    try:
+        outcome = await stream_diet_recommendation(input_data, push)
+    except Exception as e:
+        context.logger.error(f"Diet stream failed: {str(e)}", {"stream_id": stream_id})
+        await push("status", "error")
+        return
+
+    await push("status", outcome)
+
+    context.logger.info("Diet stream finished", {
+        "stream_id": stream_id,
+        "outcome": outcome
+    })
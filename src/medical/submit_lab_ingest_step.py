@@ -0,0 +1,123 @@
+import sys
+import json
+import uuid
+import asyncio
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from image_upload import UploadTooLarge, header
+from lab_ingest import expire_results, ingest_format, results_path, source_path, spool_upload, upload_path
+
+# Motia API configuration
+config = {
+    "name": "SubmitLabIngest",
+    "type": "api",
+    "path": "/api/lab-ingest",
+    "method": "POST",
+    "description": "Queue a CSV or NDJSON lab-result file for row-by-row analysis",
+    "emits": ["lab-ingest-submitted"],
+    "flows": ["lab-ingest-flow"],
+    "responseSchema": {
+        202: {
+            "type": "object",
+            "properties": {
+                "success": {"type": "boolean"},
+                "jobId": {"type": "string"},
+                "status": {"type": "string"},
+                "statusUrl": {"type": "string"},
+                "resultsUrl": {"type": "string"}
+            }
+        }
+    }
+}
+
+async def handler(req, context):
+    """Spool or locate the file and hand it to the ProcessLabIngest event step
+
+    The file is either the raw request body (``Content-Type: text/csv`` or
+    ``application/x-ndjson``) or named by a JSON body ``{"path": ...}``
+    relative to LAB_INGEST_SOURCE_DIR; ``format`` (csv or ndjson) overrides
+    the type taken from the Content-Type or file extension. An uploaded body
+    has already been read into memory by the framework before it is spooled,
+    so large exports should be dropped in LAB_INGEST_SOURCE_DIR and named by
+    path. Submitting also deletes results older than LAB_INGEST_RESULTS_TTL.
+    """
+    try:
+        body = req.get('body') if isinstance(req, dict) and 'body' in req else getattr(req, 'body', req)
+        content_type = header(req, 'content-type') or ''
+        query = (req.get('queryParams') if isinstance(req, dict) else None) or {}
+        fields = {key: value[0] if isinstance(value, list) else value for key, value in query.items()}
+
+        job_id = f"INGEST-{uuid.uuid4().hex[:12]}"
+
+        try:
+            if isinstance(body, dict) or content_type.startswith('application/json'):
+                data = json.loads(body) if isinstance(body, (str, bytes)) else body
+                if not isinstance(data, dict) or not data.get('path'):
+                    raise ValueError('JSON requests must name a file with path')
+                fmt = ingest_format(name=data['path'], requested=data.get('format') or fields.get('format'))
+                source = source_path(str(data['path']))
+                name = str(data['path'])
+                upload = False
+            else:
+                if not body:
+                    raise ValueError('Send the file as the request body, or {"path": ...} as JSON')
+                fmt = ingest_format(content_type=content_type, requested=fields.get('format'))
+                source = upload_path(job_id, fmt)
+                await asyncio.to_thread(spool_upload, body, source)
+                name = None
+                upload = True
+        except FileNotFoundError as e:
+            return {"status": 404, "body": {'success': False, 'error': str(e)}}
+        except UploadTooLarge as e:
+            return {"status": 413, "body": {'success': False, 'error': str(e)}}
+        except ValueError as e:
+            return {"status": 400, "body": {'success': False, 'error': str(e)}}
+
+        expired = await asyncio.to_thread(expire_results)
+        if expired:
+            context.logger.info("Expired lab ingest results deleted", {"files": expired})
+
+        submitted_at = datetime.now(timezone.utc).isoformat()
+
+        await context.state.set("lab-ingest-inputs", job_id, {
+            "source": source,
+            "format": fmt,
+            "output": results_path(job_id),
+            "upload": upload
+        })
+        await context.state.set("lab-ingest-jobs", job_id, {
+            "jobId": job_id,
+            "status": "queued",
+            "format": fmt,
+            "file": name,
+            "submittedAt": submitted_at,
+            "updatedAt": submitted_at,
+            "progress": {}
+        })
+
+        await context.emit({
+            "topic": "lab-ingest-submitted",
+            "data": {"jobId": job_id}
+        })
+
+        context.logger.info("Lab ingest queued", {"job_id": job_id, "format": fmt})
+
+        return {
+            "status": 202,
+            "body": {
+                'success': True,
+                'jobId': job_id,
+                'status': 'queued',
+                'statusUrl': f'/api/lab-ingest/{job_id}',
+                'resultsUrl': f'/api/lab-ingest/{job_id}/results'
+            }
+        }
+    except Exception as e:
+        context.logger.error(f"Lab ingest submission error: {str(e)}")
+        return {
+            "status": 500,
+            "body": {"success": False, "error": str(e)}
+        }
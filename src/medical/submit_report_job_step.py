@@ -0,0 +1,86 @@
+import uuid
+from datetime import datetime, timezone
+
+# Motia API configuration
+config = {
+    "name": "SubmitReportJob",
+    "type": "api",
+    "path": "/api/report-jobs",
+    "method": "POST",
+    "description": "Queue a full report generation job and return its job ID immediately",
+    "emits": ["report-job-submitted"],
+    "flows": ["report-job-flow"],
+    "responseSchema": {
+        202: {
+            "type": "object",
+            "properties": {
+                "success": {"type": "boolean"},
+                "jobId": {"type": "string"},
+                "status": {"type": "string"},
+                "statusUrl": {"type": "string"}
+            }
+        }
+    }
+}
+
+async def handler(req, context):
+    """Store the job input in state and hand it to the ProcessReportJob event step"""
+    try:
+        # Motia passes request as dict with 'body' key containing actual data
+        if isinstance(req, dict) and 'body' in req:
+            body_content = req['body']
+            # If body is a JSON string, parse it
+            if isinstance(body_content, str):
+                import json
+                data = json.loads(body_content)
+            else:
+                data = body_content
+        elif hasattr(req, 'body'):
+            data = req.body
+        elif isinstance(req, dict):
+            data = req
+        else:
+            data = req
+
+        if not isinstance(data, dict):
+            return {
+                "status": 400,
+                "body": {'success': False, 'error': 'Invalid request format'}
+            }
+
+        job_id = f"JOB-{uuid.uuid4().hex[:12]}"
+        submitted_at = datetime.now(timezone.utc).isoformat()
+
+        # The payload (possibly a large base64 image) lives in state; only the job ID goes on the queue
+        await context.state.set("report-job-inputs", job_id, data)
+        await context.state.set("report-jobs", job_id, {
+            "jobId": job_id,
+            "status": "queued",
+            "submittedAt": submitted_at,
+            "updatedAt": submitted_at,
+            "stages": {},
+            "timings": {}
+        })
+
+        await context.emit({
+            "topic": "report-job-submitted",
+            "data": {"jobId": job_id}
+        })
+
+        context.logger.info("Report job queued", {"job_id": job_id})
+
+        return {
+            "status": 202,
+            "body": {
+                'success': True,
+                'jobId': job_id,
+                'status': 'queued',
+                'statusUrl': f'/api/report-jobs/{job_id}'
+            }
+        }
+    except Exception as e:
+        context.logger.error(f"Report job submission error: {str(e)}")
+        return {
+            "status": 500,
+            "body": {"success": False, "error": str(e)}
+        }
@@ -0,0 +1,152 @@
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from image_analysis import THUMBNAIL_SIZES, THUMBNAIL_FORMAT
+
+# Content hashes are hex sha256 digests; anything else never names a directory
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+
+class ThumbnailStore:
+    """Thumbnail pyramids on disk, one directory per content hash.
+
+    Each pyramid is written once (to a temporary directory that is renamed
+    into place, so readers never see half of one) and never changes, which
+    makes its files safe to serve with a strong ETag. Whole pyramids are
+    evicted least recently used once their total size exceeds ``max_bytes``.
+    The index is rebuilt from the directory at start-up, oldest first.
+    Stats are per process, like the result caches'.
+    """
+
+    def __init__(self, root, max_bytes, sizes=THUMBNAIL_SIZES, fmt=THUMBNAIL_FORMAT):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.sizes = tuple(sizes)
+        self.format = fmt
+        self.extension = 'jpg' if fmt == 'jpeg' else fmt
+        self.content_type = CONTENT_TYPES.get(fmt, f'image/{fmt}')
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        found = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith('.staging-'):
+                    # Left behind by a process that died mid-write
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                elif entry.is_dir() and DIGEST_PATTERN.match(entry.name):
+                    files = [f for f in os.scandir(entry.path) if f.is_file()]
+                    if not files:
+                        continue
+                    found.append((max(f.stat().st_mtime for f in files), entry.name,
+                                  sum(f.stat().st_size for f in files)))
+        for _, digest, size in sorted(found):
+            self._index[digest] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _directory(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _path(self, digest, size):
+        return os.path.join(self._directory(digest), f'{size}.{self.extension}')
+
+    def has(self, digest):
+        with self._lock:
+            return digest in self._index
+
+    def put(self, digest, levels):
+        """Store a pyramid (size -> encoded bytes) unless one is already there"""
+        if not DIGEST_PATTERN.match(digest) or not levels:
+            return
+        with self._lock:
+            if digest in self._index:
+                return
+        directory = self._directory(digest)
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=os.path.dirname(directory))
+        try:
+            for size, data in levels.items():
+                with open(os.path.join(staging, f'{size}.{self.extension}'), 'wb') as f:
+                    f.write(data)
+            os.rename(staging, directory)
+        except OSError:
+            # Another process renamed the same pyramid into place first
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(directory):
+                raise
+        total = sum(len(data) for data in levels.values())
+        with self._lock:
+            if digest not in self._index:
+                self._index[digest] = total
+                self.total_bytes += total
+                self.writes += 1
+            self._evict()
+
+    def get(self, digest, size):
+        """Encoded bytes of one level, or None if the pyramid is not stored"""
+        if not DIGEST_PATTERN.match(digest):
+            return None
+        with self._lock:
+            if digest not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(digest)
+        try:
+            with open(self._path(digest, size), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def etag(self, digest, size):
+        return f'"{digest}-{size}.{self.extension}"'
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._index:
+            digest, size = self._index.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            shutil.rmtree(self._directory(digest), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pyramids': len(self._index),
+                'bytes': self.total_bytes,
+                'maxBytes': self.max_bytes,
+                'sizes': list(self.sizes),
+                'format': self.format,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'evictions': self.evictions
+            }
+
+
+def thumbnail_store_from_env():
+    """Build the ThumbnailStore configured by IMAGE_THUMBNAIL_DIR / IMAGE_THUMBNAIL_MAX_BYTES"""
+    return ThumbnailStore(
+        os.environ.get('IMAGE_THUMBNAIL_DIR', os.path.join('.cache', 'thumbnails')),
+        int(os.environ.get('IMAGE_THUMBNAIL_MAX_BYTES', str(256 * 1024 * 1024)))
+    )
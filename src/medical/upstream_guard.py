@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+
+class RateLimiter:
+    """Token-bucket rate limit combined with a cap on concurrent calls.
+
+    Use as ``async with limiter:`` around each upstream call. A
+    requests_per_minute of 0 (or less) leaves the rate unlimited, so only
+    the concurrency cap applies.
+    """
+
+    def __init__(self, name, requests_per_minute, max_concurrency, burst=None):
+        if max_concurrency < 1:
+            raise ValueError(f'{name}: max_concurrency must be at least 1')
+        self.name = name
+        self.rate = requests_per_minute / 60.0 if requests_per_minute > 0 else None
+        self.capacity = float(burst if burst is not None else max(1, max_concurrency))
+        self.max_concurrency = max_concurrency
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        self.waiting = 0
+        self.active = 0
+        self.acquired = 0
+        self.throttled = 0
+
+    async def _take_token(self):
+        if self.rate is None:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self.throttled += 1
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aenter__(self):
+        self.waiting += 1
+        try:
+            await self._take_token()
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.acquired += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.active -= 1
+        self._semaphore.release()
+        return False
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'requestsPerMinute': round(self.rate * 60, 2) if self.rate is not None else None,
+            'maxConcurrency': self.max_concurrency,
+            'queueDepth': self.waiting,
+            'active': self.active,
+            'acquired': self.acquired,
+            'throttled': self.throttled
+        }
+
+
+class CircuitBreaker:
+    """Skip a failing upstream for a cool-down window after repeated errors.
+
+    closed -> open after failure_threshold consecutive failures; open -> half-open
+    once cooldown seconds pass, letting a single trial call through; the trial's
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=5, cooldown=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.short_circuited = 0
+        self.times_opened = 0
+
+    def allow(self):
+        """Whether a call may go upstream right now"""
+        if self.state == 'open':
+            if time.monotonic() - self.opened_at < self.cooldown:
+                self.short_circuited += 1
+                return False
+            self.state = 'half-open'
+        if self.state == 'half-open':
+            if self._trial_in_flight:
+                self.short_circuited += 1
+                return False
+            self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_abandoned(self):
+        """The call was cancelled before it produced an outcome"""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == 'half-open' or self.consecutive_failures >= self.failure_threshold:
+            if self.state != 'open':
+                self.times_opened += 1
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def stats(self):
+        retry_in = 0.0
+        if self.state == 'open':
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+        return {
+            'name': self.name,
+            'state': self.state,
+            'consecutiveFailures': self.consecutive_failures,
+            'failureThreshold': self.failure_threshold,
+            'cooldownSeconds': self.cooldown,
+            'retryInSeconds': round(retry_in, 2),
+            'timesOpened': self.times_opened,
+            'shortCircuited': self.short_circuited
+        }